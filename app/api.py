@@ -0,0 +1,238 @@
+"""API HTTP de CatchAI: ingesta, preguntas, funcionalidades avanzadas y estado.
+
+Uso:
+    uvicorn api:app --app-dir app --host 0.0.0.0 --port 8000 --workers 4
+
+Cada worker es un proceso con su propio modelo de embeddings y handle de
+Chroma sobre el mismo CHROMA_DIR (y las mismas cachés en disco). La ingesta y
+la limpieza toman un bloqueo de archivo, así que hay un solo escritor a la vez;
+los demás workers detectan el cambio por la versión del catálogo y reabren el
+índice. Cada solicitud opera sobre el espacio de trabajo de la cabecera
+`X-Espacio` (una colección propia; sin cabecera, el predeterminado). La
+ingesta asíncrona (/trabajos) la procesa un único ejecutor elegido entre los
+workers mediante otro bloqueo de archivo. Las funciones de `logic` son
+síncronas y se ejecutan en el pool de hilos, de modo que el event loop sigue
+atendiendo otras solicitudes.
+"""
+import os
+import shutil
+import tempfile
+from dataclasses import asdict
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import Depends, FastAPI, File, Header, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from logic.arranque import iniciar_calentamiento
+from logic.esquema import coleccion_espacio
+from logic.metricas import registro, resumen_metricas
+from logic import trabajos
+
+load_dotenv()
+PERSIST_DIR = os.environ.get("CHROMA_DIR", "/app/data/chroma")
+MAX_ARCHIVOS = int(os.getenv("API_MAX_ARCHIVOS", "20"))
+
+class SolicitudPregunta(BaseModel):
+    pregunta: str = Field(..., min_length=1)
+    # Chat: id de la conversación y turnos previos (pregunta, respuesta) que guarda el cliente
+    conversacion: Optional[str] = None
+    historial: List[Tuple[str, str]] = []
+
+class Respuesta(BaseModel):
+    respuesta: str
+    citas: List[str] = []
+
+class SolicitudResumen(BaseModel):
+    documento: str = Field(..., min_length=1)
+
+class SolicitudComparacion(BaseModel):
+    documento_a: str = Field(..., min_length=1)
+    documento_b: str = Field(..., min_length=1)
+    condensar: Optional[bool] = None
+
+class SolicitudClasificacion(BaseModel):
+    consulta: str = Field(..., min_length=1)
+
+class Resultado(BaseModel):
+    resultado: str
+
+class DocumentoProcesado(BaseModel):
+    nombre: str
+    paginas: int
+    tamaño_mb: float
+    fragmentos_nuevos: int = 0
+    fragmentos_eliminados: int = 0
+    omitido: bool = False
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    # Calentamiento en segundo plano por worker: el proceso acepta conexiones de inmediato
+    os.makedirs(PERSIST_DIR, exist_ok=True)
+    app.state.calentamiento = iniciar_calentamiento(PERSIST_DIR)
+    trabajos.iniciar_ejecutor()
+    yield
+
+app = FastAPI(title="CatchAI API", version="1.0.0", lifespan=ciclo_de_vida)
+
+def coleccion(x_espacio: Optional[str] = Header(None)) -> str:
+    """Colección del espacio de trabajo de la solicitud (cabecera X-Espacio)."""
+    return coleccion_espacio(x_espacio)
+
+@app.get("/salud")
+def salud():
+    """Estado del calentamiento del worker que atiende la solicitud."""
+    return app.state.calentamiento.estado()
+
+@app.get("/estado")
+def estado():
+    """Calentamiento, caché de respuestas y desglose de latencia (para la interfaz)."""
+    from logic.cache_respuestas import obtener_cache_respuestas
+    cache = obtener_cache_respuestas()
+    return {
+        "calentamiento": app.state.calentamiento.estado(),
+        "cache_respuestas": cache.estadisticas() if cache else None,
+        "metricas": resumen_metricas(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metricas():
+    """Histogramas por etapa en formato Prometheus (del worker que atiende)."""
+    return PlainTextResponse(registro.prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/documentos")
+async def listar_documentos(nombre_coleccion: str = Depends(coleccion)):
+    from logic.retriever import obtener_estadisticas_documentos
+    return await run_in_threadpool(obtener_estadisticas_documentos, PERSIST_DIR, nombre_coleccion)
+
+@app.get("/documentos/vista-general", response_model=Resultado)
+async def vista_general(nombre_coleccion: str = Depends(coleccion)):
+    from logic.chains import obtener_vista_general_documentos
+    return Resultado(resultado=await run_in_threadpool(obtener_vista_general_documentos, PERSIST_DIR,
+                                                       nombre_coleccion))
+
+def _validar_subida(archivos: List[UploadFile]):
+    if len(archivos) > MAX_ARCHIVOS:
+        raise HTTPException(status_code=413, detail=f"Máximo {MAX_ARCHIVOS} archivos por solicitud")
+    if any(not (a.filename or "").lower().endswith(".pdf") for a in archivos):
+        raise HTTPException(status_code=415, detail="Solo se aceptan archivos PDF")
+    # El nombre del archivo es el nombre del documento: dos iguales se pisarían
+    nombres = [os.path.basename(a.filename) for a in archivos]
+    if len(set(nombres)) != len(nombres):
+        raise HTTPException(status_code=400, detail="Hay archivos con el mismo nombre")
+
+def _guardar_subida(archivos: List[UploadFile]) -> Tuple[str, List[str]]:
+    """Copia la subida a un directorio temporal; es disco bloqueante, se llama en el pool de hilos."""
+    directorio = tempfile.mkdtemp()
+    try:
+        rutas = []
+        for archivo in archivos:
+            ruta = os.path.join(directorio, os.path.basename(archivo.filename))
+            with open(ruta, "wb") as w:
+                shutil.copyfileobj(archivo.file, w, length=1024 * 1024)
+            rutas.append(ruta)
+    except Exception:
+        shutil.rmtree(directorio, ignore_errors=True)
+        raise
+    return directorio, rutas
+
+@app.post("/documentos", response_model=List[DocumentoProcesado])
+async def subir_documentos(archivos: List[UploadFile] = File(...), nombre_coleccion: str = Depends(coleccion)):
+    """Indexa los PDFs subidos (incremental por hash de contenido)."""
+    _validar_subida(archivos)
+    from logic.ingest import procesar_pdfs
+
+    directorio_temp, rutas = await run_in_threadpool(_guardar_subida, archivos)
+    try:
+        metadatos = await run_in_threadpool(procesar_pdfs, rutas, PERSIST_DIR, nombre_coleccion)
+    finally:
+        await run_in_threadpool(shutil.rmtree, directorio_temp, ignore_errors=True)
+    return [DocumentoProcesado(nombre=m.nombre, paginas=m.paginas, tamaño_mb=m.tamaño_mb,
+                               fragmentos_nuevos=m.fragmentos_nuevos, fragmentos_eliminados=m.fragmentos_eliminados,
+                               omitido=m.omitido) for m in metadatos]
+
+def _trabajo_a_dict(trabajo: trabajos.Trabajo) -> dict:
+    return {**asdict(trabajo), "terminado": trabajo.terminado}
+
+@app.post("/trabajos", status_code=202)
+async def encolar_trabajo(archivos: List[UploadFile] = File(...), nombre_coleccion: str = Depends(coleccion)):
+    """Encola la ingesta de los PDFs y retorna de inmediato el id del trabajo."""
+    _validar_subida(archivos)
+    directorio_temp, rutas = await run_in_threadpool(_guardar_subida, archivos)
+    try:
+        id_trabajo = await run_in_threadpool(trabajos.encolar_trabajo, rutas, PERSIST_DIR, nombre_coleccion)
+    finally:
+        await run_in_threadpool(shutil.rmtree, directorio_temp, ignore_errors=True)
+    return {"id": id_trabajo}
+
+@app.get("/trabajos")
+async def listar_trabajos(activos: bool = False, nombre_coleccion: str = Depends(coleccion)):
+    return [_trabajo_a_dict(t) for t in await run_in_threadpool(trabajos.listar_trabajos, activos, 20,
+                                                                   nombre_coleccion)]
+
+@app.get("/trabajos/{id_trabajo}")
+async def obtener_trabajo(id_trabajo: str, nombre_coleccion: str = Depends(coleccion)):
+    """Estado y progreso del trabajo (para sondeo desde la interfaz); 404 si es de otro espacio."""
+    trabajo = await run_in_threadpool(trabajos.obtener_trabajo, id_trabajo, nombre_coleccion)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return _trabajo_a_dict(trabajo)
+
+@app.delete("/trabajos/{id_trabajo}")
+async def cancelar_trabajo(id_trabajo: str, nombre_coleccion: str = Depends(coleccion)):
+    if await run_in_threadpool(trabajos.obtener_trabajo, id_trabajo, nombre_coleccion) is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    if not await run_in_threadpool(trabajos.cancelar_trabajo, id_trabajo, nombre_coleccion):
+        raise HTTPException(status_code=409, detail="El trabajo ya terminó")
+    return {"cancelacion_solicitada": True}
+
+@app.delete("/documentos")
+async def limpiar_documentos(nombre_coleccion: str = Depends(coleccion)):
+    """Elimina solo la colección del espacio de trabajo (y su catálogo, BM25 y caché)."""
+    from logic.ingest import limpiar_almacen_vectores
+    await run_in_threadpool(limpiar_almacen_vectores, PERSIST_DIR, nombre_coleccion)
+    return {"limpiado": True}
+
+@app.post("/preguntas", response_model=Respuesta)
+async def preguntar(solicitud: SolicitudPregunta, nombre_coleccion: str = Depends(coleccion)):
+    from logic.retriever import responder_pregunta_con_citas
+    texto, citas = await run_in_threadpool(responder_pregunta_con_citas, solicitud.pregunta, PERSIST_DIR,
+                                           nombre_coleccion)
+    return Respuesta(respuesta=texto, citas=citas)
+
+@app.post("/preguntas/stream")
+def preguntar_stream(solicitud: SolicitudPregunta, nombre_coleccion: str = Depends(coleccion)):
+    """Respuesta en texto plano a medida que la genera Gemini; las fuentes llegan al final.
+
+    Con `conversacion` se usa el historial y se reutiliza el contexto de los
+    turnos anteriores (cacheado por worker: en otro worker solo se pierde la reutilización).
+    """
+    if solicitud.conversacion:
+        from logic.conversacion import responder_en_conversacion_stream
+        flujo = responder_en_conversacion_stream(solicitud.pregunta, PERSIST_DIR, solicitud.conversacion,
+                                                 solicitud.historial, nombre_coleccion)
+    else:
+        from logic.retriever import responder_pregunta_stream
+        flujo = responder_pregunta_stream(solicitud.pregunta, PERSIST_DIR, nombre_coleccion)
+    # Starlette consume el generador síncrono en el pool de hilos
+    return StreamingResponse(flujo, media_type="text/plain; charset=utf-8")
+
+@app.post("/resumen", response_model=Resultado)
+async def resumen(solicitud: SolicitudResumen, nombre_coleccion: str = Depends(coleccion)):
+    from logic.chains import resumir_documento
+    return Resultado(resultado=await run_in_threadpool(resumir_documento, solicitud.documento, PERSIST_DIR,
+                                                       nombre_coleccion))
+
+@app.post("/comparacion", response_model=Resultado)
+async def comparacion(solicitud: SolicitudComparacion, nombre_coleccion: str = Depends(coleccion)):
+    from logic.chains import comparar_documentos
+    return Resultado(resultado=await run_in_threadpool(comparar_documentos, solicitud.documento_a,
+                                                       solicitud.documento_b, PERSIST_DIR, solicitud.condensar,
+                                                       nombre_coleccion))
+
+@app.post("/clasificacion", response_model=Resultado)
+async def clasificacion(solicitud: SolicitudClasificacion, nombre_coleccion: str = Depends(coleccion)):
+    from logic.chains import clasificar_topicos
+    return Resultado(resultado=await run_in_threadpool(clasificar_topicos, solicitud.consulta, PERSIST_DIR,
+                                                       nombre_coleccion))
@@ -0,0 +1,151 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from .embeddings import obtener_embeddings
+from .catalogo import version_indice
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import Chroma
+
+# Registro de handles de Chroma por proceso: uno por (directorio, colección),
+# compartido entre sesiones de Streamlit y reutilizado entre reruns. Con un
+# espacio de trabajo por equipo o sesión hay muchas colecciones: se mantienen
+# abiertas solo las ALMACENES_MAX usadas más recientemente.
+MAX_ALMACENES = int(os.getenv("ALMACENES_MAX", "16"))
+# Los índices HNSW que chromadb carga en memoria no se liberan al soltar el
+# handle; con CHROMA_MEMORIA_MB se activa su caché LRU de segmentos.
+MEMORIA_CHROMA_MB = int(os.getenv("CHROMA_MEMORIA_MB", "0"))
+
+_almacenes: "OrderedDict[Tuple[str, str], Chroma]" = OrderedDict()
+_conteos: Dict[Tuple[str, str], int] = {}
+_versiones: Dict[Tuple[str, str], str] = {}
+_lock = threading.RLock()
+
+def _clave(directorio_persistencia: str, nombre_coleccion: str) -> Tuple[str, str]:
+    return os.path.abspath(directorio_persistencia), nombre_coleccion
+
+def _configuracion_cliente(directorio_persistencia: str):
+    if not MEMORIA_CHROMA_MB:
+        return None
+    from chromadb.config import Settings
+    return Settings(is_persistent=True, persist_directory=directorio_persistencia,
+                    chroma_segment_cache_policy="LRU",
+                    chroma_memory_limit_bytes=MEMORIA_CHROMA_MB * 1024 * 1024)
+
+def obtener_almacen(directorio_persistencia: str, nombre_coleccion: str = "catchai_docs") -> "Chroma":
+    """Devuelve el handle compartido del almacén, abriéndolo la primera vez."""
+    clave = _clave(directorio_persistencia, nombre_coleccion)
+    with _lock:
+        av = _almacenes.get(clave)
+        if av is None:
+            from langchain_community.vectorstores import Chroma
+            os.makedirs(directorio_persistencia, exist_ok=True)
+            av = Chroma(collection_name=nombre_coleccion,
+                        embedding_function=obtener_embeddings(),
+                        persist_directory=directorio_persistencia,
+                        client_settings=_configuracion_cliente(directorio_persistencia))
+            _almacenes[clave] = av
+            logger.info(f"Almacén de vectores abierto: {nombre_coleccion} en {clave[0]}")
+            while len(_almacenes) > MAX_ALMACENES:
+                antigua, _ = _almacenes.popitem(last=False)
+                _conteos.pop(antigua, None)
+                logger.info(f"Almacén de vectores desalojado del registro: {antigua[1]}")
+        _almacenes.move_to_end(clave)
+        return av
+
+def contar_fragmentos(directorio_persistencia: str, nombre_coleccion: str = "catchai_docs") -> int:
+    """Cantidad de fragmentos de la colección; se cachea hasta la próxima invalidación."""
+    clave = _clave(directorio_persistencia, nombre_coleccion)
+    with _lock:
+        if clave not in _conteos:
+            _conteos[clave] = obtener_almacen(directorio_persistencia, nombre_coleccion)._collection.count()
+        return _conteos[clave]
+
+def invalidar_almacen(directorio_persistencia: str, nombre_coleccion: Optional[str] = None, cerrar: bool = False):
+    """Marca el almacén como modificado.
+
+    Tras una ingesta basta con refrescar los datos derivados (conteo). Con
+    cerrar=True (índice modificado por otro proceso) además se descarta la
+    caché de clientes de chromadb, para que la próxima apertura cree uno nuevo;
+    como el cliente es compartido por todas las colecciones del directorio, se
+    descartan los handles de todas ellas.
+    """
+    directorio = os.path.abspath(directorio_persistencia)
+    with _lock:
+        for clave in [c for c in list(_almacenes) + list(_conteos)
+                      if c[0] == directorio and (cerrar or nombre_coleccion is None or c[1] == nombre_coleccion)]:
+            _conteos.pop(clave, None)
+            if cerrar:
+                _almacenes.pop(clave, None)
+        if cerrar:
+            try:
+                from chromadb.api.client import SharedSystemClient
+                SharedSystemClient.clear_system_cache()
+            except Exception as e:
+                logger.warning(f"No se pudo limpiar la caché de clientes de chromadb: {e}")
+
+def eliminar_coleccion(directorio_persistencia: str, nombre_coleccion: str):
+    """Elimina una colección de Chroma sin tocar las demás del directorio (requiere bloqueo_escritura)."""
+    av = obtener_almacen(directorio_persistencia, nombre_coleccion)
+    try:
+        av.delete_collection()
+    finally:
+        clave = _clave(directorio_persistencia, nombre_coleccion)
+        with _lock:
+            _almacenes.pop(clave, None)
+            _conteos.pop(clave, None)
+    logger.info(f"Colección eliminada: {nombre_coleccion}")
+
+def registrar_version(directorio_persistencia: str, nombre_coleccion: str, version: str):
+    """Anota una versión del índice producida por este proceso (no requiere reabrir el handle)."""
+    with _lock:
+        _versiones[_clave(directorio_persistencia, nombre_coleccion)] = version
+
+def sincronizar_almacen(directorio_persistencia: str, nombre_coleccion: str = "catchai_docs") -> bool:
+    """Reabre el handle si otro proceso cambió el índice; retorna True si lo hizo.
+
+    Chroma mantiene el índice HNSW en memoria y no ve lo que escriben otros
+    procesos (varios workers de la API sobre el mismo directorio), así que se
+    compara la versión del catálogo, que cada ingesta o limpieza renueva.
+    """
+    version = version_indice(directorio_persistencia, nombre_coleccion)
+    clave = _clave(directorio_persistencia, nombre_coleccion)
+    with _lock:
+        previa = _versiones.get(clave)
+        _versiones[clave] = version
+    if previa is None or previa == version:
+        return False
+    logger.info(f"Índice modificado por otro proceso; se reabre {nombre_coleccion}")
+    invalidar_almacen(directorio_persistencia, nombre_coleccion, cerrar=True)
+    return True
+
+_lock_escritura = threading.RLock()
+
+@contextmanager
+def bloqueo_escritura(directorio_persistencia: str):
+    """Bloqueo exclusivo entre procesos para escribir en el directorio (un solo escritor).
+
+    El archivo de bloqueo vive junto al directorio, no dentro, para que la
+    limpieza pueda borrarlo completo mientras tiene el bloqueo.
+    """
+    ruta = os.path.abspath(directorio_persistencia).rstrip(os.sep) + ".lock"
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    with open(ruta, "a") as f:
+        try:
+            import fcntl
+        except ImportError:
+            # Sin fcntl (Windows) solo se serializa dentro del proceso
+            with _lock_escritura:
+                yield
+            return
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            with _lock_escritura:
+                yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
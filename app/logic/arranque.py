@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import threading
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from .metricas import registro
+
+logger = logging.getLogger(__name__)
+
+# Arranque en frío: este módulo no importa dependencias pesadas. El modelo de
+# embeddings, los almacenes de los espacios de trabajo del catálogo y el cliente
+# LLM se cargan en un hilo de fondo al iniciar el servidor, y se registran el tiempo de arranque y el tiempo hasta
+# la primera respuesta para seguirlos entre despliegues.
+METRICAS_ARRANQUE_PATH = os.getenv("METRICAS_ARRANQUE_PATH", "/app/data/metricas/arranque.jsonl")
+
+def _inicio_proceso() -> float:
+    """Hora de inicio del proceso (epoch); en sistemas sin /proc, la de la primera importación."""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            campos = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + int(campos[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+INICIO_PROCESO = _inicio_proceso()
+
+def registrar_metrica_arranque(evento: str, segundos: float, **extra):
+    """Agrega una línea JSON por evento (arranque, primera respuesta) para comparar despliegues."""
+    datos = {"evento": evento, "segundos": round(segundos, 3), "timestamp": time.time(),
+             "version": os.getenv("APP_VERSION", ""), **extra}
+    logger.info(f"Métrica de arranque: {datos}")
+    registro.fijar("catchai_arranque_segundos", segundos, evento=evento)
+    if not METRICAS_ARRANQUE_PATH:
+        return
+    try:
+        os.makedirs(os.path.dirname(METRICAS_ARRANQUE_PATH) or ".", exist_ok=True)
+        with open(METRICAS_ARRANQUE_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(datos, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.warning(f"No se pudo escribir la métrica de arranque: {e}")
+
+@dataclass
+class Calentamiento:
+    """Estado del calentamiento de fondo, consultado por la interfaz."""
+    directorio_persistencia: str
+    etapa: str = "pendiente"
+    etapas: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+    listo: threading.Event = field(default_factory=threading.Event)
+    arranque_s: Optional[float] = None
+    primera_respuesta_s: Optional[float] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def _etapa(self, nombre: str, funcion):
+        self.etapa = nombre
+        inicio = time.perf_counter()
+        funcion()
+        self.etapas[nombre] = round(time.perf_counter() - inicio, 3)
+
+    def ejecutar(self):
+        try:
+            from .embeddings import obtener_embeddings
+            self._etapa("embeddings", lambda: obtener_embeddings().embed_query("calentamiento"))
+
+            # Espacios de trabajo: el predeterminado y los de ingesta más reciente,
+            # hasta la capacidad del LRU de handles
+            from .almacen import MAX_ALMACENES, obtener_almacen, contar_fragmentos
+            from .catalogo import listar_colecciones
+            from .esquema import COLECCION_PREDETERMINADA
+            colecciones = [COLECCION_PREDETERMINADA]
+            colecciones += [c for c in listar_colecciones(self.directorio_persistencia, MAX_ALMACENES)
+                            if c != COLECCION_PREDETERMINADA][:MAX_ALMACENES - 1]
+
+            def _almacenes():
+                for coleccion in colecciones:
+                    obtener_almacen(self.directorio_persistencia, coleccion)
+                    contar_fragmentos(self.directorio_persistencia, coleccion)
+            self._etapa("almacen", _almacenes)
+
+            from .bm25 import obtener_indice_lexico
+            def _indices_lexicos():
+                for coleccion in colecciones:
+                    if not contar_fragmentos(self.directorio_persistencia, coleccion):
+                        continue
+                    av = obtener_almacen(self.directorio_persistencia, coleccion)
+                    indice = obtener_indice_lexico(self.directorio_persistencia, av, coleccion)
+                    if indice.total != av._collection.count():
+                        # La reconstrucción espera el bloqueo de escritura: en segundo plano
+                        from .ingest import reparar_indice_lexico
+                        threading.Thread(target=reparar_indice_lexico, args=(self.directorio_persistencia, coleccion),
+                                         daemon=True).start()
+            self._etapa("indice_lexico", _indices_lexicos)
+
+            def _cliente_llm():
+                try:
+                    from .llm import obtener_cliente
+                    obtener_cliente()
+                except ValueError as e:
+                    # Sin clave API la app igual arranca; el error se muestra al preguntar
+                    logger.warning(f"Cliente LLM no inicializado: {e}")
+            self._etapa("cliente_llm", _cliente_llm)
+            self.etapa = "listo"
+        except Exception as e:
+            self.error = str(e)
+            self.etapa = "error"
+            logger.error(f"Error en el calentamiento: {e}")
+        finally:
+            self.arranque_s = time.time() - INICIO_PROCESO
+            registrar_metrica_arranque("arranque", self.arranque_s, etapas=self.etapas, error=self.error)
+            self.listo.set()
+
+    def registrar_respuesta(self, latencia_s: float):
+        """Registra una sola vez por proceso el tiempo hasta la primera respuesta."""
+        with self._lock:
+            if self.primera_respuesta_s is not None:
+                return
+            self.primera_respuesta_s = time.time() - INICIO_PROCESO
+        registrar_metrica_arranque("primera_respuesta", self.primera_respuesta_s, latencia_s=round(latencia_s, 3))
+
+    def estado(self) -> dict:
+        return {
+            "listo": self.listo.is_set() and self.error is None,
+            "etapa": self.etapa,
+            "etapas": dict(self.etapas),
+            "error": self.error,
+            "arranque_s": self.arranque_s,
+            "primera_respuesta_s": self.primera_respuesta_s,
+        }
+
+def iniciar_calentamiento(directorio_persistencia: str) -> Calentamiento:
+    """Lanza el calentamiento en un hilo daemon y retorna su estado."""
+    calentamiento = Calentamiento(directorio_persistencia)
+    threading.Thread(target=calentamiento.ejecutar, name="calentamiento", daemon=True).start()
+    return calentamiento
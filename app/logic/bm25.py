@@ -0,0 +1,413 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import threading
+import unicodedata
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from .esquema import CAMPO_DOCUMENTO, CAMPO_PAGINA
+
+logger = logging.getLogger(__name__)
+
+# Índice léxico BM25 junto a la colección de Chroma. Complementa la búsqueda
+# por embeddings en términos exactos (números de contrato, artículos, nombres).
+# Se guarda por segmentos inmutables con listas de postings en arreglos (CSR):
+# cada ingesta agrega un segmento y marca como eliminados los fragmentos
+# obsoletos; cuando hay demasiados segmentos o eliminados se compacta.
+DIRECTORIO = "bm25"
+K1 = float(os.getenv("BM25_K1", "1.2"))
+B = float(os.getenv("BM25_B", "0.75"))
+MAX_SEGMENTOS = 8
+FRACCION_COMPACTAR = 0.25
+FRAGMENTOS_POR_SEGMENTO = 20000
+
+_PATRON_TOKEN = re.compile(r"\w+(?:[.\-/]\w+)*")
+_SEPARADORES = re.compile(r"[.\-/]")
+PALABRAS_VACIAS = frozenset("""
+a al algo algunas algunos ante antes como con contra cual cuando de del desde donde durante e el ella
+ellas ellos en entre era es esa esas ese eso esos esta estas este esto estos fue ha hay la las le les lo
+los mas me mi muy no nos o para pero por que se sea segun ser si sin sobre su sus tambien te tiene u un
+una uno unos y ya the of and to in is for on that with as by
+""".split())
+
+def tokenizar(texto: str) -> List[str]:
+    """Minúsculas y sin tildes; conserva códigos como 2023-045 o 5.1 además de sus partes."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    tokens = []
+    for token in _PATRON_TOKEN.findall(texto):
+        if token in PALABRAS_VACIAS or (len(token) < 2 and not token.isdigit()):
+            continue
+        tokens.append(token)
+        if _SEPARADORES.search(token):
+            tokens.extend(p for p in _SEPARADORES.split(token) if p and p not in PALABRAS_VACIAS)
+    return tokens
+
+def fusion_rrf(listas: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Reciprocal rank fusion: ordena los IDs por la suma de 1 / (k + posición)."""
+    puntajes: Dict[str, float] = {}
+    for lista in listas:
+        for posicion, id_fragmento in enumerate(lista):
+            puntajes[id_fragmento] = puntajes.get(id_fragmento, 0.0) + 1.0 / (k + posicion + 1)
+    return sorted(puntajes, key=puntajes.get, reverse=True)
+
+@dataclass
+class Segmento:
+    """Postings en formato CSR: los fragmentos del término i están en inicio[i]:inicio[i+1]."""
+    archivo: str
+    terminos: np.ndarray      # vocabulario ordenado (para searchsorted)
+    inicio: np.ndarray        # int64, len(terminos) + 1
+    fragmentos: np.ndarray    # int32, posición local del fragmento
+    frecuencias: np.ndarray   # uint16, frecuencia del término en el fragmento
+    longitudes: np.ndarray    # int32, tokens por fragmento
+    ids: np.ndarray
+    documentos: np.ndarray
+    vivos: np.ndarray         # bool; False = eliminado
+    paginas: np.ndarray       # int32; puede cambiar si un fragmento conservado se mueve
+
+    def postings(self, termino: str) -> Optional[slice]:
+        i = int(np.searchsorted(self.terminos, termino))
+        if i < len(self.terminos) and self.terminos[i] == termino:
+            return slice(int(self.inicio[i]), int(self.inicio[i + 1]))
+        return None
+
+def _construir_segmento(ids: List[str], conteos: List[Counter], documentos: List[str],
+                        paginas: List[int]) -> Segmento:
+    terminos_coo, fragmentos_coo, frecuencias_coo = [], [], []
+    for posicion, conteo in enumerate(conteos):
+        terminos_coo.extend(conteo.keys())
+        frecuencias_coo.extend(conteo.values())
+        fragmentos_coo.extend([posicion] * len(conteo))
+    terminos, inversa = np.unique(np.array(terminos_coo, dtype=str), return_inverse=True)
+    fragmentos_coo = np.array(fragmentos_coo, dtype=np.int32)
+    orden = np.lexsort((fragmentos_coo, inversa))
+    inicio = np.zeros(len(terminos) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(inversa, minlength=len(terminos)), out=inicio[1:])
+    return Segmento(
+        archivo=f"segmento-{uuid.uuid4().hex[:12]}",
+        terminos=terminos,
+        inicio=inicio,
+        fragmentos=fragmentos_coo[orden],
+        frecuencias=np.minimum(np.array(frecuencias_coo, dtype=np.int64)[orden], 65535).astype(np.uint16),
+        longitudes=np.array([sum(c.values()) for c in conteos], dtype=np.int32),
+        ids=np.array(ids, dtype=str),
+        documentos=np.array(documentos, dtype=str),
+        paginas=np.array(paginas, dtype=np.int32),
+        vivos=np.ones(len(ids), dtype=bool),
+    )
+
+def _compactar(segmentos: List[Segmento]) -> Segmento:
+    """Une los segmentos en uno solo, descartando los fragmentos eliminados."""
+    terminos = np.unique(np.concatenate([s.terminos for s in segmentos]))
+    partes_t, partes_f, partes_tf = [], [], []
+    ids, documentos, paginas, longitudes = [], [], [], []
+    desplazamiento = 0
+    for s in segmentos:
+        # Nueva posición de cada fragmento vivo del segmento
+        nuevas = np.cumsum(s.vivos) - 1 + desplazamiento
+        termino_global = np.searchsorted(terminos, s.terminos)
+        por_posting = np.repeat(termino_global, np.diff(s.inicio))
+        vivo = s.vivos[s.fragmentos]
+        partes_t.append(por_posting[vivo])
+        partes_f.append(nuevas[s.fragmentos[vivo]])
+        partes_tf.append(s.frecuencias[vivo])
+        for destino, arreglo in ((ids, s.ids), (documentos, s.documentos),
+                                 (paginas, s.paginas), (longitudes, s.longitudes)):
+            destino.append(arreglo[s.vivos])
+        desplazamiento += int(s.vivos.sum())
+    t = np.concatenate(partes_t).astype(np.int64)
+    f = np.concatenate(partes_f).astype(np.int32)
+    orden = np.lexsort((f, t))
+    inicio = np.zeros(len(terminos) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(t, minlength=len(terminos)), out=inicio[1:])
+    # Quitar términos que quedaron sin postings
+    usados = np.diff(inicio) > 0
+    if not usados.all():
+        remapeo = np.cumsum(usados) - 1
+        terminos, t = terminos[usados], remapeo[t]
+        inicio = np.zeros(len(terminos) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(t, minlength=len(terminos)), out=inicio[1:])
+    return Segmento(
+        archivo=f"segmento-{uuid.uuid4().hex[:12]}",
+        terminos=terminos,
+        inicio=inicio,
+        fragmentos=f[orden],
+        frecuencias=np.concatenate(partes_tf)[orden],
+        longitudes=np.concatenate(longitudes),
+        ids=np.concatenate(ids),
+        documentos=np.concatenate(documentos),
+        paginas=np.concatenate(paginas),
+        vivos=np.ones(desplazamiento, dtype=bool),
+    )
+
+class IndiceLexico:
+    """Índice BM25 de una colección, persistido en <directorio>/bm25/<colección>/.
+
+    Las búsquedas usan una instancia de solo lectura compartida (ver
+    obtener_indice_lexico); la ingesta carga su propia copia, la modifica y la
+    guarda, y luego invalida la compartida.
+    """
+
+    def __init__(self, directorio_persistencia: str, nombre_coleccion: str = "catchai_docs"):
+        self.ruta = os.path.join(directorio_persistencia, DIRECTORIO, nombre_coleccion)
+        self.segmentos: List[Segmento] = []
+        self._ubicaciones: Optional[Dict[str, Tuple[int, int]]] = None
+        self._pendientes: Tuple[list, list, list, list] = ([], [], [], [])
+        self._modificados = set()
+        self.total = 0
+        self.longitud_total = 0
+
+    # --- carga y guardado ---
+
+    @classmethod
+    def cargar(cls, directorio_persistencia: str, nombre_coleccion: str = "catchai_docs") -> "IndiceLexico":
+        indice = cls(directorio_persistencia, nombre_coleccion)
+        manifiesto = os.path.join(indice.ruta, "manifiesto.json")
+        if not os.path.exists(manifiesto):
+            return indice
+        with open(manifiesto, "r", encoding="utf-8") as f:
+            entradas = json.load(f)["segmentos"]
+        for entrada in entradas:
+            campos = {}
+            for archivo in (entrada["archivo"] + ".npz", entrada["estado"]):
+                with np.load(os.path.join(indice.ruta, archivo)) as datos:
+                    campos.update({nombre: datos[nombre] for nombre in datos.files})
+            indice.segmentos.append(Segmento(archivo=entrada["archivo"], **campos))
+        indice._recalcular()
+        return indice
+
+    def guardar(self):
+        """Escribe los segmentos nuevos y el manifiesto de forma atómica; borra archivos huérfanos.
+
+        Los postings de un segmento no cambian nunca; lo que cambia entre
+        ingestas (fragmentos vivos y páginas) va en un archivo de estado aparte
+        que se reescribe con un nombre nuevo.
+        """
+        self._cerrar_pendientes()
+        if len(self.segmentos) > MAX_SEGMENTOS or self._fraccion_eliminados() > FRACCION_COMPACTAR:
+            self.segmentos = [_compactar(self.segmentos)] if self.total else []
+            self._ubicaciones = None
+        os.makedirs(self.ruta, exist_ok=True)
+        existentes = set(os.listdir(self.ruta))
+        anterior = self._leer_manifiesto()
+        entradas = []
+        for s in self.segmentos:
+            if s.archivo + ".npz" not in existentes:
+                self._escribir(s.archivo + ".npz", terminos=s.terminos, inicio=s.inicio, fragmentos=s.fragmentos,
+                               frecuencias=s.frecuencias, longitudes=s.longitudes, ids=s.ids, documentos=s.documentos)
+            estado = anterior.get(s.archivo)
+            if estado is None or s.archivo in self._modificados:
+                estado = f"{s.archivo}.estado-{uuid.uuid4().hex[:8]}.npz"
+                self._escribir(estado, vivos=s.vivos, paginas=s.paginas)
+            entradas.append({"archivo": s.archivo, "estado": estado})
+        temporal = os.path.join(self.ruta, "manifiesto.json.tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({"segmentos": entradas, "fragmentos": self.total}, f)
+        os.replace(temporal, os.path.join(self.ruta, "manifiesto.json"))
+        self._modificados.clear()
+
+        referenciados = {"manifiesto.json"} | {e["estado"] for e in entradas} | {e["archivo"] + ".npz" for e in entradas}
+        for archivo in set(os.listdir(self.ruta)) - referenciados:
+            try:
+                os.remove(os.path.join(self.ruta, archivo))
+            except OSError:
+                pass
+
+    def _leer_manifiesto(self) -> Dict[str, str]:
+        """Archivo de estado de cada segmento según el manifiesto guardado."""
+        try:
+            with open(os.path.join(self.ruta, "manifiesto.json"), "r", encoding="utf-8") as f:
+                return {e["archivo"]: e["estado"] for e in json.load(f)["segmentos"]}
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def _escribir(self, archivo: str, **arreglos):
+        temporal = os.path.join(self.ruta, archivo + ".tmp.npz")
+        np.savez(temporal, **arreglos)
+        os.replace(temporal, os.path.join(self.ruta, archivo))
+
+    # --- modificación (solo desde la ingesta) ---
+
+    def agregar(self, ids: List[str], textos: List[str], metadatos: List[dict]):
+        """Agrega fragmentos; un ID ya existente se reemplaza."""
+        self.eliminar(ids)
+        p_ids, p_conteos, p_documentos, p_paginas = self._pendientes
+        for id_fragmento, texto, md in zip(ids, textos, metadatos):
+            p_ids.append(id_fragmento)
+            p_conteos.append(Counter(tokenizar(texto)))
+            p_documentos.append(md.get(CAMPO_DOCUMENTO, ""))
+            p_paginas.append(int(md.get(CAMPO_PAGINA, 0)))
+        if len(p_ids) >= FRAGMENTOS_POR_SEGMENTO:
+            self._cerrar_pendientes()
+
+    def eliminar(self, ids: Iterable[str]):
+        ids = set(ids)
+        ubicaciones = self._mapa_ubicaciones()
+        for id_fragmento in ids:
+            ubicacion = ubicaciones.pop(id_fragmento, None)
+            if ubicacion is not None:
+                s = self.segmentos[ubicacion[0]]
+                s.vivos[ubicacion[1]] = False
+                self._modificados.add(s.archivo)
+                self.total -= 1
+                self.longitud_total -= int(s.longitudes[ubicacion[1]])
+        p_ids = self._pendientes[0]
+        if ids and any(i in ids for i in p_ids):
+            conservar = [n for n, i in enumerate(p_ids) if i not in ids]
+            self._pendientes = tuple([lista[n] for n in conservar] for lista in self._pendientes)
+
+    def actualizar_paginas(self, ids: List[str], metadatos: List[dict]):
+        """Actualiza la página de fragmentos conservados cuyo texto se movió."""
+        ubicaciones = self._mapa_ubicaciones()
+        for id_fragmento, md in zip(ids, metadatos):
+            ubicacion = ubicaciones.get(id_fragmento)
+            if ubicacion is None:
+                continue
+            s = self.segmentos[ubicacion[0]]
+            pagina = int(md.get(CAMPO_PAGINA, 0))
+            if s.paginas[ubicacion[1]] != pagina:
+                s.paginas[ubicacion[1]] = pagina
+                self._modificados.add(s.archivo)
+
+    def _cerrar_pendientes(self):
+        if self._pendientes[0]:
+            self.segmentos.append(_construir_segmento(*self._pendientes))
+            self._pendientes = ([], [], [], [])
+            self._recalcular()
+
+    def _recalcular(self):
+        self._ubicaciones = None
+        self.total = sum(int(s.vivos.sum()) for s in self.segmentos)
+        self.longitud_total = sum(int(s.longitudes[s.vivos].sum()) for s in self.segmentos)
+
+    def _mapa_ubicaciones(self) -> Dict[str, Tuple[int, int]]:
+        """ID -> (segmento, posición) de los fragmentos vivos; solo lo necesita la ingesta."""
+        if self._ubicaciones is None:
+            self._ubicaciones = {}
+            for n, s in enumerate(self.segmentos):
+                for posicion in np.flatnonzero(s.vivos):
+                    self._ubicaciones[str(s.ids[posicion])] = (n, int(posicion))
+        return self._ubicaciones
+
+    def _fraccion_eliminados(self) -> float:
+        capacidad = sum(len(s.ids) for s in self.segmentos)
+        return 1 - self.total / capacidad if capacidad else 0.0
+
+    # --- búsqueda ---
+
+    def buscar(self, consulta: str, k: int = 20, documentos: Optional[Iterable[str]] = None,
+               paginas: Optional[Iterable[int]] = None) -> List[Tuple[str, float]]:
+        """Top-k (id, puntaje BM25), con los mismos filtros por documento y página que Chroma."""
+        terminos = list(dict.fromkeys(tokenizar(consulta)))
+        if not terminos or not self.total:
+            return []
+        promedio = self.longitud_total / self.total
+        postings = [[s.postings(t) for t in terminos] for s in self.segmentos]
+        # Frecuencia documental sobre los fragmentos vivos de todos los segmentos
+        df = np.zeros(len(terminos))
+        for s, por_termino in zip(self.segmentos, postings):
+            for j, sl in enumerate(por_termino):
+                if sl is not None:
+                    df[j] += s.vivos[s.fragmentos[sl]].sum()
+        idf = np.log(1 + (self.total - df + 0.5) / (df + 0.5))
+
+        documentos = list(documentos) if documentos else None
+        paginas = [int(p) for p in paginas] if paginas else None
+        candidatos: List[Tuple[str, float]] = []
+        for s, por_termino in zip(self.segmentos, postings):
+            puntajes = np.zeros(len(s.ids), dtype=np.float32)
+            normalizacion = K1 * (1 - B + B * s.longitudes / promedio)
+            for j, sl in enumerate(por_termino):
+                if sl is None:
+                    continue
+                f = s.fragmentos[sl]
+                tf = s.frecuencias[sl].astype(np.float32)
+                puntajes[f] += idf[j] * tf * (K1 + 1) / (tf + normalizacion[f])
+            mascara = s.vivos & (puntajes > 0)
+            if documentos is not None:
+                mascara &= np.isin(s.documentos, documentos)
+            if paginas is not None:
+                mascara &= np.isin(s.paginas, paginas)
+            posiciones = np.flatnonzero(mascara)
+            if len(posiciones) > k:
+                posiciones = posiciones[np.argpartition(-puntajes[posiciones], k)[:k]]
+            candidatos.extend((str(s.ids[p]), float(puntajes[p])) for p in posiciones)
+        candidatos.sort(key=lambda c: c[1], reverse=True)
+        return candidatos[:k]
+
+def reconstruir_indice_lexico(directorio_persistencia: str, av, nombre_coleccion: str = "catchai_docs",
+                              lote: int = 5000) -> IndiceLexico:
+    """Reconstruye el índice recorriendo la colección (índices previos o desincronizados)."""
+    indice = IndiceLexico(directorio_persistencia, nombre_coleccion)
+    desplazamiento = 0
+    while True:
+        resultado = av._collection.get(include=["documents", "metadatas"], limit=lote, offset=desplazamiento)
+        ids = resultado.get("ids") or []
+        if not ids:
+            break
+        indice.agregar(ids, resultado.get("documents") or [], resultado.get("metadatas") or [])
+        desplazamiento += len(ids)
+    indice.guardar()
+    logger.info(f"Índice BM25 reconstruido con {indice.total} fragmentos")
+    return indice
+
+def abrir_indice_lexico(directorio_persistencia: str, av, nombre_coleccion: str = "catchai_docs") -> IndiceLexico:
+    """Carga el índice y lo reconstruye si no coincide con la colección.
+
+    Escribe en el directorio del índice: solo se llama con bloqueo_escritura.
+    """
+    try:
+        indice = IndiceLexico.cargar(directorio_persistencia, nombre_coleccion)
+    except Exception as e:
+        logger.warning(f"Índice BM25 ilegible, se reconstruye: {e}")
+        indice = None
+    if indice is None or indice.total != av._collection.count():
+        indice = reconstruir_indice_lexico(directorio_persistencia, av, nombre_coleccion)
+    return indice
+
+_indices: Dict[Tuple[str, str], IndiceLexico] = {}
+_lock = threading.Lock()
+
+def _cargar_solo_lectura(directorio_persistencia: str, nombre_coleccion: str) -> IndiceLexico:
+    """Último manifiesto guardado, sin escribir nada; vacío si no se puede leer."""
+    for intento in range(2):
+        try:
+            return IndiceLexico.cargar(directorio_persistencia, nombre_coleccion)
+        except Exception as e:
+            # Una ingesta pudo reemplazar el manifiesto y borrar sus archivos mientras se leía
+            if intento:
+                logger.warning(f"Índice BM25 ilegible, se busca solo por vectores: {e}")
+    return IndiceLexico(directorio_persistencia, nombre_coleccion)
+
+def obtener_indice_lexico(directorio_persistencia: str, av, nombre_coleccion: str = "catchai_docs") -> IndiceLexico:
+    """Instancia compartida de solo lectura; se vuelve a cargar tras cada ingesta.
+
+    Nunca reconstruye: si no coincide con la colección (p. ej. hay una ingesta
+    en curso en otro proceso) se usa igual el último manifiesto, y la
+    reconstrucción queda para la ingesta o reparar_indice_lexico (ingest.py),
+    que tienen el bloqueo de escritura.
+    """
+    clave = (os.path.abspath(directorio_persistencia), nombre_coleccion)
+    with _lock:
+        if clave not in _indices:
+            indice = _cargar_solo_lectura(directorio_persistencia, nombre_coleccion)
+            if indice.total != av._collection.count():
+                logger.info(f"Índice BM25 desincronizado ({indice.total} fragmentos), se usa el último guardado")
+            _indices[clave] = indice
+        return _indices[clave]
+
+def invalidar_indice_lexico(directorio_persistencia: str, nombre_coleccion: Optional[str] = None):
+    directorio = os.path.abspath(directorio_persistencia)
+    with _lock:
+        for clave in [c for c in _indices if c[0] == directorio and (nombre_coleccion is None or c[1] == nombre_coleccion)]:
+            _indices.pop(clave, None)
+
+def eliminar_indice_lexico(directorio_persistencia: str, nombre_coleccion: str):
+    """Borra los archivos del índice de una colección (limpieza de un espacio de trabajo)."""
+    invalidar_indice_lexico(directorio_persistencia, nombre_coleccion)
+    shutil.rmtree(os.path.join(directorio_persistencia, DIRECTORIO, nombre_coleccion), ignore_errors=True)
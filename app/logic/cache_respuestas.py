@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+import logging
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Caché semántica de respuestas: una pregunta igual o casi igual sobre la misma
+# versión del índice reutiliza la respuesta y las citas sin llamar al LLM.
+_cache = None
+_lock_cache = threading.Lock()
+
+def normalizar_pregunta(pregunta: str) -> str:
+    """Minúsculas, sin tildes, sin signos de puntuación y con espacios simples."""
+    texto = unicodedata.normalize("NFKD", pregunta.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return re.sub(r"\s+", " ", texto).strip()
+
+class CacheRespuestas:
+    """Caché persistente en SQLite con TTL, desalojo LRU y contadores de aciertos."""
+
+    def __init__(self, ruta: str, umbral: float = 0.95, ttl_segundos: float = 86400, max_entradas: int = 5000):
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        self.umbral = umbral
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        # Matriz de embeddings en memoria por (colección, versión); se recarga tras escribir
+        self._matrices: Dict[Tuple[str, str], Tuple[List[int], np.ndarray]] = {}
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS respuestas (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   coleccion TEXT NOT NULL,
+                   version_indice TEXT NOT NULL,
+                   pregunta_normalizada TEXT NOT NULL,
+                   embedding BLOB NOT NULL,
+                   respuesta TEXT NOT NULL,
+                   citas TEXT NOT NULL,
+                   creado_en REAL NOT NULL,
+                   ultimo_acceso REAL NOT NULL)"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_respuestas_version ON respuestas(coleccion, version_indice, pregunta_normalizada)"
+        )
+        self._conn.commit()
+
+    def _matriz(self, coleccion: str, version: str) -> Tuple[List[int], np.ndarray]:
+        clave = (coleccion, version)
+        if clave not in self._matrices:
+            filas = self._conn.execute(
+                "SELECT id, embedding FROM respuestas WHERE coleccion = ? AND version_indice = ? AND creado_en >= ?",
+                (coleccion, version, time.time() - self.ttl_segundos)
+            ).fetchall()
+            ids = [fila[0] for fila in filas]
+            matriz = (np.vstack([np.frombuffer(fila[1], dtype=np.float32) for fila in filas])
+                      if filas else np.zeros((0, 0), dtype=np.float32))
+            self._matrices[clave] = (ids, matriz)
+        return self._matrices[clave]
+
+    def buscar(self, coleccion: str, version: str, pregunta: str,
+               embedding: List[float]) -> Optional[Tuple[str, List[str]]]:
+        """Devuelve (respuesta, citas) si hay una entrada vigente suficientemente similar."""
+        normalizada = normalizar_pregunta(pregunta)
+        with self._lock:
+            limite = time.time() - self.ttl_segundos
+            fila = self._conn.execute(
+                "SELECT id FROM respuestas WHERE coleccion = ? AND version_indice = ? "
+                "AND pregunta_normalizada = ? AND creado_en >= ?",
+                (coleccion, version, normalizada, limite)
+            ).fetchone()
+            id_encontrado = fila[0] if fila else None
+
+            if id_encontrado is None:
+                ids, matriz = self._matriz(coleccion, version)
+                if ids:
+                    vector = np.asarray(embedding, dtype=np.float32)
+                    similitudes = matriz @ vector / (np.linalg.norm(matriz, axis=1) * np.linalg.norm(vector) + 1e-12)
+                    mejor = int(np.argmax(similitudes))
+                    if similitudes[mejor] >= self.umbral:
+                        id_encontrado = ids[mejor]
+
+            if id_encontrado is None:
+                self.fallos += 1
+                return None
+            fila = self._conn.execute("SELECT respuesta, citas FROM respuestas WHERE id = ?",
+                                      (id_encontrado,)).fetchone()
+            if fila is None:
+                self.fallos += 1
+                return None
+            self._conn.execute("UPDATE respuestas SET ultimo_acceso = ? WHERE id = ?", (time.time(), id_encontrado))
+            self._conn.commit()
+            self.aciertos += 1
+            return fila[0], json.loads(fila[1])
+
+    def guardar(self, coleccion: str, version: str, pregunta: str, embedding: List[float],
+                respuesta: str, citas: List[str]):
+        ahora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO respuestas (coleccion, version_indice, pregunta_normalizada, embedding, respuesta, "
+                "citas, creado_en, ultimo_acceso) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (coleccion, version, normalizar_pregunta(pregunta), np.asarray(embedding, dtype=np.float32).tobytes(),
+                 respuesta, json.dumps(citas, ensure_ascii=False), ahora, ahora)
+            )
+            # TTL y límite de tamaño (LRU por último acceso)
+            self._conn.execute("DELETE FROM respuestas WHERE creado_en < ?", (ahora - self.ttl_segundos,))
+            total = self._conn.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+            if total > self.max_entradas:
+                self._conn.execute(
+                    "DELETE FROM respuestas WHERE id IN (SELECT id FROM respuestas ORDER BY ultimo_acceso LIMIT ?)",
+                    (total - self.max_entradas,)
+                )
+            self._conn.commit()
+            self._matrices.clear()
+
+    def invalidar(self, coleccion: Optional[str] = None):
+        """Elimina las entradas de una colección (o todas)."""
+        with self._lock:
+            if coleccion is None:
+                self._conn.execute("DELETE FROM respuestas")
+            else:
+                self._conn.execute("DELETE FROM respuestas WHERE coleccion = ?", (coleccion,))
+            self._conn.commit()
+            self._matrices.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": total,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+        }
+
+def obtener_cache_respuestas() -> Optional[CacheRespuestas]:
+    """Caché compartida por proceso; None si está desactivada (ANSWER_CACHE_PATH vacío)."""
+    global _cache
+    ruta = os.getenv("ANSWER_CACHE_PATH", "/app/data/cache/respuestas.sqlite")
+    if not ruta:
+        return None
+    if _cache is None:
+        with _lock_cache:
+            if _cache is None:
+                try:
+                    _cache = CacheRespuestas(
+                        ruta,
+                        umbral=float(os.getenv("ANSWER_CACHE_UMBRAL", "0.95")),
+                        ttl_segundos=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+                        max_entradas=int(os.getenv("ANSWER_CACHE_MAX", "5000")),
+                    )
+                except Exception as e:
+                    logger.warning(f"No se pudo abrir la caché de respuestas ({ruta}): {e}")
+                    return None
+    return _cache
+
+def invalidar_cache_respuestas(coleccion: Optional[str] = None):
+    """Descarta respuestas cacheadas tras cambios en el índice."""
+    cache = obtener_cache_respuestas()
+    if cache:
+        cache.invalidar(coleccion)
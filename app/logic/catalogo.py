@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import time
+import uuid
+import logging
+from contextlib import closing
+from dataclasses import dataclass
+from typing import List, Optional
+from .esquema import CAMPO_DOCUMENTO, CAMPO_HASH, CAMPO_PAGINA, CAMPO_PAGINAS_DOCUMENTO
+
+logger = logging.getLogger(__name__)
+
+# Catálogo de documentos indexados, junto a la colección de Chroma. Las vistas de
+# estadísticas lo leen en O(número de documentos) sin recorrer los fragmentos.
+NOMBRE_ARCHIVO = "catalogo.sqlite"
+
+@dataclass
+class EntradaCatalogo:
+    nombre: str
+    hash_documento: str
+    paginas: int
+    fragmentos: int
+    tamaño_mb: float
+    ingestado_en: float
+
+def _conectar(directorio_persistencia: str) -> sqlite3.Connection:
+    os.makedirs(directorio_persistencia, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(directorio_persistencia, NOMBRE_ARCHIVO), timeout=30)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS documentos (
+               coleccion TEXT NOT NULL,
+               nombre TEXT NOT NULL,
+               hash_documento TEXT NOT NULL,
+               paginas INTEGER NOT NULL,
+               fragmentos INTEGER NOT NULL,
+               tamano_mb REAL NOT NULL,
+               ingestado_en REAL NOT NULL,
+               PRIMARY KEY (coleccion, nombre))"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS resumenes (
+               coleccion TEXT NOT NULL,
+               nombre TEXT NOT NULL,
+               hash_documento TEXT NOT NULL,
+               resumen TEXT NOT NULL,
+               creado_en REAL NOT NULL,
+               PRIMARY KEY (coleccion, nombre))"""
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS versiones (coleccion TEXT PRIMARY KEY, version TEXT NOT NULL)")
+    return conn
+
+def registrar_documentos(directorio_persistencia: str, nombre_coleccion: str, entradas: List[EntradaCatalogo]):
+    """Inserta o reemplaza varias entradas en una sola transacción."""
+    if not entradas:
+        return
+    with closing(_conectar(directorio_persistencia)) as conn, conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO documentos VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(nombre_coleccion, e.nombre, e.hash_documento, e.paginas, e.fragmentos, e.tamaño_mb, e.ingestado_en)
+             for e in entradas]
+        )
+
+def eliminar_documentos(directorio_persistencia: str, nombre_coleccion: str, nombres: Optional[List[str]] = None):
+    """Elimina entradas del catálogo (todas las de la colección si nombres es None)."""
+    with closing(_conectar(directorio_persistencia)) as conn, conn:
+        if nombres is None:
+            conn.execute("DELETE FROM documentos WHERE coleccion = ?", (nombre_coleccion,))
+            conn.execute("DELETE FROM resumenes WHERE coleccion = ?", (nombre_coleccion,))
+        else:
+            for tabla in ("documentos", "resumenes"):
+                conn.executemany(f"DELETE FROM {tabla} WHERE coleccion = ? AND nombre = ?",
+                                 [(nombre_coleccion, n) for n in nombres])
+
+def listar_documentos(directorio_persistencia: str, nombre_coleccion: str = "catchai_docs") -> List[EntradaCatalogo]:
+    """Documentos de la colección, ordenados por nombre."""
+    with closing(_conectar(directorio_persistencia)) as conn:
+        filas = conn.execute(
+            "SELECT nombre, hash_documento, paginas, fragmentos, tamano_mb, ingestado_en "
+            "FROM documentos WHERE coleccion = ? ORDER BY nombre",
+            (nombre_coleccion,)
+        ).fetchall()
+    return [EntradaCatalogo(*fila) for fila in filas]
+
+def listar_colecciones(directorio_persistencia: str, limite: Optional[int] = None) -> List[str]:
+    """Colecciones con documentos, de la ingestada más recientemente a la más antigua."""
+    with closing(_conectar(directorio_persistencia)) as conn:
+        filas = conn.execute(
+            "SELECT coleccion FROM documentos GROUP BY coleccion ORDER BY MAX(ingestado_en) DESC LIMIT ?",
+            (limite if limite is not None else -1,)
+        ).fetchall()
+    return [fila[0] for fila in filas]
+
+def obtener_documento(directorio_persistencia: str, nombre_coleccion: str, nombre: str) -> Optional[EntradaCatalogo]:
+    with closing(_conectar(directorio_persistencia)) as conn:
+        fila = conn.execute(
+            "SELECT nombre, hash_documento, paginas, fragmentos, tamano_mb, ingestado_en "
+            "FROM documentos WHERE coleccion = ? AND nombre = ?",
+            (nombre_coleccion, nombre)
+        ).fetchone()
+    return EntradaCatalogo(*fila) if fila else None
+
+def guardar_resumen(directorio_persistencia: str, nombre_coleccion: str, nombre: str,
+                    hash_documento: str, resumen: str):
+    """Guarda el resumen de un documento, versionado por el hash de su contenido."""
+    with closing(_conectar(directorio_persistencia)) as conn, conn:
+        conn.execute("INSERT OR REPLACE INTO resumenes VALUES (?, ?, ?, ?, ?)",
+                     (nombre_coleccion, nombre, hash_documento, resumen, time.time()))
+
+def obtener_resumen(directorio_persistencia: str, nombre_coleccion: str, nombre: str,
+                    hash_documento: str) -> Optional[str]:
+    """Resumen guardado, solo si corresponde a la versión actual del documento."""
+    with closing(_conectar(directorio_persistencia)) as conn:
+        fila = conn.execute(
+            "SELECT resumen FROM resumenes WHERE coleccion = ? AND nombre = ? AND hash_documento = ?",
+            (nombre_coleccion, nombre, hash_documento)
+        ).fetchone()
+    return fila[0] if fila else None
+
+def version_indice(directorio_persistencia: str, nombre_coleccion: str = "catchai_docs") -> str:
+    """Versión actual del índice; cambia con cada ingesta o limpieza.
+
+    Es un token aleatorio, no un contador: al borrar el directorio (y el
+    catálogo) la versión nueva nunca coincide con una anterior.
+    """
+    with closing(_conectar(directorio_persistencia)) as conn, conn:
+        fila = conn.execute("SELECT version FROM versiones WHERE coleccion = ?", (nombre_coleccion,)).fetchone()
+        if fila:
+            return fila[0]
+        version = uuid.uuid4().hex
+        conn.execute("INSERT OR IGNORE INTO versiones VALUES (?, ?)", (nombre_coleccion, version))
+        return conn.execute("SELECT version FROM versiones WHERE coleccion = ?", (nombre_coleccion,)).fetchone()[0]
+
+def renovar_version_indice(directorio_persistencia: str, nombre_coleccion: str = "catchai_docs") -> str:
+    version = uuid.uuid4().hex
+    with closing(_conectar(directorio_persistencia)) as conn, conn:
+        conn.execute("INSERT OR REPLACE INTO versiones VALUES (?, ?)", (nombre_coleccion, version))
+    return version
+
+def reconstruir_catalogo(directorio_persistencia: str, av, nombre_coleccion: str = "catchai_docs") -> List[EntradaCatalogo]:
+    """Reconstruye el catálogo recorriendo los metadatos de la colección.
+
+    Solo se usa para índices creados antes de existir el catálogo; después se
+    mantiene en cada ingesta.
+    """
+    resultado = av._collection.get(include=["metadatas"])
+    documentos = {}
+    for md in resultado.get("metadatas") or []:
+        if not md or CAMPO_DOCUMENTO not in md:
+            continue
+        entrada = documentos.setdefault(md[CAMPO_DOCUMENTO], {
+            "hash": md.get(CAMPO_HASH, ""), "paginas": set(),
+            "total_paginas": int(md.get(CAMPO_PAGINAS_DOCUMENTO, 0)), "fragmentos": 0
+        })
+        entrada["paginas"].add(md.get(CAMPO_PAGINA, 0))
+        entrada["fragmentos"] += 1
+
+    ahora = time.time()
+    entradas = [
+        EntradaCatalogo(nombre, d["hash"], d["total_paginas"] or len(d["paginas"]), d["fragmentos"], 0.0, ahora)
+        for nombre, d in documentos.items()
+    ]
+    registrar_documentos(directorio_persistencia, nombre_coleccion, entradas)
+    logger.info(f"Catálogo reconstruido con {len(entradas)} documentos")
+    return sorted(entradas, key=lambda e: e.nombre)
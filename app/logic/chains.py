@@ -1,71 +1,145 @@
 import os
-from google import genai
-from google.genai import types
-from .prompts import PROMPT_RESUMEN, PROMPT_COMPARACION, PROMPT_CLASIFICACION_TEMATICA
-from .retriever import cargar_almacen_vectores, buscar_contexto
+import asyncio
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from .prompts import (PROMPT_RESUMEN, PROMPT_RESUMEN_SECCION, PROMPT_RESUMEN_REDUCCION,
+                      PROMPT_COMPARACION, PROMPT_CONDENSACION, PROMPT_CLASIFICACION_TEMATICA)
+from .retriever import cargar_almacen_vectores, buscar_contexto, listar_documentos_indexados
+from .catalogo import obtener_documento, obtener_resumen, guardar_resumen
+from .esquema import CAMPO_ORDEN, CAMPO_PAGINA, construir_filtro
+from .llm import ejecutar_en_loop, generar, generar_async
+from .contexto import superposicion
 import logging
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def _cliente():
-    """Inicializa el cliente de Google Gemini."""
-    try:
-        clave_api = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not clave_api:
-            raise ValueError("No se encontró GOOGLE_API_KEY o GEMINI_API_KEY en las variables de entorno")
-        return genai.Client(api_key=clave_api)
-    except Exception as e:
-        logger.error(f"Error inicializando cliente Gemini: {e}")
-        raise
+# Resúmenes jerárquicos (map-reduce) precalculados en la ingesta
+CARACTERES_POR_SECCION = int(os.getenv("RESUMEN_CARACTERES_SECCION", "12000"))
+CONCURRENCIA_RESUMEN = int(os.getenv("RESUMEN_CONCURRENCIA", "4"))
+
+# Comparación asíncrona: llamadas simultáneas al LLM y tiempo límite de la operación completa
+CONCURRENCIA_LLM = int(os.getenv("LLM_CONCURRENCIA", "4"))
+TIMEOUT_COMPARACION = float(os.getenv("COMPARACION_TIMEOUT", "90"))
 
 def _llamar_modelo(modelo, texto):
-    """Llama al modelo Gemini con manejo de errores."""
+    """Llama al modelo Gemini a través de la pasarela (reintentos, límite de tasa y plazo)."""
     try:
-        cliente = _cliente()
-        
-        # Corregir la llamada a Gemini API
-        try:
-            # Método 1: Usar generate_content con texto simple
-            respuesta = cliente.models.generate_content(
-                model=modelo,
-                contents=texto
-            )
-        except Exception as e1:
-            logger.warning(f"Primer método falló: {e1}")
-            try:
-                # Método 2: Usar el formato de tipos correcto
-                respuesta = cliente.models.generate_content(
-                    model=modelo,
-                    contents=[types.Content(role="user", parts=[types.Part.from_text(texto)])]
-                )
-            except Exception as e2:
-                logger.warning(f"Segundo método falló: {e2}")
-                # Método 3: Usar el formato más simple
-                respuesta = cliente.models.generate_content(
-                    model=modelo,
-                    contents=texto
-                )
-        
-        return (respuesta.text or "").strip()
+        return generar(texto, modelo)
     except Exception as e:
         logger.error(f"Error llamando al modelo: {e}")
         return f"❌ Error generando respuesta: {str(e)}"
 
-def resumir_documento(nombre_documento, directorio_persistencia):
+def _secciones_documento(av, nombre_documento) -> List[tuple]:
+    """Agrupa los fragmentos del documento, en orden de lectura, en secciones de tamaño acotado."""
+    resultado = av._collection.get(where=construir_filtro(documento=nombre_documento),
+                                   include=["documents", "metadatas"])
+    fragmentos = sorted(zip(resultado.get("metadatas") or [], resultado.get("documents") or []),
+                        key=lambda par: (par[0].get(CAMPO_PAGINA, 0), par[0].get(CAMPO_ORDEN, 0)))
+    secciones, textos, paginas, tamaño = [], [], [], 0
+    for md, texto in fragmentos:
+        # Quitar la superposición con el fragmento anterior de la misma página
+        if textos and paginas[-1] == md.get(CAMPO_PAGINA, 0):
+            texto = texto[superposicion(textos[-1], texto):]
+            if not texto.strip():
+                continue
+        if textos and tamaño + len(texto) > CARACTERES_POR_SECCION:
+            secciones.append((paginas[0], paginas[-1], "\n".join(textos)))
+            textos, paginas, tamaño = [], [], 0
+        textos.append(texto)
+        paginas.append(md.get(CAMPO_PAGINA, 0))
+        tamaño += len(texto)
+    if textos:
+        secciones.append((paginas[0], paginas[-1], "\n".join(textos)))
+    return secciones
+
+def _reducir_resumenes(modelo, nombre_documento, resumenes: List[str], pool) -> str:
+    """Combina resúmenes parciales por grupos hasta que quepan en una sola sección."""
+    while sum(len(r) for r in resumenes) > CARACTERES_POR_SECCION and len(resumenes) > 1:
+        grupos, grupo, tamaño = [], [], 0
+        for resumen in resumenes:
+            if grupo and tamaño + len(resumen) > CARACTERES_POR_SECCION:
+                grupos.append(grupo)
+                grupo, tamaño = [], 0
+            grupo.append(resumen)
+            tamaño += len(resumen)
+        grupos.append(grupo)
+        if len(grupos) == len(resumenes):
+            break  # cada resumen ya ocupa una sección: no se puede reducir más por grupos
+        prompts = [PROMPT_RESUMEN_REDUCCION.format(doc_name=nombre_documento, resumenes="\n\n".join(g))
+                   for g in grupos]
+        resumenes = list(pool.map(lambda p: _llamar_modelo(modelo, p), prompts))
+        if any(r.startswith("❌") for r in resumenes):
+            raise RuntimeError(next(r for r in resumenes if r.startswith("❌")))
+    return "\n\n".join(resumenes)
+
+def generar_resumen_jerarquico(nombre_documento, directorio_persistencia, nombre_coleccion="catchai_docs"):
+    """Resume un documento completo: secciones en paralelo (map) y síntesis final (reduce)."""
+    av = cargar_almacen_vectores(directorio_persistencia, nombre_coleccion)
+    if not av:
+        raise ValueError("No hay documentos indexados")
+    secciones = _secciones_documento(av, nombre_documento)
+    if not secciones:
+        raise ValueError(f"No se encontraron fragmentos del documento '{nombre_documento}'")
+
+    modelo = os.getenv("LLM_MODEL", "gemini-2.0-flash-001")
+    prompts = [PROMPT_RESUMEN_SECCION.format(doc_name=nombre_documento, paginas=f"{inicio}-{fin}", texto=texto)
+               for inicio, fin, texto in secciones]
+    with ThreadPoolExecutor(max_workers=CONCURRENCIA_RESUMEN) as pool:
+        parciales = list(pool.map(lambda p: _llamar_modelo(modelo, p), prompts))
+        if any(r.startswith("❌") for r in parciales):
+            raise RuntimeError(next(r for r in parciales if r.startswith("❌")))
+        combinado = _reducir_resumenes(modelo, nombre_documento, parciales, pool)
+
+    prompt = PROMPT_RESUMEN.format(doc_name=nombre_documento) + f"\n\nResúmenes por sección:\n{combinado}\n"
+    resultado = _llamar_modelo(modelo, prompt)
+    if resultado.startswith("❌"):
+        raise RuntimeError(resultado)
+    return resultado
+
+def precomputar_resumenes(nombres_documentos, directorio_persistencia, nombre_coleccion="catchai_docs") -> int:
+    """Genera y guarda resúmenes de los documentos cuyo resumen falta o quedó desactualizado.
+
+    El resumen se versiona por el hash del contenido: los documentos sin
+    cambios conservan el suyo. Retorna cuántos resúmenes se generaron.
+    """
+    generados = 0
+    for nombre in nombres_documentos:
+        entrada = obtener_documento(directorio_persistencia, nombre_coleccion, nombre)
+        if entrada is None or obtener_resumen(directorio_persistencia, nombre_coleccion, nombre, entrada.hash_documento):
+            continue
+        try:
+            resumen = generar_resumen_jerarquico(nombre, directorio_persistencia, nombre_coleccion)
+            guardar_resumen(directorio_persistencia, nombre_coleccion, nombre, entrada.hash_documento, resumen)
+            generados += 1
+            logger.info(f"Resumen precalculado para {nombre}")
+        except Exception as e:
+            logger.error(f"Error precalculando resumen de {nombre}: {e}")
+    return generados
+
+def resumir_documento(nombre_documento, directorio_persistencia, nombre_coleccion="catchai_docs"):
     """Genera un resumen ejecutivo de un documento."""
     try:
         if not nombre_documento or not nombre_documento.strip():
             return "❌ Por favor, especifica el nombre del documento a resumir."
             
-        av = cargar_almacen_vectores(directorio_persistencia)
+        # Resumen precalculado en la ingesta, si corresponde a la versión actual del documento
+        entrada = obtener_documento(directorio_persistencia, nombre_coleccion, nombre_documento)
+        if entrada is not None:
+            resumen = obtener_resumen(directorio_persistencia, nombre_coleccion, nombre_documento, entrada.hash_documento)
+            if resumen:
+                return f"**📋 Resumen de {nombre_documento}**\n\n{resumen}"
+            
+        av = cargar_almacen_vectores(directorio_persistencia, nombre_coleccion)
         if not av:
             return "❌ No hay documentos indexados. Por favor, sube y procesa algunos PDFs primero."
             
-        # Buscar contexto relevante del documento
-        contexto, _ = buscar_contexto(av, f"Temas principales del documento {nombre_documento}", k=8)
-        if not contexto or contexto == "No hay documentos indexados para buscar.":
+        # Buscar contexto solo dentro del documento (filtro en Chroma)
+        contexto, citas = buscar_contexto(av, "Temas principales, objetivos, hallazgos y conclusiones", k=8,
+                                          documento=nombre_documento)
+        if not citas:
             return f"❌ No se encontró información del documento '{nombre_documento}'."
             
         prompt = PROMPT_RESUMEN.format(doc_name=nombre_documento) + f"\n\nContexto:\n{contexto}\n"
@@ -81,50 +155,91 @@ def resumir_documento(nombre_documento, directorio_persistencia):
         logger.error(f"Error resumiendo documento: {e}")
         return f"❌ Error inesperado: {str(e)}"
 
-def comparar_documentos(documento_a, documento_b, directorio_persistencia):
-    """Compara dos documentos."""
+async def _llamar_modelo_async(modelo, texto, semaforo: asyncio.Semaphore):
+    """Llamada asíncrona a Gemini (pasarela, cliente aio), acotada por el semáforo."""
+    async with semaforo:
+        try:
+            return await generar_async(texto, modelo)
+        except Exception as e:
+            logger.error(f"Error llamando al modelo: {e}")
+            return f"❌ Error generando respuesta: {str(e)}"
+
+async def comparar_documentos_async(documento_a, documento_b, directorio_persistencia, condensar=None,
+                                    nombre_coleccion="catchai_docs"):
+    """Compara dos documentos con recuperaciones y llamadas al LLM concurrentes.
+
+    Las búsquedas de ambos documentos corren en paralelo; con `condensar`
+    (por defecto COMPARACION_CONDENSAR) cada contexto se condensa en una
+    llamada propia, también en paralelo, antes del prompt de comparación.
+    """
+    av = cargar_almacen_vectores(directorio_persistencia, nombre_coleccion)
+    if not av:
+        return "❌ No hay documentos indexados. Por favor, sube y procesa algunos PDFs primero."
+
+    # Buscar contexto de cada documento, filtrando por documento en Chroma (en hilos: Chroma es síncrono)
+    consulta = "Objetivos, hallazgos, conclusiones, supuestos y riesgos"
+    (contexto_a, citas_a), (contexto_b, citas_b) = await asyncio.gather(
+        asyncio.to_thread(buscar_contexto, av, consulta, 6, documento_a),
+        asyncio.to_thread(buscar_contexto, av, consulta, 6, documento_b),
+    )
+    
+    if not citas_a:
+        return f"❌ No se encontró información del documento '{documento_a}'."
+    if not citas_b:
+        return f"❌ No se encontró información del documento '{documento_b}'."
+
+    modelo = os.getenv("LLM_MODEL", "gemini-2.0-flash-001")
+    semaforo = asyncio.Semaphore(CONCURRENCIA_LLM)
+    if condensar is None:
+        condensar = os.getenv("COMPARACION_CONDENSAR", "0") == "1"
+    if condensar:
+        contexto_a, contexto_b = await asyncio.gather(
+            _llamar_modelo_async(modelo, PROMPT_CONDENSACION.format(doc_name=documento_a, texto=contexto_a), semaforo),
+            _llamar_modelo_async(modelo, PROMPT_CONDENSACION.format(doc_name=documento_b, texto=contexto_b), semaforo),
+        )
+        for condensado in (contexto_a, contexto_b):
+            if condensado.startswith("❌"):
+                return condensado
+        
+    prompt = PROMPT_COMPARACION.format(doc_a=documento_a, doc_b=documento_b) + \
+             f"\n\nContexto {documento_a}:\n{contexto_a}\n\nContexto {documento_b}:\n{contexto_b}\n"
+    resultado = await _llamar_modelo_async(modelo, prompt, semaforo)
+    
+    if resultado.startswith("❌"):
+        return resultado
+        
+    return f"**⚖️ Comparación: {documento_a} vs {documento_b}**\n\n{resultado}"
+
+def comparar_documentos(documento_a, documento_b, directorio_persistencia, condensar=None,
+                        nombre_coleccion="catchai_docs"):
+    """Compara dos documentos (ejecuta comparar_documentos_async con un tiempo límite total)."""
     try:
         if not documento_a or not documento_b or not documento_a.strip() or not documento_b.strip():
             return "❌ Por favor, especifica ambos documentos para comparar."
             
         if documento_a == documento_b:
             return "❌ No puedes comparar un documento consigo mismo."
-            
-        av = cargar_almacen_vectores(directorio_persistencia)
-        if not av:
-            return "❌ No hay documentos indexados. Por favor, sube y procesa algunos PDFs primero."
-            
-        # Buscar contexto de ambos documentos
-        contexto_a, _ = buscar_contexto(av, f"Temas claves de {documento_a}", k=6)
-        contexto_b, _ = buscar_contexto(av, f"Temas claves de {documento_b}", k=6)
-        
-        if not contexto_a or contexto_a == "No hay documentos indexados para buscar.":
-            return f"❌ No se encontró información del documento '{documento_a}'."
-        if not contexto_b or contexto_b == "No hay documentos indexados para buscar.":
-            return f"❌ No se encontró información del documento '{documento_b}'."
-            
-        prompt = PROMPT_COMPARACION.format(doc_a=documento_a, doc_b=documento_b) + \
-                 f"\n\nContexto {documento_a}:\n{contexto_a}\n\nContexto {documento_b}:\n{contexto_b}\n"
-        
-        modelo = os.getenv("LLM_MODEL", "gemini-2.0-flash-001")
-        resultado = _llamar_modelo(modelo, prompt)
-        
-        if resultado.startswith("❌"):
-            return resultado
-            
-        return f"**⚖️ Comparación: {documento_a} vs {documento_b}**\n\n{resultado}"
+
+        # Loop de fondo compartido: el cliente aio de Gemini se reutiliza entre comparaciones
+        return ejecutar_en_loop(asyncio.wait_for(
+            comparar_documentos_async(documento_a, documento_b, directorio_persistencia, condensar, nombre_coleccion),
+            timeout=TIMEOUT_COMPARACION
+        ))
         
+    except asyncio.TimeoutError:
+        logger.error(f"Comparación superó el tiempo límite de {TIMEOUT_COMPARACION}s")
+        return f"❌ La comparación superó el tiempo límite ({TIMEOUT_COMPARACION:.0f}s). Intenta nuevamente."
     except Exception as e:
         logger.error(f"Error comparando documentos: {e}")
         return f"❌ Error inesperado: {str(e)}"
 
-def clasificar_topicos(consulta, directorio_persistencia):
+def clasificar_topicos(consulta, directorio_persistencia, nombre_coleccion="catchai_docs"):
     """Clasifica tópicos basado en una consulta."""
     try:
         if not consulta or not consulta.strip():
             return "❌ Por favor, especifica una consulta para la clasificación temática."
             
-        av = cargar_almacen_vectores(directorio_persistencia)
+        av = cargar_almacen_vectores(directorio_persistencia, nombre_coleccion)
         if not av:
             return "❌ No hay documentos indexados. Por favor, sube y procesa algunos PDFs primero."
             
@@ -146,39 +261,21 @@ def clasificar_topicos(consulta, directorio_persistencia):
         logger.error(f"Error clasificando tópicos: {e}")
         return f"❌ Error inesperado: {str(e)}"
 
-def obtener_vista_general_documentos(directorio_persistencia):
+def obtener_vista_general_documentos(directorio_persistencia, nombre_coleccion="catchai_docs"):
     """Obtiene una vista general de todos los documentos."""
     try:
-        av = cargar_almacen_vectores(directorio_persistencia)
-        if not av:
-            return "❌ No hay documentos indexados."
-            
-        # Obtener estadísticas básicas
-        coleccion = av._collection
-        total_fragmentos = coleccion.count()
-        
-        # Obtener documentos únicos
-        documentos = coleccion.get()
-        estadisticas_documentos = {}
-        for metadatos in documentos.get('metadatas', []):
-            if metadatos and 'doc_name' in metadatos:
-                nombre_documento = metadatos['doc_name']
-                if nombre_documento not in estadisticas_documentos:
-                    estadisticas_documentos[nombre_documento] = {'paginas': set(), 'fragmentos': 0}
-                estadisticas_documentos[nombre_documento]['paginas'].add(metadatos.get('page', 0))
-                estadisticas_documentos[nombre_documento]['fragmentos'] += 1
-        
-        if not estadisticas_documentos:
+        entradas = listar_documentos_indexados(directorio_persistencia, nombre_coleccion)
+        if not entradas:
             return "❌ No se encontraron documentos en el índice."
             
         vista_general = f"**📊 Vista General de Documentos**\n\n"
-        vista_general += f"**Total de fragmentos:** {total_fragmentos}\n"
-        vista_general += f"**Documentos indexados:** {len(estadisticas_documentos)}\n\n"
+        vista_general += f"**Total de fragmentos:** {sum(e.fragmentos for e in entradas)}\n"
+        vista_general += f"**Documentos indexados:** {len(entradas)}\n\n"
         
-        for nombre_documento, estadisticas in estadisticas_documentos.items():
-            paginas = len(estadisticas['paginas'])
-            fragmentos = estadisticas['fragmentos']
-            vista_general += f"• **{nombre_documento}**: {paginas} páginas, {fragmentos} fragmentos\n"
+        for entrada in entradas:
+            ingestado = datetime.fromtimestamp(entrada.ingestado_en).strftime('%Y-%m-%d %H:%M')
+            vista_general += (f"• **{entrada.nombre}**: {entrada.paginas} páginas, {entrada.fragmentos} fragmentos, "
+                              f"{entrada.tamaño_mb}MB (indexado {ingestado})\n")
             
         return vista_general
         
@@ -0,0 +1,163 @@
+import os
+import threading
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+from .esquema import CAMPO_DOCUMENTO, CAMPO_PAGINA, cita
+
+logger = logging.getLogger(__name__)
+
+# Empaquetado del contexto del prompt: los fragmentos consecutivos de una misma
+# página comparten la superposición del divisor (~150 caracteres); aquí se
+# unen sin repetir ese texto y se llena un presupuesto de tokens en orden de
+# relevancia. Los tokens se cuentan con tiktoken (cl100k), una aproximación
+# del tokenizador de Gemini suficiente para acotar el tamaño del prompt.
+MAX_TOKENS_CONTEXTO = int(os.getenv("CONTEXTO_MAX_TOKENS", "1500"))
+SUPERPOSICION_MINIMA = 20
+SUPERPOSICION_MAXIMA = 400
+SEPARADOR = "\n\n"
+
+_codificador = None
+_lock = threading.Lock()
+
+def _obtener_codificador():
+    global _codificador
+    if _codificador is None:
+        with _lock:
+            if _codificador is None:
+                try:
+                    import tiktoken
+                    _codificador = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    # Sin tiktoken (o sin acceso para descargar el vocabulario) se estima por caracteres
+                    logger.warning(f"tiktoken no disponible, se estiman tokens por caracteres: {e}")
+                    _codificador = False
+    return _codificador
+
+def contar_tokens(texto: str) -> int:
+    codificador = _obtener_codificador()
+    if codificador:
+        return len(codificador.encode(texto, disallowed_special=()))
+    return (len(texto) + 3) // 4
+
+def recortar_a_tokens(texto: str, max_tokens: int) -> str:
+    """Primeros max_tokens tokens del texto."""
+    codificador = _obtener_codificador()
+    if codificador:
+        tokens = codificador.encode(texto, disallowed_special=())
+        return texto if len(tokens) <= max_tokens else codificador.decode(tokens[:max_tokens])
+    return texto[:max_tokens * 4]
+
+def superposicion(a: str, b: str, minimo: int = SUPERPOSICION_MINIMA, maximo: int = SUPERPOSICION_MAXIMA) -> int:
+    """Largo del sufijo de `a` que coincide con el inicio de `b` (0 si no se superponen)."""
+    cola = a[-maximo:]
+    inicio_b = b[:minimo]
+    if len(inicio_b) < minimo:
+        return 0
+    posicion = cola.find(inicio_b)
+    while posicion != -1:
+        if b.startswith(cola[posicion:]):
+            return len(cola) - posicion
+        posicion = cola.find(inicio_b, posicion + 1)
+    return 0
+
+@dataclass
+class Bloque:
+    """Texto continuo de una página, formado por uno o más fragmentos recuperados."""
+    documento: str
+    pagina: int
+    texto: str
+    metadatos: dict
+    fragmentos: int = 1
+
+    def absorber(self, texto: str) -> bool:
+        """Une un fragmento si se superpone con el bloque o ya está contenido en él."""
+        if texto in self.texto:
+            self.fragmentos += 1
+            return True
+        n = superposicion(self.texto, texto)
+        if n:
+            self.texto += texto[n:]
+        else:
+            n = superposicion(texto, self.texto)
+            if not n:
+                return False
+            self.texto = texto + self.texto[n:]
+        self.fragmentos += 1
+        return True
+
+@dataclass
+class ContextoEmpaquetado:
+    texto: str
+    citas: List[str]
+    tokens: int
+    fragmentos: int = 0
+    bloques: int = 0
+    omitidos: int = 0
+    recortados: int = 0
+
+def agrupar_bloques(fragmentos: Sequence[Tuple[str, dict]]) -> List[Bloque]:
+    """Une fragmentos de la misma página que se superponen, conservando el orden de relevancia.
+
+    Cada bloque queda en la posición de su fragmento más relevante. Se repite
+    hasta que no haya más uniones, porque un fragmento puede ser el puente
+    entre dos bloques ya formados.
+    """
+    bloques: List[Bloque] = []
+    for texto, md in fragmentos:
+        md = md or {}
+        documento, pagina = md.get(CAMPO_DOCUMENTO, ""), md.get(CAMPO_PAGINA, 0)
+        if not any(b.documento == documento and b.pagina == pagina and b.absorber(texto) for b in bloques):
+            bloques.append(Bloque(documento, pagina, texto, md))
+
+    unidos = True
+    while unidos:
+        unidos = False
+        for i, bloque in enumerate(bloques):
+            for otro in bloques[i + 1:]:
+                if otro.documento == bloque.documento and otro.pagina == bloque.pagina and bloque.absorber(otro.texto):
+                    bloque.fragmentos += otro.fragmentos - 1
+                    bloques.remove(otro)
+                    unidos = True
+                    break
+            if unidos:
+                break
+    return bloques
+
+def empaquetar_contexto(fragmentos: Sequence[Tuple[str, dict]],
+                        max_tokens: Optional[int] = None) -> ContextoEmpaquetado:
+    """Arma el contexto del prompt a partir de (texto, metadatos) en orden de relevancia.
+
+    Cada bloque va precedido de su cita [documento p.N]. Los bloques que no
+    caben se omiten (se prueba con los siguientes, más cortos); el primero
+    se recorta si por sí solo excede el presupuesto.
+    """
+    max_tokens = max_tokens or MAX_TOKENS_CONTEXTO
+    bloques = agrupar_bloques(fragmentos)
+    partes, citas = [], []
+    usados, omitidos, recortados = 0, 0, 0
+    separador = contar_tokens(SEPARADOR)
+    for bloque in bloques:
+        referencia = cita(bloque.metadatos)
+        parte = f"{referencia} {bloque.texto}"
+        costo = contar_tokens(parte) + (separador if partes else 0)
+        if usados + costo > max_tokens:
+            disponibles = max_tokens - usados - (separador if partes else 0)
+            if partes or disponibles <= contar_tokens(referencia):
+                omitidos += 1
+                continue
+            parte = recortar_a_tokens(parte, disponibles)
+            costo = contar_tokens(parte)
+            recortados += 1
+        partes.append(parte)
+        citas.append(referencia)
+        usados += costo
+    return ContextoEmpaquetado(
+        texto=SEPARADOR.join(partes),
+        citas=sorted(set(citas)),
+        tokens=usados,
+        fragmentos=len(fragmentos),
+        bloques=len(bloques),
+        omitidos=omitidos,
+        recortados=recortados,
+    )
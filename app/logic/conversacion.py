@@ -0,0 +1,226 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from .prompts import PROMPT_SISTEMA, PROMPT_PREGUNTA_RESPUESTA, PROMPT_HISTORIAL
+from .catalogo import version_indice
+from .contexto import contar_tokens, recortar_a_tokens
+from .llm import generar_stream
+from .bm25 import fusion_rrf
+from .metricas import medir, registrar_etapa
+from .retriever import (BUSQUEDA_HIBRIDA, CANDIDATOS_BUSQUEDA, FRAGMENTOS_CONTEXTO, MARCA_FUENTES, RRF_K,
+                        busqueda_lexica, cargar_almacen_vectores, consultar_cache, embeber_pregunta,
+                        empaquetar_fragmentos, formatear_fuentes, guardar_en_cache, leer_fragmentos,
+                        recuperar_fragmentos)
+
+logger = logging.getLogger(__name__)
+
+# Reutilización del contexto dentro de una conversación: cada conversación
+# guarda los fragmentos recuperados en los últimos turnos con sus embeddings.
+# Si la nueva pregunta es cercana a la anterior (coseno de los embeddings de
+# consulta), el contexto se arma reordenando esos fragmentos y sumando los
+# nuevos que encuentre BM25, sin búsqueda vectorial. El historial entra al
+# prompt condensado hasta un presupuesto de tokens.
+UMBRAL_SEGUIMIENTO = float(os.getenv("CONVERSACION_UMBRAL", "0.6"))
+CANDIDATOS_CONVERSACION = int(os.getenv("CONVERSACION_CANDIDATOS", "12"))
+MAX_FRAGMENTOS = int(os.getenv("CONVERSACION_MAX_FRAGMENTOS", "48"))
+MAX_TOKENS_HISTORIAL = int(os.getenv("CONVERSACION_MAX_TOKENS_HISTORIAL", "600"))
+MAX_TOKENS_RESPUESTA_HISTORIAL = int(os.getenv("CONVERSACION_MAX_TOKENS_RESPUESTA", "200"))
+MAX_CONVERSACIONES = int(os.getenv("CONVERSACION_MAX", "256"))
+
+@dataclass
+class Conversacion:
+    """Contexto recuperado recientemente en una conversación (no guarda el historial)."""
+    vector_anterior: Optional[np.ndarray] = None
+    version: Optional[str] = None
+    # id -> (texto, metadatos, embedding normalizado), el más reciente al final
+    fragmentos: "OrderedDict[str, Tuple[str, dict, np.ndarray]]" = field(default_factory=OrderedDict)
+    reutilizaciones: int = 0
+    busquedas: int = 0
+
+    def reiniciar(self):
+        self.vector_anterior = None
+        self.version = None
+        self.fragmentos.clear()
+
+    def es_seguimiento(self, vector: np.ndarray, version: str) -> bool:
+        if self.vector_anterior is None or not self.fragmentos or version != self.version:
+            return False
+        return float(self.vector_anterior @ vector) >= UMBRAL_SEGUIMIENTO
+
+    def agregar(self, fragmentos: Sequence[Tuple[str, str, dict, np.ndarray]]):
+        for id_fragmento, texto, md, vector in fragmentos:
+            self.fragmentos[id_fragmento] = (texto, md, vector)
+            self.fragmentos.move_to_end(id_fragmento)
+        while len(self.fragmentos) > MAX_FRAGMENTOS:
+            self.fragmentos.popitem(last=False)
+
+_conversaciones: "OrderedDict[str, Conversacion]" = OrderedDict()
+_lock = threading.Lock()
+
+def obtener_conversacion(id_conversacion: str) -> Conversacion:
+    """Conversación del proceso (LRU de MAX_CONVERSACIONES)."""
+    with _lock:
+        conversacion = _conversaciones.get(id_conversacion)
+        if conversacion is None:
+            conversacion = _conversaciones[id_conversacion] = Conversacion()
+        _conversaciones.move_to_end(id_conversacion)
+        while len(_conversaciones) > MAX_CONVERSACIONES:
+            _conversaciones.popitem(last=False)
+        return conversacion
+
+def _normalizar(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+def _sin_fuentes(respuesta: str) -> str:
+    return respuesta.split(MARCA_FUENTES)[0]
+
+def condensar_historial(historial: Sequence[Tuple[str, str]], max_tokens: Optional[int] = None) -> str:
+    """Últimos turnos que caben en max_tokens, del más reciente hacia atrás.
+
+    Las respuestas se recortan (sin las fuentes) para que un turno largo no
+    desplace a los anteriores.
+    """
+    max_tokens = max_tokens or MAX_TOKENS_HISTORIAL
+    partes, usados = [], 0
+    for pregunta, respuesta in reversed(historial):
+        usuario = f"Usuario: {pregunta}"
+        disponibles = max_tokens - usados - contar_tokens(usuario) - 1
+        if disponibles <= 0:
+            break
+        asistente = recortar_a_tokens(f"Asistente: {_sin_fuentes(respuesta or '').strip()}",
+                                      min(disponibles, MAX_TOKENS_RESPUESTA_HISTORIAL))
+        parte = f"{usuario}\n{asistente}"
+        partes.append(parte)
+        usados += contar_tokens(parte) + 1
+    return "\n\n".join(reversed(partes))
+
+def _leer_con_embeddings(av, ids: List[str], textos: Optional[dict] = None) -> List[Tuple[str, str, dict, np.ndarray]]:
+    """Agrega el embedding guardado en Chroma a cada fragmento (y lee el texto si no se tiene)."""
+    if not ids:
+        return []
+    textos = textos if textos is not None else leer_fragmentos(av, ids)
+    resultado = av._collection.get(ids=ids, include=["embeddings"])
+    vectores = dict(zip(resultado["ids"], resultado["embeddings"]))
+    return [(i, *textos[i], _normalizar(vectores[i])) for i in ids if i in textos and i in vectores]
+
+def _contexto_reutilizado(av, conversacion: Conversacion, pregunta: str, vector: np.ndarray, k: int):
+    """Reordena los fragmentos de la conversación por similitud y suma los nuevos de BM25."""
+    if BUSQUEDA_HIBRIDA:
+        lexicos = busqueda_lexica(av, pregunta, CANDIDATOS_BUSQUEDA, None, None)
+        conversacion.agregar(_leer_con_embeddings(av, [i for i in lexicos if i not in conversacion.fragmentos]))
+    else:
+        lexicos = []
+    ids = list(conversacion.fragmentos)
+    similitudes = np.stack([conversacion.fragmentos[i][2] for i in ids]) @ vector
+    por_similitud = [ids[j] for j in np.argsort(-similitudes)]
+    ids = fusion_rrf([por_similitud, lexicos], k=RRF_K) if lexicos else por_similitud
+    ids = [i for i in ids if i in conversacion.fragmentos][:k]
+    # Los fragmentos usados pasan a ser los más recientes
+    conversacion.agregar([(i, *conversacion.fragmentos[i]) for i in ids])
+    return [conversacion.fragmentos[i][:2] for i in ids]
+
+def _contexto_nuevo(av, conversacion: Conversacion, pregunta: str, vector_consulta: List[float], k: int):
+    """Búsqueda completa; se guardan más candidatos que los usados para los turnos siguientes."""
+    recuperados = recuperar_fragmentos(av, pregunta, k=max(k, CANDIDATOS_CONVERSACION),
+                                       vector_consulta=vector_consulta)
+    textos = {i: (texto, md) for i, texto, md in recuperados}
+    conversacion.agregar(list(reversed(_leer_con_embeddings(av, [i for i, _, _ in recuperados], textos))))
+    return [(texto, md) for _, texto, md in recuperados[:k]]
+
+def _armar_prompt(pregunta: str, contexto: str, historial: Sequence[Tuple[str, str]]) -> str:
+    with medir("prompt"):
+        partes = [PROMPT_SISTEMA]
+        condensado = condensar_historial(historial)
+        if condensado:
+            partes.append(PROMPT_HISTORIAL.format(history=condensado))
+        partes.append(PROMPT_PREGUNTA_RESPUESTA.format(question=pregunta, context=contexto))
+        return "\n\n".join(partes)
+
+def responder_en_conversacion_stream(pregunta: str, directorio_persistencia: str, id_conversacion: str,
+                                     historial: Sequence[Tuple[str, str]] = (),
+                                     nombre_coleccion: str = "catchai_docs") -> Iterator[str]:
+    """Variante de responder_pregunta_stream para el chat: usa el historial y reutiliza el contexto.
+
+    `historial` son los turnos previos (pregunta, respuesta) tal como los guarda
+    la interfaz; si viene vacío la conversación empieza de cero. La caché de
+    respuestas solo se usa en el primer turno, porque después la respuesta
+    depende del historial.
+    """
+    inicio = time.perf_counter()
+    conversacion = obtener_conversacion(id_conversacion)
+    try:
+        if not pregunta or not pregunta.strip():
+            yield "❌ Por favor, ingresa una pregunta válida."
+            return
+
+        clave = None
+        if not historial:
+            conversacion.reiniciar()
+            acierto, clave = consultar_cache(pregunta, directorio_persistencia, nombre_coleccion)
+            vector_consulta = clave[1]
+            vector = _normalizar(vector_consulta)
+            if acierto:
+                conversacion.vector_anterior = vector
+                respuesta, citas = acierto
+                yield respuesta
+                yield formatear_fuentes(citas)
+                return
+        else:
+            vector_consulta = embeber_pregunta(pregunta)
+            vector = _normalizar(vector_consulta)
+
+        av = cargar_almacen_vectores(directorio_persistencia, nombre_coleccion)
+        if not av:
+            yield "❌ No hay documentos indexados. Por favor, sube y procesa algunos PDFs primero."
+            return
+
+        version = version_indice(directorio_persistencia, nombre_coleccion)
+        if conversacion.es_seguimiento(vector, version):
+            with medir("contexto_reutilizado"):
+                fragmentos = _contexto_reutilizado(av, conversacion, pregunta, vector, FRAGMENTOS_CONTEXTO)
+            conversacion.reutilizaciones += 1
+        else:
+            if version != conversacion.version:
+                conversacion.reiniciar()
+                conversacion.version = version
+            with medir("contexto_busqueda"):
+                fragmentos = _contexto_nuevo(av, conversacion, pregunta, vector_consulta, FRAGMENTOS_CONTEXTO)
+            conversacion.busquedas += 1
+        conversacion.vector_anterior = vector
+        if not fragmentos:
+            yield "❌ No se encontró información relevante para responder tu pregunta."
+            return
+        contexto, citas = empaquetar_fragmentos(fragmentos)
+        prompt = _armar_prompt(pregunta, contexto, historial)
+
+        modelo = os.getenv("LLM_MODEL", "gemini-2.0-flash-001")
+        primer_token = None
+        partes = []
+        for texto in generar_stream(prompt, modelo):
+            if primer_token is None:
+                primer_token = time.perf_counter() - inicio
+                registrar_etapa("respuesta_primer_token", primer_token)
+            partes.append(texto)
+            yield texto
+
+        if primer_token is None:
+            yield "❌ Error: No se pudo generar una respuesta del modelo."
+            return
+        if clave:
+            guardar_en_cache(pregunta, clave, "".join(partes).strip(), citas)
+        yield formatear_fuentes(citas)
+        registrar_etapa("respuesta_stream", time.perf_counter() - inicio)
+        logger.info(f"Respuesta en conversación en {time.perf_counter() - inicio:.3f}s "
+                    f"({conversacion.reutilizaciones} reutilizaciones, {conversacion.busquedas} búsquedas)")
+
+    except ValueError as e:
+        yield f"❌ Error de configuración: {e}"
+    except Exception as e:
+        logger.error(f"Error generando respuesta: {e}")
+        yield f"❌ Error inesperado: {str(e)}"
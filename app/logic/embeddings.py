@@ -0,0 +1,180 @@
+import os
+import hashlib
+import sqlite3
+import threading
+import time
+import logging
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Servicio de embeddings compartido por ingesta y recuperación (una sola carga del modelo)
+_servicio = None
+_lock_servicio = threading.Lock()
+
+def _hash_texto(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+class CacheEmbeddings:
+    """Caché persistente en SQLite de vectores, indexada por (modelo, hash del texto).
+
+    El tamaño está acotado por número de entradas; al superarlo se descartan
+    las menos usadas recientemente.
+    """
+
+    def __init__(self, ruta: str, max_entradas: int = 200_000):
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                   modelo TEXT NOT NULL,
+                   hash TEXT NOT NULL,
+                   vector BLOB NOT NULL,
+                   ultimo_acceso REAL NOT NULL,
+                   PRIMARY KEY (modelo, hash))"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_acceso ON embeddings(ultimo_acceso)")
+        self._conn.commit()
+
+    def obtener(self, modelo: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Devuelve los vectores encontrados para los hashes dados."""
+        hashes = list(hashes)
+        encontrados = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):
+                lote = hashes[i:i + 500]
+                marcadores = ",".join("?" * len(lote))
+                filas = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE modelo = ? AND hash IN ({marcadores})",
+                    [modelo, *lote]
+                ).fetchall()
+                for h, vector in filas:
+                    encontrados[h] = np.frombuffer(vector, dtype=np.float32)
+            if encontrados:
+                ahora = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET ultimo_acceso = ? WHERE modelo = ? AND hash = ?",
+                    [(ahora, modelo, h) for h in encontrados]
+                )
+                self._conn.commit()
+        return encontrados
+
+    def guardar(self, modelo: str, vectores: Dict[str, List[float]]):
+        """Guarda vectores y aplica el límite de tamaño."""
+        if not vectores:
+            return
+        ahora = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (modelo, hash, vector, ultimo_acceso) VALUES (?, ?, ?, ?)",
+                [(modelo, h, np.asarray(v, dtype=np.float32).tobytes(), ahora) for h, v in vectores.items()]
+            )
+            total = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if total > self.max_entradas:
+                # Desalojar hasta el 90% del límite para no hacerlo en cada escritura
+                sobrantes = total - int(self.max_entradas * 0.9)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY ultimo_acceso LIMIT ?)",
+                    (sobrantes,)
+                )
+                logger.info(f"Caché de embeddings: {sobrantes} entradas desalojadas")
+            self._conn.commit()
+
+class EmbeddingsConCache(Embeddings):
+    """Embeddings de LangChain con caché persistente por delante del modelo."""
+
+    def __init__(self, modelo_base: Embeddings, nombre_modelo: str, cache: Optional[CacheEmbeddings]):
+        self.modelo_base = modelo_base
+        self.nombre_modelo = nombre_modelo
+        self.cache = cache
+
+    def _embed(self, textos: List[str], clave_modelo: str, calcular) -> List[List[float]]:
+        hashes = [_hash_texto(t) for t in textos]
+        encontrados = self.cache.obtener(clave_modelo, set(hashes)) if self.cache else {}
+
+        faltantes = {}
+        for h, texto in zip(hashes, textos):
+            if h not in encontrados and h not in faltantes:
+                faltantes[h] = texto
+        if faltantes:
+            calculados = calcular(list(faltantes.values()))
+            nuevos = dict(zip(faltantes.keys(), calculados))
+            if self.cache:
+                self.cache.guardar(clave_modelo, nuevos)
+            encontrados.update({h: np.asarray(v, dtype=np.float32) for h, v in nuevos.items()})
+        return [encontrados[h].tolist() for h in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, self.nombre_modelo, self.modelo_base.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        # Las consultas se guardan aparte por si el modelo usa instrucciones distintas
+        return self._embed([text], f"{self.nombre_modelo}::consulta",
+                           lambda textos: [self.modelo_base.embed_query(textos[0])])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embebe muchas consultas en una sola pasada del modelo (procesos por lotes).
+
+        Los modelos de sentence-transformers no usan instrucciones de consulta,
+        así que embed_documents del modelo base da los mismos vectores que embed_query.
+        """
+        return self._embed(texts, f"{self.nombre_modelo}::consulta", self.modelo_base.embed_documents)
+
+def _crear_cache() -> Optional[CacheEmbeddings]:
+    ruta = os.getenv("EMBEDDING_CACHE_PATH", "/app/data/cache/embeddings.sqlite")
+    if not ruta:
+        return None
+    try:
+        return CacheEmbeddings(ruta, max_entradas=int(os.getenv("EMBEDDING_CACHE_MAX", "200000")))
+    except Exception as e:
+        logger.warning(f"No se pudo abrir la caché de embeddings ({ruta}), se continúa sin caché: {e}")
+        return None
+
+def _crear_modelo_torch(modelo_embedding: str) -> Embeddings:
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    # Configurar device para evitar problemas de tensores meta
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    modelo_base = HuggingFaceEmbeddings(
+        model_name=modelo_embedding,
+        model_kwargs={'device': device},
+        encode_kwargs={'device': device}
+    )
+    logger.info(f"Modelo de embeddings cargado en {device}")
+    return modelo_base
+
+def obtener_embeddings() -> EmbeddingsConCache:
+    """Obtiene o crea el servicio de embeddings compartido (singleton).
+
+    EMBEDDING_BACKEND elige el motor: torch (por defecto), onnx u onnx-int8.
+    """
+    global _servicio
+    if _servicio is None:
+        with _lock_servicio:
+            if _servicio is None:
+                modelo_embedding = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+                backend = os.getenv("EMBEDDING_BACKEND", "torch")
+                modelo_base = None
+                if backend in ("onnx", "onnx-int8"):
+                    try:
+                        from .embeddings_onnx import cargar_embeddings_onnx
+                        modelo_base = cargar_embeddings_onnx(modelo_embedding, backend)
+                        logger.info(f"Modelo de embeddings cargado con ONNX Runtime ({backend})")
+                    except Exception as e:
+                        logger.warning(f"Backend {backend} no disponible, se usa PyTorch: {e}")
+                        backend = "torch"
+                if modelo_base is None:
+                    modelo_base = _crear_modelo_torch(modelo_embedding)
+                # Cada backend tiene su propia clave en la caché: sus vectores no son idénticos
+                clave = modelo_embedding if backend == "torch" else f"{modelo_embedding}@{backend}"
+                _servicio = EmbeddingsConCache(modelo_base, clave, _crear_cache())
+    return _servicio
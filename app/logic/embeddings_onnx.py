@@ -0,0 +1,165 @@
+import os
+import json
+import logging
+from typing import List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Backend de embeddings sobre ONNX Runtime para contenedores solo CPU. El
+# modelo de sentence-transformers se exporta una vez a ONNX (y opcionalmente se
+# cuantiza a int8 con cuantización dinámica); al exportar se comparan sus
+# vectores con los de PyTorch y, si no son equivalentes, no se usa.
+DIRECTORIO_ONNX = os.getenv("ONNX_DIR", "/app/data/modelos/onnx")
+HILOS = int(os.getenv("ONNX_HILOS", "0"))
+SIMILITUD_MINIMA = {"onnx": 0.999, "onnx-int8": 0.98}
+
+FRASES_VERIFICACION = [
+    "El contrato N° 2023-045 vence el 31 de diciembre.",
+    "Resumen ejecutivo de los hallazgos principales del informe anual.",
+    "Artículo 5.1: las partes acuerdan resolver controversias mediante arbitraje.",
+    "Quarterly revenue grew 12% driven by new subscriptions.",
+    "¿Cuáles son los objetivos del proyecto?",
+]
+
+class ErrorEquivalencia(Exception):
+    """Los vectores ONNX se alejan demasiado de los de PyTorch."""
+
+def _directorio_modelo(nombre_modelo: str) -> str:
+    return os.path.join(DIRECTORIO_ONNX, nombre_modelo.replace("/", "__"))
+
+def _archivo_modelo(nombre_modelo: str, backend: str) -> str:
+    return os.path.join(_directorio_modelo(nombre_modelo), "modelo-int8.onnx" if backend == "onnx-int8" else "modelo.onnx")
+
+def similitud_minima(a: np.ndarray, b: np.ndarray) -> float:
+    """Menor similitud coseno entre filas correspondientes."""
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float(np.min(np.sum(a * b, axis=1)))
+
+def exportar_modelo(nombre_modelo: str, backend: str = "onnx-int8") -> str:
+    """Exporta el modelo a ONNX (y lo cuantiza si corresponde); retorna la ruta del archivo.
+
+    Requiere torch y sentence-transformers solo esta vez. Verifica la
+    equivalencia con los vectores de PyTorch y guarda la configuración de
+    pooling para no volver a cargar PyTorch en los siguientes arranques.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    directorio = _directorio_modelo(nombre_modelo)
+    os.makedirs(directorio, exist_ok=True)
+    st = SentenceTransformer(nombre_modelo, device="cpu")
+    transformer, pooling = st[0], st[1]
+    configuracion = {
+        "max_tokens": int(st.max_seq_length),
+        "pooling": "cls" if getattr(pooling, "pooling_mode_cls_token", False) else "media",
+        "normalizar": any(type(m).__name__ == "Normalize" for m in st),
+    }
+    transformer.tokenizer.save_pretrained(directorio)
+
+    ruta_fp32 = _archivo_modelo(nombre_modelo, "onnx")
+    if not os.path.exists(ruta_fp32):
+        modelo_hf = transformer.auto_model.eval()
+        ejemplo = transformer.tokenizer(FRASES_VERIFICACION[:2], padding=True, return_tensors="pt")
+        entradas = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in ejemplo]
+        ejes = {n: {0: "lote", 1: "secuencia"} for n in entradas}
+        ejes["salida"] = {0: "lote", 1: "secuencia"}
+        with torch.no_grad():
+            torch.onnx.export(
+                modelo_hf, tuple(ejemplo[n] for n in entradas), ruta_fp32,
+                input_names=entradas, output_names=["salida"], dynamic_axes=ejes,
+                opset_version=14, do_constant_folding=True,
+            )
+        logger.info(f"Modelo exportado a ONNX: {ruta_fp32}")
+
+    ruta = _archivo_modelo(nombre_modelo, backend)
+    if backend == "onnx-int8" and not os.path.exists(ruta):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(ruta_fp32, ruta, weight_type=QuantType.QInt8)
+        logger.info(f"Modelo cuantizado a int8: {ruta}")
+
+    # Verificación de equivalencia contra PyTorch
+    referencia = st.encode(FRASES_VERIFICACION, convert_to_numpy=True)
+    obtenidos = np.asarray(EmbeddingsOnnx(ruta, directorio, configuracion).embed_documents(FRASES_VERIFICACION))
+    similitud = similitud_minima(referencia, obtenidos)
+    # Se registra también un resultado fallido, para no reexportar en cada arranque
+    configuracion = {**_leer_configuracion(directorio), **configuracion, f"similitud_{backend}": similitud}
+    with open(os.path.join(directorio, "configuracion.json"), "w", encoding="utf-8") as f:
+        json.dump(configuracion, f, indent=2)
+    logger.info(f"Equivalencia {backend} vs PyTorch: similitud mínima {similitud:.4f}")
+    _verificar_equivalencia(configuracion, backend)
+    return ruta
+
+def _leer_configuracion(directorio: str) -> dict:
+    archivo = os.path.join(directorio, "configuracion.json")
+    if not os.path.exists(archivo):
+        return {}
+    with open(archivo, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _verificar_equivalencia(configuracion: dict, backend: str):
+    similitud = configuracion[f"similitud_{backend}"]
+    if similitud < SIMILITUD_MINIMA[backend]:
+        raise ErrorEquivalencia(f"Similitud mínima {similitud:.4f} < {SIMILITUD_MINIMA[backend]} para {backend}")
+
+class EmbeddingsOnnx(Embeddings):
+    """Embeddings de sentence-transformers ejecutados con ONNX Runtime (pooling y normalización incluidos)."""
+
+    def __init__(self, ruta_modelo: str, directorio_tokenizador: str, configuracion: dict,
+                 tamaño_lote: int = 64):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if HILOS:
+            opciones.intra_op_num_threads = HILOS
+        self.sesion = ort.InferenceSession(ruta_modelo, sess_options=opciones, providers=["CPUExecutionProvider"])
+        self.entradas = {e.name for e in self.sesion.get_inputs()}
+        self.tokenizador = AutoTokenizer.from_pretrained(directorio_tokenizador)
+        self.max_tokens = configuracion.get("max_tokens", 256)
+        self.pooling = configuracion.get("pooling", "media")
+        self.normalizar = configuracion.get("normalizar", True)
+        self.tamaño_lote = tamaño_lote
+
+    def _codificar(self, textos: List[str]) -> np.ndarray:
+        tokens = self.tokenizador(textos, padding=True, truncation=True, max_length=self.max_tokens,
+                                  return_tensors="np")
+        entradas = {n: tokens[n].astype(np.int64) for n in self.entradas if n in tokens}
+        if "token_type_ids" in self.entradas and "token_type_ids" not in entradas:
+            entradas["token_type_ids"] = np.zeros_like(entradas["input_ids"])
+        estados = self.sesion.run(None, entradas)[0]
+        if self.pooling == "cls":
+            vectores = estados[:, 0]
+        else:
+            mascara = tokens["attention_mask"][..., None].astype(np.float32)
+            vectores = (estados * mascara).sum(axis=1) / np.clip(mascara.sum(axis=1), 1e-9, None)
+        if self.normalizar:
+            vectores = vectores / np.clip(np.linalg.norm(vectores, axis=1, keepdims=True), 1e-12, None)
+        return vectores.astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Ordenar por longitud reduce el padding dentro de cada lote
+        orden = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        resultado: List[Optional[List[float]]] = [None] * len(texts)
+        for inicio in range(0, len(orden), self.tamaño_lote):
+            indices = orden[inicio:inicio + self.tamaño_lote]
+            for i, vector in zip(indices, self._codificar([texts[i] for i in indices])):
+                resultado[i] = vector.tolist()
+        return resultado
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._codificar([text])[0].tolist()
+
+def cargar_embeddings_onnx(nombre_modelo: str, backend: str = "onnx-int8") -> EmbeddingsOnnx:
+    """Carga el modelo ONNX exportado; lo exporta (y verifica) la primera vez."""
+    directorio = _directorio_modelo(nombre_modelo)
+    ruta = _archivo_modelo(nombre_modelo, backend)
+    configuracion = _leer_configuracion(directorio)
+    if not os.path.exists(ruta) or f"similitud_{backend}" not in configuracion:
+        exportar_modelo(nombre_modelo, backend)
+        configuracion = _leer_configuracion(directorio)
+    _verificar_equivalencia(configuracion, backend)
+    return EmbeddingsOnnx(ruta, directorio, configuracion)
@@ -0,0 +1,51 @@
+import re
+from typing import Iterable, Optional
+
+# Esquema único de metadatos de los fragmentos en Chroma. La ingesta escribe
+# estas claves y la búsqueda, las citas y las estadísticas las leen.
+CAMPO_DOCUMENTO = "nombre_documento"
+CAMPO_ID_DOCUMENTO = "id_documento"
+CAMPO_HASH = "hash_documento"
+CAMPO_PAGINA = "pagina"
+CAMPO_PAGINAS_DOCUMENTO = "paginas_documento"
+# Posición del fragmento en el documento (orden de lectura dentro de cada página)
+CAMPO_ORDEN = "orden"
+
+# Espacios de trabajo (por equipo o por sesión): cada uno es una colección
+# "catchai_<espacio>" dentro del mismo CHROMA_DIR, con su catálogo, índice BM25
+# y caché de respuestas. El espacio predeterminado es la colección histórica
+# "catchai_docs", así que los índices existentes siguen funcionando.
+PREFIJO_COLECCION = "catchai_"
+ESPACIO_PREDETERMINADO = "docs"
+COLECCION_PREDETERMINADA = PREFIJO_COLECCION + ESPACIO_PREDETERMINADO
+
+def normalizar_espacio(espacio: Optional[str]) -> str:
+    """Nombre de espacio válido para Chroma: minúsculas, dígitos y guiones (máx. 48)."""
+    normalizado = re.sub(r"[^a-z0-9-]+", "-", (espacio or "").strip().lower())[:48].strip("-")
+    return normalizado or ESPACIO_PREDETERMINADO
+
+def coleccion_espacio(espacio: Optional[str]) -> str:
+    return PREFIJO_COLECCION + normalizar_espacio(espacio)
+
+def espacio_coleccion(nombre_coleccion: str) -> str:
+    if nombre_coleccion.startswith(PREFIJO_COLECCION):
+        return nombre_coleccion[len(PREFIJO_COLECCION):]
+    return nombre_coleccion
+
+def construir_filtro(documento: Optional[str] = None, documentos: Optional[Iterable[str]] = None,
+                     paginas: Optional[Iterable[int]] = None) -> Optional[dict]:
+    """Traduce filtros por documento y página a una cláusula `where` de Chroma."""
+    condiciones = []
+    if documento:
+        condiciones.append({CAMPO_DOCUMENTO: documento})
+    if documentos:
+        condiciones.append({CAMPO_DOCUMENTO: {"$in": list(documentos)}})
+    if paginas:
+        condiciones.append({CAMPO_PAGINA: {"$in": [int(p) for p in paginas]}})
+    if not condiciones:
+        return None
+    return condiciones[0] if len(condiciones) == 1 else {"$and": condiciones}
+
+def cita(metadatos: dict) -> str:
+    """Cita legible de un fragmento: [documento p.N]."""
+    return f"[{metadatos.get(CAMPO_DOCUMENTO, 'doc')} p.{metadatos.get(CAMPO_PAGINA, '?')}]"
@@ -0,0 +1,167 @@
+import os, re
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from typing import Dict, Iterator, List, Optional, Tuple
+from pypdf import PdfReader
+import pdfplumber
+
+# Módulo liviano a propósito: los procesos de extracción solo importan pypdf y pdfplumber
+
+logger = logging.getLogger(__name__)
+
+PAGINAS_POR_RANGO = int(os.getenv("PAGINAS_POR_RANGO", "40"))
+
+class ErrorExtraccion(Exception):
+    """Falló la extracción de un rango de páginas (distinto de páginas sin texto)."""
+
+def _normalizar(texto: str) -> str:
+    return re.sub(r'\s+', ' ', texto).strip()
+
+def texto_ilegible(texto: str) -> bool:
+    """Heurística para detectar texto vacío o mal decodificado por pypdf."""
+    if not texto:
+        return True
+    muestra = texto[:2000]
+    sospechosos = sum(
+        1 for c in muestra
+        if c == "\ufffd" or "\ue000" <= c <= "\uf8ff" or (not c.isprintable() and not c.isspace())
+    )
+    if sospechosos / len(muestra) > 0.05:
+        return True
+    if sum(c.isalnum() for c in muestra) / len(muestra) < 0.3:
+        return True
+    # Palabras pegadas: texto largo casi sin espacios suele indicar un mal mapeo de fuentes
+    return len(muestra) > 200 and muestra.count(" ") / len(muestra) < 0.02
+
+def extraer_rango(ruta: str, inicio: int, fin: int) -> List[Tuple[str,int]]:
+    """Extrae las páginas [inicio, fin) con pypdf y usa pdfplumber solo en las ilegibles."""
+    lector = PdfReader(ruta)
+    textos, fallidas = {}, []
+    for i in range(inicio, fin):
+        try:
+            texto = _normalizar(lector.pages[i].extract_text() or "")
+        except Exception:
+            texto = ""
+        if texto_ilegible(texto):
+            fallidas.append(i)
+        if texto:
+            textos[i] = texto
+
+    if fallidas:
+        with pdfplumber.open(ruta) as pdf:
+            for i in fallidas:
+                try:
+                    texto = _normalizar(pdf.pages[i].extract_text() or "")
+                except Exception:
+                    texto = ""
+                if texto:
+                    textos[i] = texto
+
+    return [(textos[i], i + 1) for i in sorted(textos)]
+
+def _tareas(rutas: List[str], paginas_por_rango: int) -> List[Tuple[str,int,int,int]]:
+    """Divide cada PDF en rangos de páginas: (ruta, inicio, fin, total_paginas)."""
+    tareas = []
+    for ruta in rutas:
+        try:
+            total = len(PdfReader(ruta).pages)
+        except Exception as e:
+            logger.error(f"Error abriendo {ruta}: {e}")
+            total = 0
+        if total == 0:
+            tareas.append((ruta, 0, 0, 0))
+        for inicio in range(0, total, paginas_por_rango):
+            tareas.append((ruta, inicio, min(inicio + paginas_por_rango, total), total))
+    return tareas
+
+def _extraer_tarea(ruta: str, inicio: int, fin: int) -> Tuple[List[Tuple[str,int]], Optional[str]]:
+    """Retorna (páginas, error); el error viaja como texto para cruzar el pool de procesos."""
+    try:
+        return (extraer_rango(ruta, inicio, fin) if fin > inicio else []), None
+    except Exception as e:
+        error = f"Error procesando {ruta} (páginas {inicio + 1}-{fin}): {e}"
+        logger.error(error)
+        return [], error
+
+def iterar_bloques_pdfs(rutas: List[str], max_procesos: int = None,
+                        paginas_por_rango: int = PAGINAS_POR_RANGO
+                        ) -> Iterator[Tuple[str, List[Tuple[str,int]], int, int, bool, Optional[str]]]:
+    """Extrae varios PDFs en paralelo y entrega bloques de páginas en orden.
+
+    Produce (ruta, [(texto, pagina), ...], paginas_del_rango, total_paginas,
+    es_ultimo_bloque, error); las páginas sin texto no aparecen en la lista, y
+    `error` no es None si el rango no se pudo extraer (no es lo mismo que un
+    rango en blanco: la ingesta no debe dar el documento por completo).
+    Solo hay una ventana acotada de rangos en vuelo (dos por proceso), así que
+    la memoria no crece con el tamaño del PDF aunque el consumidor sea lento.
+    """
+    tareas = _tareas(rutas, paginas_por_rango)
+    max_procesos = max_procesos or int(os.getenv("INGEST_WORKERS", "0")) or os.cpu_count() or 1
+    max_procesos = min(max_procesos, len(tareas))
+
+    def _bloque(i, resultado):
+        ruta, inicio, fin, total = tareas[i]
+        paginas, error = resultado
+        return ruta, paginas, fin - inicio, total, fin >= total, error
+
+    if max_procesos <= 1:
+        for i, (ruta, inicio, fin, _) in enumerate(tareas):
+            yield _bloque(i, _extraer_tarea(ruta, inicio, fin))
+        return
+
+    ventana = max_procesos * 2
+    # spawn: el proceso de Streamlit tiene hilos (torch, chromadb) y fork no es seguro
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_procesos, mp_context=contexto) as pool:
+        futuros = {}
+        siguiente_envio = 0
+        try:
+            for i in range(len(tareas)):
+                # Mantener la ventana llena; los bloques se entregan en orden
+                while siguiente_envio < len(tareas) and siguiente_envio < i + ventana:
+                    ruta, inicio, fin, _ = tareas[siguiente_envio]
+                    futuros[siguiente_envio] = pool.submit(_extraer_tarea, ruta, inicio, fin)
+                    siguiente_envio += 1
+                yield _bloque(i, futuros.pop(i).result())
+        finally:
+            # Si el generador se cierra antes de terminar, no se espera a los rangos encolados
+            for futuro in futuros.values():
+                futuro.cancel()
+
+def iterar_textos_pdfs(rutas: List[str], max_procesos: int = None,
+                       paginas_por_rango: int = PAGINAS_POR_RANGO) -> Iterator[Tuple[str, List[Tuple[str,int]]]]:
+    """Como iterar_bloques_pdfs, pero agrupando todas las páginas de cada archivo.
+
+    Lanza ErrorExtraccion si falla algún rango, en lugar de entregar el archivo incompleto.
+    """
+    paginas = []
+    for ruta, bloque, _, _, es_ultimo, error in iterar_bloques_pdfs(rutas, max_procesos, paginas_por_rango):
+        if error:
+            raise ErrorExtraccion(error)
+        paginas.extend(bloque)
+        if es_ultimo:
+            yield ruta, paginas
+            paginas = []
+
+def extraer_textos_pdfs(rutas: List[str], max_procesos: int = None,
+                        paginas_por_rango: int = PAGINAS_POR_RANGO) -> Dict[str, List[Tuple[str,int]]]:
+    """Extrae varios PDFs en paralelo; retorna {ruta: [(texto, pagina), ...]}."""
+    return dict(iterar_textos_pdfs(rutas, max_procesos, paginas_por_rango))
+
+def iterar_paginas_pdf(ruta: str) -> Iterator[Tuple[str,int]]:
+    """Generador de (texto, pagina) para un PDF, sin materializar el documento."""
+    for _, bloque, _, _, _, error in iterar_bloques_pdfs([ruta]):
+        if error:
+            raise ErrorExtraccion(error)
+        yield from bloque
+
+def extraer_texto_pdf(ruta: str) -> List[Tuple[str,int]]:
+    """Devuelve lista de (texto, pagina); ErrorExtraccion si falla un rango de páginas."""
+    try:
+        return list(iterar_paginas_pdf(ruta))
+    except ErrorExtraccion:
+        raise
+    except Exception as e:
+        logger.error(f"Error procesando {ruta}: {e}")
+        return []
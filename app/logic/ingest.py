@@ -1,152 +1,566 @@
 import os, re
-from dataclasses import dataclass
-from typing import List, Tuple, Optional
-from pypdf import PdfReader
-import pdfplumber
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-import tempfile
-import shutil
+import hashlib
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Set, Tuple, Optional
+from .embeddings import obtener_embeddings
+from .almacen import bloqueo_escritura, eliminar_coleccion, obtener_almacen, invalidar_almacen, registrar_version
+from .esquema import (CAMPO_DOCUMENTO, CAMPO_HASH, CAMPO_ID_DOCUMENTO, CAMPO_ORDEN, CAMPO_PAGINA,
+                      CAMPO_PAGINAS_DOCUMENTO, construir_filtro)
+from .catalogo import (EntradaCatalogo, eliminar_documentos, obtener_documento, registrar_documentos,
+                       renovar_version_indice)
+from .cache_respuestas import invalidar_cache_respuestas
+from .bm25 import IndiceLexico, abrir_indice_lexico, eliminar_indice_lexico, invalidar_indice_lexico
+from .extraccion import ErrorExtraccion, extraer_texto_pdf, iterar_bloques_pdfs, iterar_paginas_pdf
+from .metricas import medir, registrar_etapa
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# langchain y chromadb se importan al usarse: importar este módulo no debe retrasar el arranque
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import Chroma
+
+# Tamaños del pipeline de ingesta
+LOTE_EMBEDDING = int(os.getenv("LOTE_EMBEDDING", "64"))
+LOTE_UPSERT = int(os.getenv("LOTE_UPSERT", "1000"))
+COLA_MAX = int(os.getenv("COLA_INGESTA_MAX", "4"))
+
+class IngestaCancelada(Exception):
+    """Lanzada desde el callback de progreso para detener la ingesta."""
 
 @dataclass
 class MetadatosDocumento:
-    id_documento: int
+    id_documento: str
     nombre: str
     paginas: int
     tamaño_mb: float
+    fragmentos_nuevos: int = 0
+    fragmentos_eliminados: int = 0
+    omitido: bool = False
 
-def extraer_texto_pdf(ruta: str) -> List[Tuple[str,int]]:
-    """Devuelve lista de (texto, pagina)."""
-    textos = []
-    try:
-        with pdfplumber.open(ruta) as pdf:
-            for i, pagina in enumerate(pdf.pages, start=1):
-                texto = pagina.extract_text() or ""
-                # Normalización básica
-                texto = re.sub(r'\s+', ' ', texto).strip()
-                if texto:  # Solo agregar páginas con contenido
-                    textos.append((texto, i))
-    except Exception as e:
-        print(f"Error procesando {ruta}: {e}")
-        return []
-    return textos
+def calcular_hash_archivo(ruta: str, tamaño_bloque: int = 1024 * 1024) -> str:
+    """Devuelve el SHA-256 del contenido del archivo, leído por bloques."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(tamaño_bloque), b""):
+            h.update(bloque)
+    return h.hexdigest()
 
-def fragmentar_documentos(paginas_texto: List[Tuple[str,int]], tamaño_fragmento=900, superposicion_fragmento=150):
-    if not paginas_texto:
-        return []
-    
+class GeneradorIds:
+    """IDs estables por fragmento: documento + hash del texto (+ ocurrencia si se repite).
+
+    La página no forma parte del ID para que insertar o quitar páginas no
+    invalide los fragmentos que no cambiaron; se actualiza como metadato.
+    Es incremental para poder usarse mientras se recorre el documento.
+    """
+
+    def __init__(self, nombre_documento: str):
+        self.prefijo = hashlib.sha256(nombre_documento.encode("utf-8")).hexdigest()[:16]
+        self.ocurrencias = {}
+
+    def __call__(self, texto: str) -> str:
+        h = hashlib.sha256(texto.encode("utf-8")).hexdigest()[:32]
+        n = self.ocurrencias.get(h, 0)
+        self.ocurrencias[h] = n + 1
+        return f"{self.prefijo}-{h}" if n == 0 else f"{self.prefijo}-{h}-{n}"
+
+def generar_ids_fragmentos(nombre_documento: str, fragmentos: List[Tuple[str,int]]) -> List[str]:
+    """IDs estables para una lista de fragmentos (ver GeneradorIds)."""
+    generador = GeneradorIds(nombre_documento)
+    return [generador(texto) for texto, _ in fragmentos]
+
+def iterar_fragmentos(paginas_texto: Iterable[Tuple[str,int]], tamaño_fragmento=900,
+                      superposicion_fragmento=150) -> Iterator[Tuple[str,int]]:
+    """Generador de (fragmento, pagina) a partir de un iterable de páginas."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
     divisor = RecursiveCharacterTextSplitter(
         chunk_size=tamaño_fragmento, chunk_overlap=superposicion_fragmento,
         separators=["\n\n", "\n", ". ", " "]
     )
-    fragmentos = []
     for texto, pagina in paginas_texto:
         if len(texto.strip()) > 50:  # Solo fragmentos con contenido significativo
             for fragmento in divisor.split_text(texto):
                 if len(fragmento.strip()) > 20:  # Filtrar fragmentos muy pequeños
-                    fragmentos.append((fragmento.strip(), pagina))
-    return fragmentos
+                    yield fragmento.strip(), pagina
+
+def fragmentar_documentos(paginas_texto: List[Tuple[str,int]], tamaño_fragmento=900, superposicion_fragmento=150):
+    if not paginas_texto:
+        return []
+    return list(iterar_fragmentos(paginas_texto, tamaño_fragmento, superposicion_fragmento))
 
-def construir_almacen_vectores(documentos: List[Tuple[str,int]], metadatos_base: dict, directorio_persistencia: str, nombre_coleccion: str = "catchai_docs"):
-    """Construye o actualiza el almacén de vectores."""
-    modelo_embedding = os.environ.get("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
-    embeddings = HuggingFaceEmbeddings(model_name=modelo_embedding)
+def construir_almacen_vectores(directorio_persistencia: str, nombre_coleccion: str = "catchai_docs"):
+    """Abre (o crea) el almacén de vectores persistente (handle compartido)."""
+    return obtener_almacen(directorio_persistencia, nombre_coleccion)
 
-    if not documentos:
-        print("No hay documentos para procesar")
+def _documento_sin_cambios(av: "Chroma", nombre_documento: str, hash_documento: str) -> Optional[dict]:
+    """Metadatos de un fragmento si el documento ya está indexado completo con ese hash.
+
+    Usa dos consultas con limit=1 en lugar de traer todos los metadatos.
+    """
+    coleccion = av._collection
+    muestra = coleccion.get(where=construir_filtro(documento=nombre_documento), limit=1, include=["metadatas"])
+    if not muestra.get("ids"):
         return None
+    distinto = coleccion.get(
+        where={"$and": [{CAMPO_DOCUMENTO: nombre_documento}, {CAMPO_HASH: {"$ne": hash_documento}}]},
+        limit=1, include=[]
+    )
+    return None if distinto.get("ids") else muestra["metadatas"][0]
+
+class _DocumentoEnCurso:
+    """Estado de un documento mientras se ingiere por bloques de páginas.
+
+    Compara cada fragmento con lo ya indexado: los nuevos se vectorizan, los
+    existentes solo actualizan metadatos, y al terminar se eliminan los IDs
+    que ya no aparecen en el documento.
+    """
+
+    def __init__(self, av: "Chroma", nombre: str, tamaño_mb: float, hash_documento: str, total_paginas: int):
+        self.nombre = nombre
+        self.tamaño_mb = tamaño_mb
+        self.hash_documento = hash_documento
+        self.total_paginas = total_paginas
+        self.metadatos_base = {
+            CAMPO_ID_DOCUMENTO: hash_documento,
+            CAMPO_HASH: hash_documento,
+            CAMPO_DOCUMENTO: nombre,
+            CAMPO_PAGINAS_DOCUMENTO: total_paginas,
+        }
+        # Solo IDs: no se traen textos, metadatos ni vectores
+        self.ids_existentes = set(av._collection.get(where=construir_filtro(documento=nombre), include=[]).get("ids") or [])
+        self.ids_vistos = set()
+        self.generador_ids = GeneradorIds(nombre)
+        self.paginas_con_texto = 0
+        self.paginas_leidas = 0
+        self.nuevos = 0
+
+    def agregar(self, fragmentos: List[Tuple[str,int]], paginas_con_texto: int, paginas_leidas: int):
+        """Clasifica los fragmentos de un bloque; retorna (nuevos, conservados)."""
+        self.paginas_con_texto += paginas_con_texto
+        self.paginas_leidas += paginas_leidas
+        nuevos, conservados = [], []
+        for texto, pagina in fragmentos:
+            id_fragmento = self.generador_ids(texto)
+            # El orden va en los metadatos (también de los conservados): Chroma
+            # devuelve los fragmentos en orden de inserción, no de lectura
+            md = {**self.metadatos_base, CAMPO_PAGINA: pagina, CAMPO_ORDEN: len(self.ids_vistos)}
+            self.ids_vistos.add(id_fragmento)
+            if id_fragmento in self.ids_existentes:
+                conservados.append((id_fragmento, md))
+            else:
+                nuevos.append((id_fragmento, texto, md))
+        self.nuevos += len(nuevos)
+        return nuevos, conservados
+
+    def obsoletos(self) -> List[str]:
+        return sorted(self.ids_existentes - self.ids_vistos)
+
+@dataclass
+class ProgresoIngesta:
+    """Avance de la ingesta, entregado al callback de progreso."""
+    archivos_total: int
+    archivos_completados: int = 0
+    archivo_actual: str = ""
+    paginas: int = 0
+    paginas_archivo: int = 0
+    paginas_total_archivo: int = 0
+    fragmentos: int = 0
+    fragmentos_vectorizados: int = 0
+    inicio: float = field(default_factory=time.perf_counter)
+
+    @property
+    def segundos(self) -> float:
+        return max(time.perf_counter() - self.inicio, 1e-6)
+
+    @property
+    def paginas_por_segundo(self) -> float:
+        return self.paginas / self.segundos
+
+    @property
+    def fragmentos_por_segundo(self) -> float:
+        return self.fragmentos_vectorizados / self.segundos
+
+    @property
+    def fraccion(self) -> float:
+        if not self.archivos_total:
+            return 1.0
+        parcial = self.paginas_archivo / self.paginas_total_archivo if self.paginas_total_archivo else 0.0
+        return min((self.archivos_completados + parcial) / self.archivos_total, 1.0)
+
+class EscritorVectores:
+    """Acumula fragmentos de varios documentos y los vectoriza e inserta por lotes.
+
+    Los textos se ordenan por longitud antes de vectorizar para que cada lote
+    tenga un padding parecido, y se escriben a Chroma con un único upsert por
+    lote grande (los IDs son deterministas, así que reintentar es idempotente).
+    Si se pasa `indice_lexico`, los mismos fragmentos se agregan al índice BM25.
+    """
+
+    def __init__(self, av: "Chroma", lote_embedding: int = LOTE_EMBEDDING, lote_upsert: int = LOTE_UPSERT,
+                 indice_lexico: Optional[IndiceLexico] = None):
+        self.coleccion = av._collection
+        self.indice_lexico = indice_lexico
+        self.embeddings = obtener_embeddings()
+        self.lote_embedding = lote_embedding
+        self.lote_upsert = lote_upsert
+        self.ids, self.textos, self.metadatos = [], [], []
+        self.conservados = []
+        self.total = 0
+
+    def agregar(self, nuevos: List[Tuple[str,str,dict]], conservados: List[Tuple[str,dict]] = ()):
+        for id_fragmento, texto, md in nuevos:
+            self.ids.append(id_fragmento)
+            self.textos.append(texto)
+            self.metadatos.append(md)
+        self.conservados.extend(conservados)
+        if len(self.ids) >= self.lote_upsert:
+            self.vaciar()
+
+    def descartar(self, ids: Set[str]):
+        """Quita del lote pendiente los fragmentos de un documento que falló."""
+        conservar = [n for n, i in enumerate(self.ids) if i not in ids]
+        self.ids = [self.ids[n] for n in conservar]
+        self.textos = [self.textos[n] for n in conservar]
+        self.metadatos = [self.metadatos[n] for n in conservar]
+        self.conservados = [c for c in self.conservados if c[0] not in ids]
 
-    textos, metadatos = [], []
-    for texto, pagina in documentos:
-        textos.append(texto)
-        md = {**metadatos_base, "pagina": pagina}
-        metadatos.append(md)
+    def vaciar(self):
+        if self.ids:
+            self._insertar()
+        # Los metadatos de los fragmentos conservados (con el hash nuevo) se
+        # actualizan después del upsert: si la ingesta se interrumpe antes, el
+        # documento no queda marcado como completo y se reprocesa.
+        if self.conservados:
+            self.coleccion.update(ids=[c[0] for c in self.conservados],
+                                  metadatas=[c[1] for c in self.conservados])
+            if self.indice_lexico is not None:
+                self.indice_lexico.actualizar_paginas([c[0] for c in self.conservados],
+                                                      [c[1] for c in self.conservados])
+            self.conservados = []
 
+    def _insertar(self):
+        orden = sorted(range(len(self.textos)), key=lambda i: len(self.textos[i]))
+        vectores = [None] * len(self.textos)
+        for inicio in range(0, len(orden), self.lote_embedding):
+            indices = orden[inicio:inicio + self.lote_embedding]
+            with medir("embeddings") as span:
+                calculados = self.embeddings.embed_documents([self.textos[i] for i in indices])
+                span["fragmentos"] = len(indices)
+            for i, vector in zip(indices, calculados):
+                vectores[i] = vector
+        with medir("upsert") as span:
+            self.coleccion.upsert(ids=self.ids, embeddings=vectores, documents=self.textos, metadatas=self.metadatos)
+            span["fragmentos"] = len(self.ids)
+        if self.indice_lexico is not None:
+            with medir("indice_lexico"):
+                self.indice_lexico.agregar(self.ids, self.textos, self.metadatos)
+        self.total += len(self.ids)
+        self.ids, self.textos, self.metadatos = [], [], []
+
+def _descartar_documento(documento: _DocumentoEnCurso, escritor: EscritorVectores, av: "Chroma",
+                         indice_lexico: IndiceLexico):
+    """Retira los fragmentos nuevos de un documento que falló a mitad de la ingesta.
+
+    Así el próximo intento lo procesa completo: si quedaran fragmentos con el
+    hash nuevo y sin entrada en el catálogo, el documento parecería indexado.
+    Los existentes no se tocan (tampoco los obsoletos, que siguen siendo su
+    última versión completa).
+    """
+    escritor.descartar(documento.ids_vistos)
+    nuevos = sorted(documento.ids_vistos - documento.ids_existentes)
+    try:
+        if nuevos:
+            av._collection.delete(ids=nuevos)
+            indice_lexico.eliminar(nuevos)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudieron retirar los fragmentos de {documento.nombre}: {e}")
+    logger.warning(f"⚠️ {documento.nombre} quedó sin catalogar; se reprocesará en la próxima ingesta")
+
+def _productor_extraccion(rutas: List[str], cola: queue.Queue, detener: threading.Event):
+    """Extrae bloques de páginas, los fragmenta y los encola (el texto de las páginas se descarta)."""
+    bloques = iterar_bloques_pdfs(rutas)
     try:
-        # Intentar cargar almacén de vectores existente
-        av = Chroma(collection_name=nombre_coleccion,
-                    embedding_function=embeddings,
-                    persist_directory=directorio_persistencia)
-        
-        # Agregar nuevos textos
-        av.add_texts(texts=textos, metadatas=metadatos)
-        av.persist()
-        print(f"✅ Agregados {len(textos)} fragmentos al almacén de vectores")
-        return av
+        while not detener.is_set():
+            # Tiempo de espera por el siguiente bloque extraído (los procesos trabajan en paralelo)
+            inicio = time.perf_counter()
+            elemento = next(bloques, None)
+            if elemento is None:
+                break
+            registrar_etapa("extraccion", time.perf_counter() - inicio)
+            ruta_pdf, paginas, paginas_leidas, total_paginas, es_ultimo, error = elemento
+            if detener.is_set():
+                break
+            with medir("fragmentacion"):
+                fragmentos = list(iterar_fragmentos(paginas))
+            _encolar(cola, (ruta_pdf, fragmentos, len(paginas), paginas_leidas, total_paginas, es_ultimo, error),
+                     detener)
     except Exception as e:
-        print(f"Error con almacén de vectores existente, creando nuevo: {e}")
-        # Crear nuevo almacén de vectores
-        av = Chroma.from_texts(
-            texts=textos,
-            metadatas=metadatos,
-            embedding=embeddings,
-            collection_name=nombre_coleccion,
-            persist_directory=directorio_persistencia
-        )
-        av.persist()
-        return av
-
-def procesar_pdfs(rutas: List[str], directorio_persistencia: str) -> List[MetadatosDocumento]:
-    """Procesa múltiples PDFs y retorna metadatos."""
+        logger.error(f"❌ Error en la extracción: {e}")
+    finally:
+        # Cierra el generador y con él el pool de procesos de extracción
+        bloques.close()
+        _encolar(cola, None, detener)
+
+def _encolar(cola: queue.Queue, elemento, detener: threading.Event):
+    """put con timeout para no quedar bloqueado si el consumidor abortó (nadie lee la cola)."""
+    while not detener.is_set():
+        try:
+            cola.put(elemento, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+def procesar_pdfs(rutas: List[str], directorio_persistencia: str, nombre_coleccion: str = "catchai_docs",
+                  lote_embedding: int = LOTE_EMBEDDING, lote_upsert: int = LOTE_UPSERT,
+                  progreso: Optional[Callable[[ProgresoIngesta], None]] = None,
+                  resumir: Optional[bool] = None) -> List[MetadatosDocumento]:
+    """Procesa múltiples PDFs y retorna metadatos.
+
+    La ingesta se indexa por el hash del contenido: un archivo idéntico al ya
+    indexado se omite sin extraer texto, y uno modificado solo vectoriza los
+    fragmentos que cambiaron. Funciona como pipeline en streaming: la
+    extracción entrega bloques de páginas a una cola acotada y un único
+    consumidor vectoriza e inserta por lotes, con un solo persist al final.
+    La memoria queda acotada por la cola y los lotes, no por el tamaño del PDF.
+    El callback `progreso` recibe un ProgresoIngesta tras cada bloque; si
+    lanza IngestaCancelada la ingesta se detiene (lo ya insertado queda, y
+    como los IDs son deterministas un reintento lo reutiliza).
+    Con `resumir` (por defecto RESUMENES_EN_INGESTA) se precalculan los
+    resúmenes de los documentos nuevos o modificados.
+    """
+    # Un solo escritor por directorio, también entre procesos (workers de la API)
+    with bloqueo_escritura(directorio_persistencia), medir("ingesta") as span:
+        span["archivos"] = len(rutas)
+        metadatos = _procesar_pdfs(rutas, directorio_persistencia, nombre_coleccion, lote_embedding, lote_upsert,
+                                   progreso)
+    # Fuera del bloqueo: los resúmenes solo leen fragmentos y escriben en su tabla,
+    # y las llamadas al LLM no deben frenar otras ingestas ni la limpieza
+    _precomputar_resumenes(metadatos, directorio_persistencia, nombre_coleccion, resumir)
+    return metadatos
+
+def _procesar_pdfs(rutas, directorio_persistencia, nombre_coleccion, lote_embedding, lote_upsert,
+                   progreso) -> List[MetadatosDocumento]:
     metadatos = []
+    estado = ProgresoIngesta(archivos_total=len(rutas))
+
+    def _notificar():
+        if progreso:
+            try:
+                progreso(estado)
+            except IngestaCancelada:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Error en callback de progreso: {e}")
     
     # Asegurar que el directorio existe
     os.makedirs(directorio_persistencia, exist_ok=True)
+    av = construir_almacen_vectores(directorio_persistencia, nombre_coleccion)
     
-    # Procesar cada PDF
-    for i, ruta_pdf in enumerate(rutas, start=1):
+    # Primera pasada: hash de cada PDF y descarte de los que no cambiaron
+    pendientes = {}
+    for ruta_pdf in rutas:
         try:
             if not os.path.exists(ruta_pdf):
-                print(f"⚠️ Archivo no encontrado: {ruta_pdf}")
+                logger.warning(f"⚠️ Archivo no encontrado: {ruta_pdf}")
+                estado.archivos_completados += 1
                 continue
                 
-            # Obtener tamaño del archivo
+            # Obtener tamaño y hash del archivo
+            nombre = os.path.basename(ruta_pdf)
             tamaño_mb = os.path.getsize(ruta_pdf) / (1024 * 1024)
-            
-            print(f"📄 Procesando: {os.path.basename(ruta_pdf)}")
-            paginas = extraer_texto_pdf(ruta_pdf)
-            
-            if not paginas:
-                print(f"⚠️ No se pudo extraer texto de: {ruta_pdf}")
-                continue
-                
-            fragmentos = fragmentar_documentos(paginas)
-            if not fragmentos:
-                print(f"⚠️ No se generaron fragmentos válidos de: {ruta_pdf}")
-                continue
-                
-            # Construir almacén de vectores
-            av = construir_almacen_vectores(
-                documentos=fragmentos,
-                metadatos_base={"id_documento": i, "nombre_documento": os.path.basename(ruta_pdf)},
-                directorio_persistencia=directorio_persistencia
-            )
-            
-            if av:
+            hash_documento = calcular_hash_archivo(ruta_pdf)
+
+            # El catálogo responde sin tocar Chroma; los índices previos al catálogo usan los metadatos
+            entrada = obtener_documento(directorio_persistencia, nombre_coleccion, nombre)
+            if entrada is not None:
+                paginas_existentes = entrada.paginas if entrada.hash_documento == hash_documento else None
+            else:
+                existente = _documento_sin_cambios(av, nombre, hash_documento)
+                paginas_existentes = int(existente.get(CAMPO_PAGINAS_DOCUMENTO, 0)) if existente is not None else None
+            if paginas_existentes is not None:
                 meta = MetadatosDocumento(
-                    id_documento=i,
-                    nombre=os.path.basename(ruta_pdf),
-                    paginas=len(paginas),
-                    tamaño_mb=round(tamaño_mb, 2)
+                    id_documento=hash_documento,
+                    nombre=nombre,
+                    paginas=paginas_existentes,
+                    tamaño_mb=round(tamaño_mb, 2),
+                    omitido=True
                 )
                 metadatos.append(meta)
-                print(f"✅ Procesado: {meta.nombre} ({meta.paginas} páginas, {meta.tamaño_mb}MB)")
-            else:
-                print(f"❌ Error procesando: {ruta_pdf}")
-                
+                estado.archivos_completados += 1
+                logger.info(f"⏭️ Sin cambios, se omite: {nombre}")
+                continue
+
+            pendientes[ruta_pdf] = (nombre, round(tamaño_mb, 2), hash_documento)
         except Exception as e:
-            print(f"❌ Error procesando {ruta_pdf}: {e}")
+            logger.error(f"❌ Error procesando {ruta_pdf}: {e}")
+            estado.archivos_completados += 1
             continue
+
+    _notificar()
+    if not pendientes:
+        return metadatos
+
+    # Pipeline: productor de extracción -> cola acotada -> consumidor de embeddings
+    logger.info(f"📄 Extrayendo texto de {len(pendientes)} archivo(s)")
+    cola = queue.Queue(maxsize=COLA_MAX)
+    detener = threading.Event()
+    productor = threading.Thread(target=_productor_extraccion, args=(list(pendientes), cola, detener), daemon=True)
+    productor.start()
+    # Índice BM25 propio de esta ingesta; se guarda junto con el persist de Chroma
+    indice_lexico = abrir_indice_lexico(directorio_persistencia, av, nombre_coleccion)
+    escritor = EscritorVectores(av, lote_embedding=lote_embedding, lote_upsert=lote_upsert,
+                                indice_lexico=indice_lexico)
+    documento, ruta_documento = None, None
+    catalogados = []
+    # Documentos con un bloque fallido: no se eliminan sus obsoletos ni se catalogan
+    fallidos = set()
+
+    try:
+        while True:
+            elemento = cola.get()
+            if elemento is None:
+                break
+            ruta_pdf, fragmentos, paginas_con_texto, paginas_leidas, total_paginas, es_ultimo, error = elemento
+            if ruta_pdf in fallidos:
+                if es_ultimo:
+                    estado.archivos_completados += 1
+                continue
+            completado = False
+            try:
+                # Un rango que no se pudo extraer no equivale a páginas en blanco
+                if error:
+                    raise ErrorExtraccion(error)
+                if ruta_documento != ruta_pdf:
+                    documento = _DocumentoEnCurso(av, *pendientes[ruta_pdf], total_paginas)
+                    ruta_documento = ruta_pdf
+                    estado.archivo_actual = documento.nombre
+                    estado.paginas_archivo, estado.paginas_total_archivo = 0, total_paginas
+
+                nuevos, conservados = documento.agregar(fragmentos, paginas_con_texto, paginas_leidas)
+                escritor.agregar(nuevos, conservados)
+
+                estado.paginas += paginas_leidas
+                estado.paginas_archivo += paginas_leidas
+                estado.fragmentos += len(fragmentos)
+                estado.fragmentos_vectorizados = escritor.total
+                if not es_ultimo:
+                    _notificar()
+                    continue
+
+                estado.archivos_completados += 1
+                completado = True
+                ruta_documento = None
+                if not documento.paginas_con_texto:
+                    logger.warning(f"⚠️ No se pudo extraer texto de: {ruta_pdf}")
+                elif not documento.ids_vistos:
+                    logger.warning(f"⚠️ No se generaron fragmentos válidos de: {ruta_pdf}")
+                else:
+                    obsoletos = documento.obsoletos()
+                    if obsoletos:
+                        av._collection.delete(ids=obsoletos)
+                        indice_lexico.eliminar(obsoletos)
+                    meta = MetadatosDocumento(
+                        id_documento=documento.hash_documento,
+                        nombre=documento.nombre,
+                        paginas=documento.total_paginas,
+                        tamaño_mb=documento.tamaño_mb,
+                        fragmentos_nuevos=documento.nuevos,
+                        fragmentos_eliminados=len(obsoletos)
+                    )
+                    metadatos.append(meta)
+                    catalogados.append(EntradaCatalogo(
+                        nombre=meta.nombre,
+                        hash_documento=meta.id_documento,
+                        paginas=meta.paginas,
+                        fragmentos=len(documento.ids_vistos),
+                        tamaño_mb=meta.tamaño_mb,
+                        ingestado_en=time.time()
+                    ))
+                    logger.info(f"✅ Procesado: {meta.nombre} ({meta.paginas} páginas, {meta.tamaño_mb}MB, "
+                                f"{meta.fragmentos_nuevos} fragmentos nuevos, {meta.fragmentos_eliminados} eliminados)")
+                _notificar()
+            except IngestaCancelada:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error procesando {ruta_pdf}: {e}")
+                fallidos.add(ruta_pdf)
+                if documento is not None and documento.nombre == pendientes[ruta_pdf][0]:
+                    _descartar_documento(documento, escritor, av, indice_lexico)
+                if ruta_documento == ruta_pdf:
+                    ruta_documento = None
+                if es_ultimo and not completado:
+                    estado.archivos_completados += 1
+                continue
+
+        escritor.vaciar()
+        estado.fragmentos_vectorizados = escritor.total
+        _notificar()
+        with medir("persist"):
+            av.persist()
+            indice_lexico.guardar()
+        # El catálogo se escribe al final, en una transacción, cuando los fragmentos ya están guardados
+        registrar_documentos(directorio_persistencia, nombre_coleccion, catalogados)
+    finally:
+        detener.set()
+        # Vaciar la cola libera los bloques pendientes; el productor ya no encola nada más
+        while True:
+            try:
+                cola.get_nowait()
+            except queue.Empty:
+                break
+        productor.join(timeout=5)
+        invalidar_almacen(directorio_persistencia, nombre_coleccion)
+        invalidar_indice_lexico(directorio_persistencia, nombre_coleccion)
+        # Las respuestas cacheadas quedan obsoletas con el índice modificado
+        registrar_version(directorio_persistencia, nombre_coleccion,
+                          renovar_version_indice(directorio_persistencia, nombre_coleccion))
+        invalidar_cache_respuestas(nombre_coleccion)
     
     return metadatos
 
+def _precomputar_resumenes(metadatos: List[MetadatosDocumento], directorio_persistencia: str,
+                           nombre_coleccion: str, resumir: Optional[bool]):
+    """Etapa opcional de resúmenes jerárquicos; solo regenera los desactualizados."""
+    if resumir is None:
+        resumir = os.getenv("RESUMENES_EN_INGESTA", "0") == "1"
+    if not resumir or not metadatos:
+        return
+    # Importación diferida: chains depende del cliente LLM, que la ingesta no necesita
+    from .chains import precomputar_resumenes
+    generados = precomputar_resumenes([m.nombre for m in metadatos], directorio_persistencia, nombre_coleccion)
+    logger.info(f"📝 Resúmenes precalculados: {generados}")
+
+def reparar_indice_lexico(directorio_persistencia: str, nombre_coleccion: str = "catchai_docs"):
+    """Reconstruye el índice BM25 si no coincide con la colección (índices previos a BM25).
+
+    Las búsquedas nunca escriben el índice; esto toma el bloqueo de escritura,
+    así que espera a que termine una ingesta en curso (que ya lo deja al día).
+    """
+    try:
+        with bloqueo_escritura(directorio_persistencia):
+            av = obtener_almacen(directorio_persistencia, nombre_coleccion)
+            abrir_indice_lexico(directorio_persistencia, av, nombre_coleccion)
+        invalidar_indice_lexico(directorio_persistencia, nombre_coleccion)
+    except Exception as e:
+        logger.error(f"❌ Error reparando el índice BM25: {e}")
+
 def limpiar_almacen_vectores(directorio_persistencia: str, nombre_coleccion: str = "catchai_docs"):
-    """Limpia el almacén de vectores existente."""
+    """Limpia un espacio de trabajo: su colección, catálogo, índice BM25 y caché de respuestas.
+
+    Las demás colecciones del directorio (otros espacios) no se tocan. La
+    versión del índice se renueva para que los demás procesos reabran el handle.
+    """
     try:
-        if os.path.exists(directorio_persistencia):
-            shutil.rmtree(directorio_persistencia)
-            print("🗑️ Almacén de vectores limpiado")
+        with bloqueo_escritura(directorio_persistencia):
+            eliminar_coleccion(directorio_persistencia, nombre_coleccion)
+            eliminar_documentos(directorio_persistencia, nombre_coleccion)
+            eliminar_indice_lexico(directorio_persistencia, nombre_coleccion)
+            invalidar_cache_respuestas(nombre_coleccion)
+            registrar_version(directorio_persistencia, nombre_coleccion,
+                              renovar_version_indice(directorio_persistencia, nombre_coleccion))
+            logger.info(f"🗑️ Almacén de vectores limpiado: {nombre_coleccion}")
     except Exception as e:
-        print(f"Error limpiando almacén de vectores: {e}")
+        logger.error(f"❌ Error limpiando almacén de vectores: {e}")
@@ -0,0 +1,310 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+import logging
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+from .metricas import medir, registrar_etapa, registrar_tokens
+
+logger = logging.getLogger(__name__)
+
+# Pasarela única hacia Gemini: cliente reutilizado, reintentos con backoff solo
+# para errores transitorios, límite de tasa por modelo, plazo por solicitud y
+# circuito que corta las llamadas mientras la API está caída.
+# GEMINI_BASE_URL permite apuntar a un servidor Gemini falso local.
+
+T = TypeVar("T")
+
+MODELO_POR_DEFECTO = "gemini-2.0-flash-001"
+REINTENTOS = int(os.getenv("LLM_REINTENTOS", "3"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+PLAZO = float(os.getenv("LLM_PLAZO", "60"))
+SOLICITUDES_POR_MINUTO = float(os.getenv("LLM_RPM", "60"))
+RAFAGA = float(os.getenv("LLM_RAFAGA", "5"))
+CIRCUITO_FALLOS = int(os.getenv("LLM_CIRCUITO_FALLOS", "5"))
+CIRCUITO_ENFRIAMIENTO = float(os.getenv("LLM_CIRCUITO_ENFRIAMIENTO", "30"))
+TIMEOUT_INTENTO = float(os.getenv("LLM_TIMEOUT_INTENTO", "30"))
+# Con menos tiempo restante no se inicia un intento: fallaría por timeout igual
+INTENTO_MINIMO = 0.5
+
+CODIGOS_REINTENTABLES = {408, 429, 500, 502, 503, 504}
+
+class ErrorLLM(Exception):
+    """Error de la pasarela LLM."""
+
+class CircuitoAbierto(ErrorLLM):
+    """La API falló repetidamente y las llamadas están suspendidas temporalmente."""
+
+class PlazoExcedido(ErrorLLM):
+    """La solicitud no terminó dentro de su plazo."""
+
+_cliente = None
+_clientes_async = weakref.WeakKeyDictionary()
+_lock_clientes = threading.Lock()
+_loop = None
+
+def _crear_cliente():
+    from google import genai
+    from google.genai import types
+
+    # Soporta GOOGLE_API_KEY o GEMINI_API_KEY
+    clave_api = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+    if not clave_api:
+        raise ValueError("No se encontró GOOGLE_API_KEY o GEMINI_API_KEY en las variables de entorno")
+    opciones = {"timeout": int(TIMEOUT_INTENTO * 1000)}
+    if os.getenv("GEMINI_BASE_URL"):
+        opciones["base_url"] = os.getenv("GEMINI_BASE_URL")
+    return genai.Client(api_key=clave_api, http_options=types.HttpOptions(**opciones))
+
+def obtener_cliente():
+    """Cliente Gemini compartido por el proceso (conexiones HTTP reutilizadas)."""
+    global _cliente
+    if _cliente is None:
+        with _lock_clientes:
+            if _cliente is None:
+                _cliente = _crear_cliente()
+    return _cliente
+
+def _obtener_cliente_async():
+    """Cliente para el event loop actual: el cliente HTTP asíncrono no se comparte entre loops."""
+    loop = asyncio.get_running_loop()
+    with _lock_clientes:
+        cliente = _clientes_async.get(loop)
+        if cliente is None:
+            cliente = _crear_cliente()
+            _clientes_async[loop] = cliente
+    return cliente
+
+def _loop_compartido() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock_clientes:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-async", daemon=True).start()
+    return _loop
+
+def ejecutar_en_loop(corrutina):
+    """Ejecuta una corrutina desde código síncrono en el loop de fondo de la pasarela.
+
+    A diferencia de asyncio.run (un loop nuevo por llamada), el cliente aio de
+    ese loop y su pool de conexiones se reutilizan entre llamadas.
+    """
+    return asyncio.run_coroutine_threadsafe(corrutina, _loop_compartido()).result()
+
+def es_reintentable(error: Exception) -> bool:
+    """Errores transitorios (cuota, sobrecarga, red); los 4xx de la solicitud no se reintentan."""
+    codigo = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(codigo, int):
+        return codigo in CODIGOS_REINTENTABLES
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    try:
+        import httpx
+        return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+    except ImportError:
+        return False
+
+def _espera_backoff(intento: int) -> float:
+    """Backoff exponencial con jitter completo."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** intento)))
+
+class LimitadorTasa:
+    """Token bucket: `tasa` solicitudes por segundo con ráfagas de hasta `capacidad`."""
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self.actualizado = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _tomar(self) -> float:
+        """Toma un token si hay; si no, retorna cuántos segundos esperar."""
+        with self._lock:
+            ahora = time.monotonic()
+            self.tokens = min(self.capacidad, self.tokens + (ahora - self.actualizado) * self.tasa)
+            self.actualizado = ahora
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.tasa
+
+    def adquirir(self, limite: float):
+        while (espera := self._tomar()) > 0:
+            if time.monotonic() + espera > limite:
+                raise PlazoExcedido("Límite de tasa: no hay capacidad dentro del plazo")
+            time.sleep(espera)
+
+    async def adquirir_async(self, limite: float):
+        while (espera := self._tomar()) > 0:
+            if time.monotonic() + espera > limite:
+                raise PlazoExcedido("Límite de tasa: no hay capacidad dentro del plazo")
+            await asyncio.sleep(espera)
+
+class Circuito:
+    """Circuit breaker: se abre tras N fallos transitorios seguidos y deja pasar una prueba tras el enfriamiento."""
+
+    def __init__(self, umbral: int, enfriamiento: float):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self.fallos = 0
+        self.abierto_desde = None
+        self.sondeando = False
+        self._lock = threading.Lock()
+
+    def verificar(self) -> bool:
+        """Lanza CircuitoAbierto si no se puede llamar; retorna True si esta llamada es la prueba."""
+        with self._lock:
+            if self.abierto_desde is None:
+                return False
+            if self.sondeando or time.monotonic() - self.abierto_desde < self.enfriamiento:
+                raise CircuitoAbierto("La API de Gemini no está respondiendo; reintenta en unos segundos")
+            # Semiabierto: pasa una sola prueba y el resto se rechaza hasta que termine;
+            # si falla se vuelve a abrir
+            self.sondeando = True
+            self.fallos = self.umbral - 1
+            return True
+
+    def liberar_prueba(self):
+        """La prueba terminó sin éxito ni fallo transitorio (p. ej. un 4xx): la siguiente llamada prueba."""
+        with self._lock:
+            self.sondeando = False
+
+    def exito(self):
+        with self._lock:
+            self.fallos = 0
+            self.abierto_desde = None
+            self.sondeando = False
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            self.sondeando = False
+            if self.fallos >= self.umbral:
+                self.abierto_desde = time.monotonic()
+                logger.warning(f"Circuito LLM abierto por {self.enfriamiento:.0f}s tras {self.fallos} fallos")
+
+_limitadores: Dict[str, LimitadorTasa] = {}
+_circuitos: Dict[str, Circuito] = {}
+_lock_estado = threading.Lock()
+
+def _estado_modelo(modelo: str):
+    with _lock_estado:
+        if modelo not in _limitadores:
+            _limitadores[modelo] = LimitadorTasa(SOLICITUDES_POR_MINUTO / 60.0, RAFAGA)
+            _circuitos[modelo] = Circuito(CIRCUITO_FALLOS, CIRCUITO_ENFRIAMIENTO)
+        return _limitadores[modelo], _circuitos[modelo]
+
+def _modelo(modelo: Optional[str]) -> str:
+    return modelo or os.getenv("LLM_MODEL", MODELO_POR_DEFECTO)
+
+def _configuracion(timeout: float):
+    """Configuración de la solicitud con el timeout HTTP de este intento."""
+    from google.genai import types
+    return types.GenerateContentConfig(http_options=types.HttpOptions(timeout=max(int(timeout * 1000), 1)))
+
+def _ejecutar(modelo: str, llamada: Callable[[float], T], plazo: Optional[float]) -> T:
+    """Ejecuta `llamada(timeout)` con reintentos; cada intento se acota al plazo restante."""
+    limitador, circuito = _estado_modelo(modelo)
+    limite = time.monotonic() + (plazo or PLAZO)
+    for intento in range(REINTENTOS + 1):
+        prueba = circuito.verificar()
+        try:
+            limitador.adquirir(limite)
+            restante = limite - time.monotonic()
+            if restante < INTENTO_MINIMO:
+                raise PlazoExcedido(f"No queda plazo para llamar a {modelo}")
+            resultado = llamada(min(restante, TIMEOUT_INTENTO))
+            circuito.exito()
+            return resultado
+        except PlazoExcedido:
+            raise
+        except Exception as e:
+            if not es_reintentable(e):
+                raise
+            circuito.fallo()
+            if time.monotonic() >= limite:
+                raise PlazoExcedido(f"La llamada a {modelo} superó el plazo") from e
+            espera = _espera_backoff(intento)
+            if intento == REINTENTOS or time.monotonic() + espera >= limite:
+                raise
+            logger.warning(f"Error transitorio del LLM ({e}); reintento {intento + 1} en {espera:.2f}s")
+        finally:
+            if prueba:
+                circuito.liberar_prueba()
+        time.sleep(espera)
+    raise ErrorLLM("Reintentos agotados")
+
+def generar(prompt: str, modelo: Optional[str] = None, plazo: Optional[float] = None) -> str:
+    """Genera una respuesta completa."""
+    modelo = _modelo(modelo)
+    with medir("llm", modelo=modelo) as span:
+        respuesta = _ejecutar(modelo, lambda timeout: obtener_cliente().models.generate_content(
+            model=modelo, contents=prompt, config=_configuracion(timeout)), plazo)
+        span["tokens"] = registrar_tokens(modelo, getattr(respuesta, "usage_metadata", None))
+    return (respuesta.text or "").strip()
+
+def generar_stream(prompt: str, modelo: Optional[str] = None, plazo: Optional[float] = None) -> Iterator[str]:
+    """Genera en streaming. Solo se reintenta antes del primer fragmento, para no duplicar texto."""
+    modelo = _modelo(modelo)
+
+    def _abrir(timeout: float):
+        flujo = iter(obtener_cliente().models.generate_content_stream(model=modelo, contents=prompt,
+                                                                      config=_configuracion(timeout)))
+        # Forzar la conexión y el primer fragmento dentro de la zona con reintentos
+        return flujo, next(flujo, None)
+
+    with medir("llm_stream", modelo=modelo) as span:
+        inicio = time.perf_counter()
+        flujo, primero = _ejecutar(modelo, _abrir, plazo)
+        registrar_etapa("llm_primer_token", time.perf_counter() - inicio, modelo=modelo)
+        # El uso de tokens llega en el último fragmento
+        uso = getattr(primero, "usage_metadata", None)
+        if primero is not None and primero.text:
+            yield primero.text
+        for fragmento in flujo:
+            uso = getattr(fragmento, "usage_metadata", None) or uso
+            if fragmento.text:
+                yield fragmento.text
+        span["tokens"] = registrar_tokens(modelo, uso)
+
+async def generar_async(prompt: str, modelo: Optional[str] = None, plazo: Optional[float] = None) -> str:
+    """Variante asíncrona de generar (cliente aio); el plazo corta también la llamada en curso."""
+    modelo = _modelo(modelo)
+    with medir("llm", modelo=modelo) as span:
+        respuesta = await _ejecutar_async(modelo, prompt, plazo)
+        span["tokens"] = registrar_tokens(modelo, getattr(respuesta, "usage_metadata", None))
+    return (respuesta.text or "").strip()
+
+async def _ejecutar_async(modelo: str, prompt: str, plazo: Optional[float]):
+    limitador, circuito = _estado_modelo(modelo)
+    limite = time.monotonic() + (plazo or PLAZO)
+    for intento in range(REINTENTOS + 1):
+        prueba = circuito.verificar()
+        try:
+            await limitador.adquirir_async(limite)
+            respuesta = await asyncio.wait_for(
+                _obtener_cliente_async().aio.models.generate_content(model=modelo, contents=prompt),
+                timeout=max(limite - time.monotonic(), 0.001)
+            )
+            circuito.exito()
+            return respuesta
+        except asyncio.TimeoutError:
+            circuito.fallo()
+            raise PlazoExcedido(f"La llamada a {modelo} superó el plazo")
+        except Exception as e:
+            if not es_reintentable(e):
+                raise
+            circuito.fallo()
+            espera = _espera_backoff(intento)
+            if intento == REINTENTOS or time.monotonic() + espera >= limite:
+                raise
+            logger.warning(f"Error transitorio del LLM ({e}); reintento {intento + 1} en {espera:.2f}s")
+        finally:
+            if prueba:
+                circuito.liberar_prueba()
+        await asyncio.sleep(espera)
+    raise ErrorLLM("Reintentos agotados")
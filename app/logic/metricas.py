@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import bisect
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Instrumentación por etapa: cada span (extracción, fragmentación, embeddings,
+# upsert, búsqueda, prompt, LLM) alimenta un histograma en memoria. Se exportan
+# en formato de texto Prometheus (METRICAS_PUERTO, ruta /metrics) y, si se
+# configura METRICAS_PATH, como una línea JSON por span. Sin dependencias
+# pesadas: se importa al arrancar.
+METRICAS_PATH = os.getenv("METRICAS_PATH", "")
+METRICAS_PUERTO = int(os.getenv("METRICAS_PUERTO", "0") or 0)
+MUESTRAS_RECIENTES = int(os.getenv("METRICAS_MUESTRAS", "512"))
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIJO = "catchai"
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+def _etiquetas(etiquetas: dict) -> Etiquetas:
+    return tuple(sorted((k, str(v)) for k, v in etiquetas.items() if v is not None))
+
+def _formatear_etiquetas(etiquetas: Etiquetas, extra: Optional[Tuple[str, str]] = None) -> str:
+    pares = list(etiquetas) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    escapar = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in pares) + "}"
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por interpolación lineal (p entre 0 y 100)."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicion = (len(ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicion - inferior)
+
+class Histograma:
+    """Histograma acumulativo (buckets Prometheus) más una ventana de muestras recientes para p50/p95."""
+
+    def __init__(self, limites: Tuple[float, ...] = LIMITES_SEGUNDOS):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.conteo = 0
+        self.recientes: Deque[float] = deque(maxlen=MUESTRAS_RECIENTES)
+
+    def observar(self, valor: float):
+        self.cuentas[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.conteo += 1
+        self.recientes.append(valor)
+
+class RegistroMetricas:
+    """Histogramas, contadores y medidores por nombre y etiquetas, seguros entre hilos."""
+
+    def __init__(self):
+        self.histogramas: Dict[Tuple[str, Etiquetas], Histograma] = {}
+        self.contadores: Dict[Tuple[str, Etiquetas], float] = {}
+        self.medidores: Dict[Tuple[str, Etiquetas], float] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, nombre: str, valor: float, **etiquetas):
+        clave = (nombre, _etiquetas(etiquetas))
+        with self._lock:
+            histograma = self.histogramas.get(clave)
+            if histograma is None:
+                histograma = self.histogramas[clave] = Histograma()
+            histograma.observar(valor)
+
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas):
+        clave = (nombre, _etiquetas(etiquetas))
+        with self._lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + valor
+
+    def fijar(self, nombre: str, valor: float, **etiquetas):
+        with self._lock:
+            self.medidores[(nombre, _etiquetas(etiquetas))] = valor
+
+    def prometheus(self) -> str:
+        """Exposición en formato de texto Prometheus 0.0.4."""
+        lineas, tipos = [], set()
+
+        def _tipo(nombre, tipo):
+            if nombre not in tipos:
+                tipos.add(nombre)
+                lineas.append(f"# TYPE {nombre} {tipo}")
+
+        with self._lock:
+            for (nombre, etiquetas), h in sorted(self.histogramas.items()):
+                _tipo(nombre, "histogram")
+                acumulado = 0
+                for limite, cuenta in zip(h.limites, h.cuentas):
+                    acumulado += cuenta
+                    lineas.append(f"{nombre}_bucket{_formatear_etiquetas(etiquetas, ('le', repr(limite)))} {acumulado}")
+                lineas.append(f"{nombre}_bucket{_formatear_etiquetas(etiquetas, ('le', '+Inf'))} {h.conteo}")
+                lineas.append(f"{nombre}_sum{_formatear_etiquetas(etiquetas)} {h.suma:.6f}")
+                lineas.append(f"{nombre}_count{_formatear_etiquetas(etiquetas)} {h.conteo}")
+            for (nombre, etiquetas), valor in sorted(self.contadores.items()):
+                _tipo(nombre, "counter")
+                lineas.append(f"{nombre}{_formatear_etiquetas(etiquetas)} {valor:g}")
+            for (nombre, etiquetas), valor in sorted(self.medidores.items()):
+                _tipo(nombre, "gauge")
+                lineas.append(f"{nombre}{_formatear_etiquetas(etiquetas)} {valor:g}")
+        return "\n".join(lineas) + "\n"
+
+    def desglose(self, nombre: str = f"{PREFIJO}_etapa_segundos") -> List[dict]:
+        """p50/p95 recientes por etapa (sumando las demás etiquetas), para la interfaz."""
+        por_etapa: Dict[str, List[float]] = {}
+        conteos: Dict[str, int] = {}
+        with self._lock:
+            for (n, etiquetas), h in self.histogramas.items():
+                if n != nombre:
+                    continue
+                etapa = dict(etiquetas).get("etapa", "")
+                por_etapa.setdefault(etapa, []).extend(h.recientes)
+                conteos[etapa] = conteos.get(etapa, 0) + h.conteo
+        return [{"etapa": etapa, "n": conteos[etapa], "p50_ms": percentil(valores, 50) * 1000,
+                 "p95_ms": percentil(valores, 95) * 1000}
+                for etapa, valores in por_etapa.items()]
+
+    def total(self, nombre: str, **filtro) -> float:
+        """Suma de un contador sobre las series que coinciden con `filtro`."""
+        with self._lock:
+            return sum(valor for (n, etiquetas), valor in self.contadores.items()
+                       if n == nombre and all(dict(etiquetas).get(k) == str(v) for k, v in filtro.items()))
+
+registro = RegistroMetricas()
+_lock_archivo = threading.Lock()
+
+def _escribir_jsonl(datos: dict):
+    if not METRICAS_PATH:
+        return
+    try:
+        linea = json.dumps(datos, ensure_ascii=False, default=str) + "\n"
+        with _lock_archivo:
+            os.makedirs(os.path.dirname(METRICAS_PATH) or ".", exist_ok=True)
+            with open(METRICAS_PATH, "a", encoding="utf-8") as f:
+                f.write(linea)
+    except OSError as e:
+        logger.warning(f"No se pudo escribir la métrica: {e}")
+
+def registrar_etapa(etapa: str, segundos: float, **etiquetas):
+    """Observación directa, para tiempos medidos fuera de un bloque `with` (p. ej. primer token)."""
+    registro.observar(f"{PREFIJO}_etapa_segundos", segundos, etapa=etapa, **etiquetas)
+
+@contextmanager
+def medir(etapa: str, **etiquetas) -> Iterator[dict]:
+    """Span de una etapa: registra su duración en `catchai_etapa_segundos{etapa=...}`.
+
+    Retorna un dict donde el código medido puede agregar datos (fragmentos,
+    tokens) que se escriben solo en el JSONL, no como etiquetas.
+    """
+    datos = {}
+    inicio = time.perf_counter()
+    error = None
+    try:
+        yield datos
+    except GeneratorExit:
+        # El consumidor dejó de leer un generador medido: no es un error
+        raise
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        segundos = time.perf_counter() - inicio
+        registrar_etapa(etapa, segundos, **etiquetas)
+        if error:
+            registro.incrementar(f"{PREFIJO}_etapa_errores_total", etapa=etapa, **etiquetas)
+        _escribir_jsonl({"timestamp": time.time(), "etapa": etapa, "segundos": round(segundos, 6),
+                         **etiquetas, **datos, **({"error": error} if error else {})})
+
+def registrar_tokens(modelo: str, uso) -> Optional[dict]:
+    """Suma los tokens del `usage_metadata` de una respuesta de Gemini; retorna los contados."""
+    if uso is None:
+        return None
+    tokens = {"prompt": getattr(uso, "prompt_token_count", None) or 0,
+              "respuesta": getattr(uso, "candidates_token_count", None) or 0}
+    for tipo, cantidad in tokens.items():
+        if cantidad:
+            registro.incrementar(f"{PREFIJO}_llm_tokens_total", cantidad, modelo=modelo, tipo=tipo)
+    return tokens
+
+def resumen_metricas() -> dict:
+    """Desglose de latencia por etapa y tokens acumulados, para mostrar_estado."""
+    return {
+        "etapas": sorted(registro.desglose(), key=lambda e: e["etapa"]),
+        "tokens_prompt": int(registro.total(f"{PREFIJO}_llm_tokens_total", tipo="prompt")),
+        "tokens_respuesta": int(registro.total(f"{PREFIJO}_llm_tokens_total", tipo="respuesta")),
+    }
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def log_message(self, formato, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        datos = registro.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+_servidor: Optional[ThreadingHTTPServer] = None
+_lock_servidor = threading.Lock()
+
+def iniciar_servidor_metricas(puerto: int = METRICAS_PUERTO) -> Optional[int]:
+    """Expone /metrics en un hilo daemon (una vez por proceso); con puerto 0 no hace nada."""
+    global _servidor
+    if not puerto:
+        return None
+    with _lock_servidor:
+        if _servidor is None:
+            try:
+                _servidor = ThreadingHTTPServer(("0.0.0.0", puerto), _ManejadorMetricas)
+            except OSError as e:
+                logger.warning(f"No se pudo abrir el puerto de métricas {puerto}: {e}")
+                return None
+            _servidor.daemon_threads = True
+            threading.Thread(target=_servidor.serve_forever, name="metricas", daemon=True).start()
+            logger.info(f"Métricas Prometheus en http://0.0.0.0:{puerto}/metrics")
+    return _servidor.server_address[1]
@@ -19,6 +19,9 @@ Instrucciones:
 
 Respuesta:"""
 
+PROMPT_HISTORIAL = """Conversación previa (úsala solo para interpretar referencias de la nueva pregunta):
+{history}"""
+
 PROMPT_RESUMEN = """Genera un resumen ejecutivo del documento: {doc_name}
 
 Instrucciones:
@@ -30,6 +33,30 @@ Instrucciones:
 
 Resumen:"""
 
+PROMPT_RESUMEN_SECCION = """Resume la siguiente sección del documento: {doc_name} (páginas {paginas})
+
+Instrucciones:
+- Conserva cifras, fechas, nombres y compromisos concretos
+- Máximo 6 bullets breves
+- No agregues información que no esté en el texto
+
+Texto:
+{texto}
+
+Resumen de la sección:"""
+
+PROMPT_RESUMEN_REDUCCION = """Combina los siguientes resúmenes parciales del documento: {doc_name}
+
+Instrucciones:
+- Fusiona ideas repetidas y conserva los datos concretos
+- Mantén el orden del documento
+- Máximo 10 bullets breves
+
+Resúmenes parciales:
+{resumenes}
+
+Resumen combinado:"""
+
 PROMPT_COMPARACION = """Compara los documentos: {doc_a} vs {doc_b}
 
 Instrucciones:
@@ -41,6 +68,18 @@ Instrucciones:
 
 Comparación:"""
 
+PROMPT_CONDENSACION = """Condensa los fragmentos del documento: {doc_name}
+
+Instrucciones:
+- Extrae objetivos, hallazgos, conclusiones, supuestos y riesgos
+- Conserva cifras, fechas y nombres concretos
+- Máximo 8 bullets breves, sin información externa
+
+Fragmentos:
+{texto}
+
+Puntos clave:"""
+
 PROMPT_CLASIFICACION_TEMATICA = """Clasifica los tópicos relacionados con la consulta: {query}
 
 Instrucciones:
@@ -0,0 +1,142 @@
+import os
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from .cache_respuestas import normalizar_pregunta
+
+logger = logging.getLogger(__name__)
+
+# Reordenamiento opcional con un cross-encoder pequeño en CPU: se puntúan los
+# candidatos de la búsqueda híbrida en una sola pasada por lotes y se conservan
+# los mejores. Con un orden más preciso bastan menos fragmentos en el prompt.
+RERANK_ACTIVO = os.getenv("RERANK", "0") == "1"
+MODELO_RERANK = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+CANDIDATOS_RERANK = int(os.getenv("RERANK_CANDIDATOS", "20"))
+FRAGMENTOS_RERANK = int(os.getenv("RERANK_K", "3"))
+PRESUPUESTO_MS = float(os.getenv("RERANK_PRESUPUESTO_MS", "300"))
+MAX_TOKENS = int(os.getenv("RERANK_MAX_TOKENS", "256"))
+CACHE_MAX = int(os.getenv("RERANK_CACHE_MAX", "20000"))
+# Tras tantas omisiones seguidas se vuelve a medir con unos pocos pares: una
+# pasada lenta aislada no debe dejar el reordenamiento apagado para siempre
+SONDEO_CADA = int(os.getenv("RERANK_SONDEO_CADA", "20"))
+PARES_SONDEO = 4
+
+_modelo = None
+_lock_modelo = threading.Lock()
+
+def obtener_modelo_rerank():
+    """Cross-encoder compartido por el proceso, cargado la primera vez que se usa."""
+    global _modelo
+    if _modelo is None:
+        with _lock_modelo:
+            if _modelo is None:
+                from sentence_transformers import CrossEncoder
+                _modelo = CrossEncoder(MODELO_RERANK, device="cpu", max_length=MAX_TOKENS)
+                logger.info(f"Cross-encoder cargado: {MODELO_RERANK}")
+    return _modelo
+
+class Reordenador:
+    """Puntúa pares (consulta, fragmento) con caché y un presupuesto de latencia.
+
+    La latencia por par se estima con una media móvil exponencial de las
+    pasadas anteriores (sin contar la primera, que paga el arranque en frío);
+    si los pares sin caché superarían el presupuesto, la etapa se omite y se
+    conserva el orden de la búsqueda. Cada SONDEO_CADA omisiones seguidas se
+    puntúan unos pocos pares para renovar la estimación.
+    """
+
+    def __init__(self, presupuesto_ms: float = PRESUPUESTO_MS, max_cache: int = CACHE_MAX, suavizado: float = 0.3):
+        self.presupuesto_ms = presupuesto_ms
+        self.max_cache = max_cache
+        self.suavizado = suavizado
+        self.ms_por_par: Optional[float] = None
+        self.pasadas = 0
+        self.omitidos = 0
+        self.omitidos_seguidos = 0
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _puntajes_en_cache(self, clave_consulta: str, ids: List[str]) -> List[Optional[float]]:
+        with self._lock:
+            puntajes = []
+            for id_fragmento in ids:
+                puntaje = self._cache.get((clave_consulta, id_fragmento))
+                if puntaje is not None:
+                    self._cache.move_to_end((clave_consulta, id_fragmento))
+                puntajes.append(puntaje)
+            return puntajes
+
+    def _guardar(self, clave_consulta: str, ids: List[str], puntajes: List[float]):
+        with self._lock:
+            for id_fragmento, puntaje in zip(ids, puntajes):
+                self._cache[(clave_consulta, id_fragmento)] = puntaje
+            while len(self._cache) > self.max_cache:
+                self._cache.popitem(last=False)
+
+    def _excede_presupuesto(self, pares: int) -> bool:
+        return self.ms_por_par is not None and self.ms_por_par * pares > self.presupuesto_ms
+
+    def _puntuar(self, consulta: str, clave_consulta: str, candidatos: List[Tuple[str, str]],
+                 indices: List[int], puntajes: List[Optional[float]]):
+        """Puntúa los candidatos indicados, actualiza la estimación de latencia y la caché."""
+        modelo = obtener_modelo_rerank()
+        inicio = time.perf_counter()
+        calculados = modelo.predict([(consulta, candidatos[i][1]) for i in indices],
+                                    batch_size=len(indices), show_progress_bar=False)
+        ms = (time.perf_counter() - inicio) * 1000 / len(indices)
+        # La primera pasada (pesos recién cargados) no es representativa
+        if self.pasadas:
+            self.ms_por_par = ms if self.ms_por_par is None else (
+                self.suavizado * ms + (1 - self.suavizado) * self.ms_por_par)
+        self.pasadas += 1
+        calculados = [float(p) for p in calculados]
+        for i, puntaje in zip(indices, calculados):
+            puntajes[i] = puntaje
+        self._guardar(clave_consulta, [candidatos[i][0] for i in indices], calculados)
+
+    def _omitir(self, pares: int) -> None:
+        self.omitidos += 1
+        logger.info(f"Reordenamiento omitido: ~{self.ms_por_par * pares:.0f} ms "
+                    f"superaría el presupuesto de {self.presupuesto_ms:.0f} ms")
+
+    def reordenar(self, consulta: str, candidatos: List[Tuple[str, str]], k: int) -> Optional[List[str]]:
+        """IDs de los k mejores candidatos (id, texto), o None si se omitió la etapa."""
+        if not candidatos:
+            return []
+        clave_consulta = hashlib.sha1(normalizar_pregunta(consulta).encode("utf-8")).hexdigest()
+        ids = [c[0] for c in candidatos]
+        puntajes = self._puntajes_en_cache(clave_consulta, ids)
+        faltantes = [i for i, p in enumerate(puntajes) if p is None]
+
+        if faltantes and self._excede_presupuesto(len(faltantes)):
+            self.omitidos_seguidos += 1
+            if self.omitidos_seguidos < SONDEO_CADA:
+                return self._omitir(len(faltantes))
+            # Sondeo: unos pocos pares renuevan la estimación
+            self.omitidos_seguidos = 0
+            sondeo, faltantes = faltantes[:PARES_SONDEO], faltantes[PARES_SONDEO:]
+            self._puntuar(consulta, clave_consulta, candidatos, sondeo, puntajes)
+            if faltantes and self._excede_presupuesto(len(faltantes)):
+                return self._omitir(len(faltantes))
+        if faltantes:
+            self._puntuar(consulta, clave_consulta, candidatos, faltantes, puntajes)
+            self.omitidos_seguidos = 0
+
+        orden = sorted(range(len(ids)), key=lambda i: puntajes[i], reverse=True)
+        return [ids[i] for i in orden[:k]]
+
+_reordenador = None
+
+def obtener_reordenador() -> Optional[Reordenador]:
+    """Reordenador compartido; None si RERANK no está activado."""
+    global _reordenador
+    if not RERANK_ACTIVO:
+        return None
+    if _reordenador is None:
+        with _lock_modelo:
+            if _reordenador is None:
+                _reordenador = Reordenador()
+    return _reordenador
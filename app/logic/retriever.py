@@ -1,198 +1,440 @@
 import os
-from google import genai
-from google.genai import types
-from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
 from .prompts import PROMPT_SISTEMA, PROMPT_PREGUNTA_RESPUESTA
+from .embeddings import obtener_embeddings
+from .almacen import obtener_almacen, contar_fragmentos, invalidar_almacen, sincronizar_almacen
+from .catalogo import listar_documentos, reconstruir_catalogo, version_indice
+from .esquema import construir_filtro
+from .contexto import empaquetar_contexto
+from .cache_respuestas import normalizar_pregunta, obtener_cache_respuestas
+from .llm import generar, generar_stream
+from .bm25 import fusion_rrf, invalidar_indice_lexico, obtener_indice_lexico
+from .rerank import CANDIDATOS_RERANK, FRAGMENTOS_RERANK, obtener_reordenador
+from .metricas import medir, registrar_etapa
 import logging
-import torch
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Variable global para el modelo de embeddings (evitar múltiples cargas)
-_embeddings_model = None
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import Chroma
 
-def _get_embeddings_model():
-    """Obtiene o crea el modelo de embeddings (singleton pattern)."""
-    global _embeddings_model
-    if _embeddings_model is None:
-        try:
-            modelo_embedding = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
-            
-            # Configurar device para evitar problemas de tensores meta
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            
-            _embeddings_model = HuggingFaceEmbeddings(
-                model_name=modelo_embedding,
-                model_kwargs={'device': device},
-                encode_kwargs={'device': device}
-            )
-            
-            logger.info(f"Modelo de embeddings cargado en {device}")
-        except Exception as e:
-            logger.error(f"Error cargando modelo de embeddings: {e}")
-            raise
-    return _embeddings_model
+# Búsqueda híbrida: vectorial + BM25 fusionadas con RRF. Con mejor recall en la
+# primera etapa bastan menos fragmentos en el prompt.
+BUSQUEDA_HIBRIDA = os.getenv("BUSQUEDA_HIBRIDA", "1") == "1"
+CANDIDATOS_BUSQUEDA = int(os.getenv("BUSQUEDA_CANDIDATOS", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+FRAGMENTOS_CONTEXTO = int(os.getenv("FRAGMENTOS_CONTEXTO", "4"))
 
-def _cliente():
-    """Inicializa el cliente de Google Gemini."""
+def _get_embeddings_model():
+    """Obtiene el servicio de embeddings compartido con la ingesta (con caché persistente)."""
     try:
-        # Soporta GOOGLE_API_KEY o GEMINI_API_KEY
-        clave_api = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not clave_api:
-            raise ValueError("No se encontró GOOGLE_API_KEY o GEMINI_API_KEY en las variables de entorno")
-        return genai.Client(api_key=clave_api)
+        return obtener_embeddings()
     except Exception as e:
-        logger.error(f"Error inicializando cliente Gemini: {e}")
+        logger.error(f"Error cargando modelo de embeddings: {e}")
         raise
 
-def cargar_almacen_vectores(directorio_persistencia: str):
-    """Carga el almacén de vectores existente."""
+def cargar_almacen_vectores(directorio_persistencia: str, nombre_coleccion: str = "catchai_docs"):
+    """Devuelve el almacén de vectores compartido, o None si está vacío."""
     try:
-        embeddings = _get_embeddings_model()
-        
-        # Crear el almacén de vectores con configuración más robusta
-        av = Chroma(
-            collection_name="catchai_docs", 
-            embedding_function=embeddings,
-            persist_directory=directorio_persistencia
-        )
+        # Otro proceso (p. ej. otro worker de la API) pudo modificar el índice
+        if sincronizar_almacen(directorio_persistencia, nombre_coleccion):
+            invalidar_indice_lexico(directorio_persistencia, nombre_coleccion)
+        av = obtener_almacen(directorio_persistencia, nombre_coleccion)
         
-        # Verificar que el almacén de vectores tenga contenido
+        # Verificar que el almacén de vectores tenga contenido (conteo cacheado)
         try:
-            coleccion = av._collection
-            if coleccion.count() == 0:
+            if contar_fragmentos(directorio_persistencia, nombre_coleccion) == 0:
                 logger.warning("Almacén de vectores vacío - no hay documentos indexados")
                 return None
         except Exception as e:
             logger.warning(f"No se pudo verificar el conteo de la colección: {e}")
-            # Intentar crear una nueva colección si hay problemas
-            try:
-                av = Chroma(
-                    collection_name="catchai_docs", 
-                    embedding_function=embeddings,
-                    persist_directory=directorio_persistencia
-                )
-                logger.info("Nueva colección creada exitosamente")
-            except Exception as e2:
-                logger.error(f"Error creando nueva colección: {e2}")
-                return None
+            # Reabrir el handle por si quedó apuntando a un directorio eliminado
+            invalidar_almacen(directorio_persistencia, nombre_coleccion, cerrar=True)
+            av = obtener_almacen(directorio_persistencia, nombre_coleccion)
             
         return av
     except Exception as e:
         logger.error(f"Error cargando almacén de vectores: {e}")
         return None
 
-def buscar_contexto(av: Chroma, consulta: str, k=5):
-    """Busca contexto relevante para una pregunta."""
+def _busqueda_vectorial(av: "Chroma", vector_consulta: List[float], n: int, filtro: Optional[dict]) -> List[str]:
+    return _busqueda_vectorial_lote(av, [vector_consulta], n, filtro)[0]
+
+def _busqueda_vectorial_lote(av: "Chroma", vectores: List[List[float]], n: int,
+                             filtro: Optional[dict]) -> List[List[str]]:
+    """Una sola consulta a Chroma con varios embeddings; retorna los ids de cada uno."""
+    with medir("busqueda_vectorial", consultas=len(vectores)):
+        resultado = av._collection.query(query_embeddings=vectores, n_results=n, where=filtro,
+                                         include=["distances"])
+    return resultado["ids"] if resultado.get("ids") else [[] for _ in vectores]
+
+def _numero_candidatos(k: int, reordenador) -> int:
+    candidatos = k
+    if BUSQUEDA_HIBRIDA:
+        candidatos = max(candidatos, CANDIDATOS_BUSQUEDA)
+    if reordenador:
+        candidatos = max(candidatos, CANDIDATOS_RERANK)
+    return candidatos
+
+def busqueda_lexica(av: "Chroma", consulta: str, n: int, documentos: Optional[List[str]] = None,
+                    paginas: Optional[List[int]] = None) -> List[str]:
+    """IDs de los n mejores fragmentos por BM25; vacío si el índice léxico no está disponible."""
+    try:
+        indice = obtener_indice_lexico(av._persist_directory, av, av._collection.name)
+        with medir("busqueda_lexica"):
+            resultados = indice.buscar(consulta, n, documentos=documentos, paginas=paginas)
+        return [id_fragmento for id_fragmento, _ in resultados]
+    except Exception as e:
+        # Sin índice léxico se sigue solo con la búsqueda vectorial
+        logger.warning(f"Búsqueda BM25 no disponible: {e}")
+        return []
+
+def buscar_contexto(av: "Chroma", consulta: str, k=FRAGMENTOS_CONTEXTO, documento: Optional[str] = None,
+                    documentos: Optional[List[str]] = None, paginas: Optional[List[int]] = None,
+                    vector_consulta: Optional[List[float]] = None, k_reordenado: Optional[int] = None,
+                    max_tokens: Optional[int] = None):
+    """Busca contexto relevante para una pregunta.
+
+    Combina la búsqueda vectorial con BM25 (términos exactos: números,
+    artículos, nombres) mediante reciprocal rank fusion. Los filtros por
+    documento o página se resuelven en Chroma (cláusula `where`) y en el
+    índice léxico. Con RERANK=1 los candidatos se reordenan con un
+    cross-encoder y se conservan `k_reordenado` (por defecto RERANK_K).
+    Los fragmentos se empaquetan sin repetir la superposición entre
+    fragmentos contiguos y hasta `max_tokens` (por defecto CONTEXTO_MAX_TOKENS).
+    Si ya se tiene el embedding de la consulta se pasa en `vector_consulta`.
+    """
+    with medir("buscar_contexto"):
+        return _buscar_contexto(av, consulta, k, documento, documentos, paginas, vector_consulta,
+                                k_reordenado, max_tokens)
+
+def buscar_contextos(av: "Chroma", consultas: List[str], vectores: List[List[float]],
+                     k=FRAGMENTOS_CONTEXTO) -> List[Tuple[str, List[str]]]:
+    """Versión por lotes de buscar_contexto con los embeddings ya calculados.
+
+    La búsqueda vectorial de todas las consultas se hace en una sola llamada
+    a Chroma; BM25, reordenamiento y empaquetado siguen siendo por consulta.
+    """
+    if not av:
+        return [("No hay documentos indexados para buscar.", []) for _ in consultas]
+    try:
+        ids_vectoriales = _busqueda_vectorial_lote(av, vectores, _numero_candidatos(k, obtener_reordenador()), None)
+    except Exception as e:
+        logger.error(f"Error en búsqueda vectorial por lotes: {e}")
+        return [("Error buscando contexto.", []) for _ in consultas]
+    resultados = []
+    for consulta, vector, ids in zip(consultas, vectores, ids_vectoriales):
+        with medir("buscar_contexto"):
+            resultados.append(_buscar_contexto(av, consulta, k, None, None, None, vector, None, None, ids))
+    return resultados
+
+def _buscar_contexto(av, consulta, k, documento, documentos, paginas, vector_consulta, k_reordenado, max_tokens,
+                     ids_vectoriales: Optional[List[str]] = None):
     try:
         if not av:
             return "No hay documentos indexados para buscar.", []
             
-        documentos = av.similarity_search(consulta, k=k)
-        if not documentos:
+        fragmentos = _recuperar(av, consulta, k, documento, documentos, paginas, vector_consulta, k_reordenado,
+                                ids_vectoriales)
+        if not fragmentos:
             return "No se encontró contexto relevante para la pregunta.", []
-            
-        partes_contexto, citas = [], []
-        for documento in documentos:
-            nombre_doc = documento.metadata.get("doc_name", "doc")
-            pagina = documento.metadata.get("page", "?")
-            partes_contexto.append(f"[{nombre_doc} p.{pagina}] {documento.page_content}")
-            citas.append(f"[{nombre_doc} p.{pagina}]")
-            
-        return "\n\n".join(partes_contexto), sorted(set(citas))
+        return empaquetar_fragmentos([(texto, md) for _, texto, md in fragmentos], max_tokens)
     except Exception as e:
         logger.error(f"Error en búsqueda de contexto: {e}")
         return "Error buscando contexto.", []
 
-def responder_pregunta(pregunta: str, directorio_persistencia: str):
+def recuperar_fragmentos(av: "Chroma", consulta: str, k=FRAGMENTOS_CONTEXTO,
+                         vector_consulta: Optional[List[float]] = None) -> List[Tuple[str, str, dict]]:
+    """Como buscar_contexto pero sin empaquetar: (id, texto, metadatos) en orden de relevancia."""
+    return _recuperar(av, consulta, k, None, None, None, vector_consulta, None, None)
+
+def _recuperar(av, consulta, k, documento, documentos, paginas, vector_consulta, k_reordenado,
+               ids_vectoriales) -> List[Tuple[str, str, dict]]:
+    filtro = construir_filtro(documento=documento, documentos=documentos, paginas=paginas)
+    reordenador = obtener_reordenador()
+    candidatos = _numero_candidatos(k, reordenador)
+    if ids_vectoriales is not None:
+        ids = ids_vectoriales
+    else:
+        if vector_consulta is None:
+            with medir("embedding_consulta"):
+                vector_consulta = _get_embeddings_model().embed_query(consulta)
+        ids = _busqueda_vectorial(av, vector_consulta, candidatos, filtro)
+    if BUSQUEDA_HIBRIDA:
+        lexicos = busqueda_lexica(av, consulta, candidatos, [documento] if documento else documentos, paginas)
+        ids = fusion_rrf([ids, lexicos], k=RRF_K)
+    ids = ids[:candidatos] if reordenador else ids[:k]
+    if not ids:
+        return []
+
+    por_id = leer_fragmentos(av, ids)
+    if reordenador:
+        # Con el cross-encoder alcanzan menos fragmentos; si se omite por latencia se conserva k
+        try:
+            with medir("rerank"):
+                reordenados = reordenador.reordenar(consulta, [(i, por_id[i][0]) for i in ids if i in por_id],
+                                                    min(k, k_reordenado or FRAGMENTOS_RERANK))
+        except Exception as e:
+            logger.warning(f"Reordenamiento no disponible: {e}")
+            reordenados = None
+        ids = reordenados if reordenados is not None else ids[:k]
+    return [(i, *por_id[i]) for i in ids if i in por_id]
+
+def leer_fragmentos(av: "Chroma", ids: List[str]) -> dict:
+    """Texto y metadatos de los fragmentos: {id: (texto, metadatos)}."""
+    with medir("lectura_fragmentos"):
+        resultado = av._collection.get(ids=ids, include=["documents", "metadatas"])
+    return {i: (texto, md or {}) for i, texto, md in
+            zip(resultado["ids"], resultado["documents"], resultado["metadatas"])}
+
+def empaquetar_fragmentos(fragmentos: List[Tuple[str, dict]], max_tokens: Optional[int] = None) -> Tuple[str, List[str]]:
+    """Empaqueta (texto, metadatos) en el contexto del prompt; retorna (texto, citas)."""
+    with medir("empaquetado") as span:
+        empaquetado = empaquetar_contexto(fragmentos, max_tokens=max_tokens)
+        span["tokens"] = empaquetado.tokens
+    logger.info(f"Contexto: {empaquetado.fragmentos} fragmentos -> {empaquetado.bloques} bloques, "
+                f"{empaquetado.tokens} tokens ({empaquetado.omitidos} omitidos)")
+    return empaquetado.texto, empaquetado.citas
+
+def embeber_pregunta(pregunta: str) -> List[float]:
+    """Embedding de consulta de la pregunta normalizada (el mismo que usa la caché)."""
+    with medir("embedding_consulta"):
+        return _get_embeddings_model().embed_query(normalizar_pregunta(pregunta))
+
+def consultar_cache(pregunta: str, directorio_persistencia: str, nombre_coleccion: str = "catchai_docs"):
+    """Embebe la pregunta normalizada y consulta la caché semántica.
+
+    Retorna (acierto, clave): acierto es (respuesta, citas) o None, y clave
+    (version, vector, colección) sirve para guardar la respuesta y para la búsqueda.
+    """
+    vector = embeber_pregunta(pregunta)
+    cache = obtener_cache_respuestas()
+    if not cache:
+        return None, (None, vector, nombre_coleccion)
+    with medir("cache_respuestas") as span:
+        version = version_indice(directorio_persistencia, nombre_coleccion)
+        acierto = cache.buscar(nombre_coleccion, version, pregunta, vector)
+        span["acierto"] = acierto is not None
+    return acierto, (version, vector, nombre_coleccion)
+
+def guardar_en_cache(pregunta: str, clave, respuesta: str, citas: List[str]):
+    """Guarda la respuesta con la clave de consultar_cache (no guarda errores)."""
+    version, vector, nombre_coleccion = clave
+    cache = obtener_cache_respuestas()
+    if cache and version and respuesta and not respuesta.startswith("❌"):
+        cache.guardar(nombre_coleccion, version, pregunta, vector, respuesta, citas)
+
+def _preparar_pregunta(pregunta: str, directorio_persistencia: str, vector_consulta: Optional[List[float]] = None,
+                       nombre_coleccion: str = "catchai_docs"):
+    """Recupera el contexto y arma el prompt; retorna (prompt, citas, error)."""
+    # Cargar almacén de vectores
+    av = cargar_almacen_vectores(directorio_persistencia, nombre_coleccion)
+    if not av:
+        return None, [], "❌ No hay documentos indexados. Por favor, sube y procesa algunos PDFs primero."
+        
+    # Buscar contexto
+    contexto, citas = buscar_contexto(av, pregunta, k=FRAGMENTOS_CONTEXTO, vector_consulta=vector_consulta)
+    return _armar_prompt(pregunta, contexto, citas)
+
+def _armar_prompt(pregunta: str, contexto: str, citas: List[str]):
+    if not contexto or contexto == "No hay documentos indexados para buscar.":
+        return None, [], "❌ No se encontró información relevante para responder tu pregunta."
+        
+    # Preparar prompt
+    with medir("prompt"):
+        usuario = PROMPT_PREGUNTA_RESPUESTA.format(question=pregunta, context=contexto)
+        prompt = f"{PROMPT_SISTEMA}\n\n{usuario}"
+    return prompt, citas, None
+
+@dataclass
+class PreguntaPreparada:
+    """Pregunta lista para el LLM (o ya resuelta por la caché o con error)."""
+    pregunta: str
+    prompt: Optional[str] = None
+    citas: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    respuesta_cache: Optional[str] = None
+    clave: Optional[tuple] = None
+    tiempos_ms: dict = field(default_factory=dict)
+
+def preparar_preguntas(preguntas: List[str], directorio_persistencia: str,
+                       nombre_coleccion: str = "catchai_docs") -> List[PreguntaPreparada]:
+    """Recuperación por lotes: embebe todas las preguntas en una pasada, consulta
+    la caché de respuestas y busca el contexto de las demás con una sola
+    consulta multi-vector a Chroma. Los tiempos de embedding y recuperación
+    se reparten entre las preguntas del lote.
+    """
+    preparadas = [PreguntaPreparada(p) for p in preguntas]
+    validas = []
+    for p in preparadas:
+        if p.pregunta and p.pregunta.strip():
+            validas.append(p)
+        else:
+            p.error = "❌ Por favor, ingresa una pregunta válida."
+    if not validas:
+        return preparadas
+
+    inicio = time.perf_counter()
+    with medir("embedding_consulta", consultas=len(validas)):
+        vectores = _get_embeddings_model().embed_queries([normalizar_pregunta(p.pregunta) for p in validas])
+    embedding_ms = (time.perf_counter() - inicio) * 1000 / len(validas)
+
+    cache = obtener_cache_respuestas()
+    version = version_indice(directorio_persistencia, nombre_coleccion) if cache else None
+    pendientes = []
+    for p, vector in zip(validas, vectores):
+        p.clave = (version, vector, nombre_coleccion)
+        p.tiempos_ms["embedding"] = round(embedding_ms, 2)
+        acierto = cache.buscar(nombre_coleccion, version, p.pregunta, vector) if cache else None
+        if acierto:
+            p.respuesta_cache, p.citas = acierto
+        else:
+            pendientes.append(p)
+    if not pendientes:
+        return preparadas
+
+    inicio = time.perf_counter()
+    av = cargar_almacen_vectores(directorio_persistencia, nombre_coleccion)
+    if not av:
+        for p in pendientes:
+            p.error = "❌ No hay documentos indexados. Por favor, sube y procesa algunos PDFs primero."
+        return preparadas
+    contextos = buscar_contextos(av, [p.pregunta for p in pendientes], [p.clave[1] for p in pendientes])
+    recuperacion_ms = (time.perf_counter() - inicio) * 1000 / len(pendientes)
+    for p, (contexto, citas) in zip(pendientes, contextos):
+        p.prompt, p.citas, p.error = _armar_prompt(p.pregunta, contexto, citas)
+        p.tiempos_ms["recuperacion"] = round(recuperacion_ms, 2)
+    return preparadas
+
+def guardar_respuesta_preparada(preparada: PreguntaPreparada, respuesta: str):
+    """Guarda en la caché de respuestas una respuesta generada para una pregunta del lote."""
+    if preparada.clave:
+        guardar_en_cache(preparada.pregunta, preparada.clave, respuesta, preparada.citas)
+
+MARCA_FUENTES = "\n\n**📚 Fuentes:** "
+
+def formatear_fuentes(citas: List[str]) -> str:
+    """Línea de fuentes que se agrega al final de la respuesta."""
+    return MARCA_FUENTES + " ".join(citas) if citas else ""
+
+def responder_pregunta(pregunta: str, directorio_persistencia: str, nombre_coleccion: str = "catchai_docs"):
     """Responde una pregunta usando el contexto de los documentos."""
+    texto, citas = responder_pregunta_con_citas(pregunta, directorio_persistencia, nombre_coleccion)
+    # Agregar fuentes si hay citas
+    return texto + formatear_fuentes(citas)
+
+def responder_pregunta_con_citas(pregunta: str, directorio_persistencia: str,
+                                 nombre_coleccion: str = "catchai_docs") -> Tuple[str, List[str]]:
+    """Como responder_pregunta, pero retorna (texto, citas) por separado (API, procesos por lotes).
+
+    Los errores se retornan como texto "❌ ..." sin citas.
+    """
+    with medir("respuesta"):
+        return _responder_pregunta(pregunta, directorio_persistencia, nombre_coleccion)
+
+def _responder_pregunta(pregunta: str, directorio_persistencia: str, nombre_coleccion: str) -> Tuple[str, List[str]]:
     try:
         # Validar entrada
         if not pregunta or not pregunta.strip():
-            return "❌ Por favor, ingresa una pregunta válida."
-            
-        # Cargar almacén de vectores
-        av = cargar_almacen_vectores(directorio_persistencia)
-        if not av:
-            return "❌ No hay documentos indexados. Por favor, sube y procesa algunos PDFs primero."
-            
-        # Buscar contexto
-        contexto, citas = buscar_contexto(av, pregunta, k=5)
-        if not contexto or contexto == "No hay documentos indexados para buscar.":
-            return "❌ No se encontró información relevante para responder tu pregunta."
-            
-        # Preparar prompt
-        sistema = PROMPT_SISTEMA
-        usuario = PROMPT_PREGUNTA_RESPUESTA.format(question=pregunta, context=contexto)
+            return "❌ Por favor, ingresa una pregunta válida.", []
+
+        acierto, clave = consultar_cache(pregunta, directorio_persistencia, nombre_coleccion)
+        if acierto:
+            return acierto
+
+        prompt, citas, error = _preparar_pregunta(pregunta, directorio_persistencia, clave[1], nombre_coleccion)
+        if error:
+            return error, []
         modelo = os.getenv("LLM_MODEL", "gemini-2.0-flash-001")
         
-        # Llamar al modelo
-        cliente = _cliente()
-        
-        # Corregir la llamada a Gemini API
-        try:
-            # Método 1: Usar generate_content con texto simple
-            respuesta = cliente.models.generate_content(
-                model=modelo,
-                contents=f"{sistema}\n\n{usuario}"
-            )
-        except Exception as e1:
-            logger.warning(f"Primer método falló: {e1}")
-            try:
-                # Método 2: Usar el formato de tipos correcto
-                respuesta = cliente.models.generate_content(
-                    model=modelo,
-                    contents=[types.Content(role="user", parts=[types.Part.from_text(f"{sistema}\n\n{usuario}")])]
-                )
-            except Exception as e2:
-                logger.warning(f"Segundo método falló: {e2}")
-                # Método 3: Usar el formato más simple
-                respuesta = cliente.models.generate_content(
-                    model=modelo,
-                    contents=f"{sistema}\n\n{usuario}"
-                )
-        
-        if not respuesta or not respuesta.text:
-            return "❌ Error: No se pudo generar una respuesta del modelo."
+        # Llamar al modelo (la pasarela reintenta solo errores transitorios)
+        texto = generar(prompt, modelo)
+        if not texto:
+            return "❌ Error: No se pudo generar una respuesta del modelo.", []
             
-        texto = respuesta.text.strip()
-        
-        # Agregar fuentes si hay citas
-        if citas:
-            texto += "\n\n**📚 Fuentes:** " + " ".join(citas)
-            
-        return texto
+        guardar_en_cache(pregunta, clave, texto, citas)
+        return texto, citas
         
     except ValueError as e:
-        return f"❌ Error de configuración: {e}"
+        return f"❌ Error de configuración: {e}", []
     except Exception as e:
         logger.error(f"Error generando respuesta: {e}")
-        return f"❌ Error inesperado: {str(e)}"
+        return f"❌ Error inesperado: {str(e)}", []
+
+def responder_pregunta_stream(pregunta: str, directorio_persistencia: str,
+                              nombre_coleccion: str = "catchai_docs") -> Iterator[str]:
+    """Variante en streaming de responder_pregunta: entrega el texto a medida que llega.
 
-def obtener_estadisticas_documentos(directorio_persistencia: str):
-    """Obtiene estadísticas del almacén de vectores."""
+    Las fuentes se agregan al final. Registra el tiempo hasta el primer token.
+    """
+    inicio = time.perf_counter()
     try:
-        av = cargar_almacen_vectores(directorio_persistencia)
-        if not av:
+        # Validar entrada
+        if not pregunta or not pregunta.strip():
+            yield "❌ Por favor, ingresa una pregunta válida."
+            return
+
+        acierto, clave = consultar_cache(pregunta, directorio_persistencia, nombre_coleccion)
+        if acierto:
+            respuesta, citas = acierto
+            logger.info(f"Respuesta desde caché en {time.perf_counter() - inicio:.3f}s")
+            yield respuesta
+            yield formatear_fuentes(citas)
+            return
+
+        prompt, citas, error = _preparar_pregunta(pregunta, directorio_persistencia, clave[1], nombre_coleccion)
+        if error:
+            yield error
+            return
+        modelo = os.getenv("LLM_MODEL", "gemini-2.0-flash-001")
+        primer_token = None
+        partes = []
+        for texto in generar_stream(prompt, modelo):
+            if primer_token is None:
+                primer_token = time.perf_counter() - inicio
+                registrar_etapa("respuesta_primer_token", primer_token)
+                logger.info(f"Tiempo al primer token: {primer_token:.3f}s")
+            partes.append(texto)
+            yield texto
+
+        if primer_token is None:
+            yield "❌ Error: No se pudo generar una respuesta del modelo."
+            return
+        guardar_en_cache(pregunta, clave, "".join(partes).strip(), citas)
+        yield formatear_fuentes(citas)
+        registrar_etapa("respuesta_stream", time.perf_counter() - inicio)
+        logger.info(f"Respuesta en streaming completa en {time.perf_counter() - inicio:.3f}s")
+
+    except ValueError as e:
+        yield f"❌ Error de configuración: {e}"
+    except Exception as e:
+        logger.error(f"Error generando respuesta: {e}")
+        yield f"❌ Error inesperado: {str(e)}"
+
+def listar_documentos_indexados(directorio_persistencia: str, nombre_coleccion: str = "catchai_docs"):
+    """Entradas del catálogo; si falta (índice antiguo) se reconstruye una sola vez."""
+    entradas = listar_documentos(directorio_persistencia, nombre_coleccion)
+    if not entradas:
+        av = cargar_almacen_vectores(directorio_persistencia, nombre_coleccion)
+        if av:
+            entradas = reconstruir_catalogo(directorio_persistencia, av, nombre_coleccion)
+    return entradas
+
+def obtener_estadisticas_documentos(directorio_persistencia: str, nombre_coleccion: str = "catchai_docs"):
+    """Obtiene estadísticas del almacén de vectores desde el catálogo."""
+    try:
+        entradas = listar_documentos_indexados(directorio_persistencia, nombre_coleccion)
+        if not entradas:
             return {"total_chunks": 0, "documents": []}
-            
-        coleccion = av._collection
-        total_fragmentos = coleccion.count()
-        
-        # Obtener documentos únicos
-        documentos = coleccion.get()
-        nombres_documentos = set()
-        for metadatos in documentos.get('metadatas', []):
-            if metadatos and 'doc_name' in metadatos:
-                nombres_documentos.add(metadatos['doc_name'])
                 
         return {
-            "total_chunks": total_fragmentos,
-            "documents": list(nombres_documentos),
-            "total_docs": len(nombres_documentos)
+            "total_chunks": sum(e.fragmentos for e in entradas),
+            "documents": [e.nombre for e in entradas],
+            "total_docs": len(entradas)
         }
     except Exception as e:
         logger.error(f"Error obteniendo estadísticas: {e}")
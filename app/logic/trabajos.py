@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+import logging
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cola persistente de trabajos de ingesta. La interfaz (o la API) encola y
+# consulta; un único ejecutor por instalación procesa los trabajos en orden.
+# Los PDFs se copian al directorio del trabajo para sobrevivir a un reinicio:
+# un trabajo que quedó "en_curso" al caer el proceso vuelve a "pendiente" y se
+# reprocesa (la ingesta es incremental, así que reutiliza lo ya insertado).
+TRABAJOS_DIR = os.getenv("TRABAJOS_DIR", "/app/data/trabajos")
+INTERVALO_SONDEO = float(os.getenv("TRABAJOS_SONDEO", "1"))
+
+PENDIENTE, EN_CURSO, COMPLETADO, FALLIDO, CANCELADO = "pendiente", "en_curso", "completado", "fallido", "cancelado"
+TERMINADOS = (COMPLETADO, FALLIDO, CANCELADO)
+
+@dataclass
+class Trabajo:
+    id: str
+    estado: str
+    directorio_persistencia: str
+    archivos: List[str]
+    creado_en: float
+    nombre_coleccion: str = "catchai_docs"
+    iniciado_en: Optional[float] = None
+    terminado_en: Optional[float] = None
+    progreso: dict = field(default_factory=dict)
+    resultado: List[dict] = field(default_factory=list)
+    error: Optional[str] = None
+    cancelacion_solicitada: bool = False
+
+    @property
+    def terminado(self) -> bool:
+        return self.estado in TERMINADOS
+
+def _conectar() -> sqlite3.Connection:
+    os.makedirs(TRABAJOS_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(TRABAJOS_DIR, "trabajos.sqlite"), timeout=30)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS trabajos (
+               id TEXT PRIMARY KEY,
+               estado TEXT NOT NULL,
+               directorio_persistencia TEXT NOT NULL,
+               archivos TEXT NOT NULL,
+               creado_en REAL NOT NULL,
+               iniciado_en REAL,
+               terminado_en REAL,
+               progreso TEXT NOT NULL DEFAULT '{}',
+               resultado TEXT NOT NULL DEFAULT '[]',
+               error TEXT,
+               cancelar INTEGER NOT NULL DEFAULT 0,
+               coleccion TEXT NOT NULL DEFAULT 'catchai_docs')"""
+    )
+    # Colas creadas antes de los espacios de trabajo
+    if "coleccion" not in {c[1] for c in conn.execute("PRAGMA table_info(trabajos)")}:
+        conn.execute("ALTER TABLE trabajos ADD COLUMN coleccion TEXT NOT NULL DEFAULT 'catchai_docs'")
+    conn.execute("CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado, creado_en)")
+    return conn
+
+_COLUMNAS = ("id, estado, directorio_persistencia, archivos, creado_en, iniciado_en, terminado_en, "
+             "progreso, resultado, error, cancelar, coleccion")
+
+def _trabajo(fila) -> Trabajo:
+    return Trabajo(id=fila[0], estado=fila[1], directorio_persistencia=fila[2], archivos=json.loads(fila[3]),
+                   creado_en=fila[4], iniciado_en=fila[5], terminado_en=fila[6], progreso=json.loads(fila[7]),
+                   resultado=json.loads(fila[8]), error=fila[9], cancelacion_solicitada=bool(fila[10]),
+                   nombre_coleccion=fila[11])
+
+def _directorio_trabajo(id_trabajo: str) -> str:
+    return os.path.join(TRABAJOS_DIR, id_trabajo)
+
+def encolar_trabajo(rutas: List[str], directorio_persistencia: str, nombre_coleccion: str = "catchai_docs") -> str:
+    """Copia los PDFs al directorio del trabajo y lo encola; retorna su id.
+
+    El nombre del archivo es el nombre del documento en el índice, así que no
+    se aceptan dos archivos con el mismo nombre en un trabajo (ValueError).
+    """
+    nombres = [os.path.basename(ruta) for ruta in rutas]
+    repetidos = sorted({n for n in nombres if nombres.count(n) > 1})
+    if repetidos:
+        raise ValueError(f"Archivos con el mismo nombre: {', '.join(repetidos)}")
+    id_trabajo = uuid.uuid4().hex
+    destino = _directorio_trabajo(id_trabajo)
+    os.makedirs(destino, exist_ok=True)
+    archivos = []
+    for ruta in rutas:
+        copia = os.path.join(destino, os.path.basename(ruta))
+        shutil.copyfile(ruta, copia)
+        archivos.append(copia)
+    with closing(_conectar()) as conn, conn:
+        conn.execute("INSERT INTO trabajos (id, estado, directorio_persistencia, archivos, creado_en, coleccion) "
+                     "VALUES (?, ?, ?, ?, ?, ?)",
+                     (id_trabajo, PENDIENTE, directorio_persistencia, json.dumps(archivos), time.time(),
+                      nombre_coleccion))
+    logger.info(f"Trabajo de ingesta encolado: {id_trabajo} ({len(archivos)} archivos)")
+    return id_trabajo
+
+def obtener_trabajo(id_trabajo: str, nombre_coleccion: Optional[str] = None) -> Optional[Trabajo]:
+    """Con `nombre_coleccion`, None si el trabajo es de otro espacio de trabajo."""
+    with closing(_conectar()) as conn:
+        fila = conn.execute(f"SELECT {_COLUMNAS} FROM trabajos WHERE id = ?", (id_trabajo,)).fetchone()
+    trabajo = _trabajo(fila) if fila else None
+    if trabajo is not None and nombre_coleccion and trabajo.nombre_coleccion != nombre_coleccion:
+        return None
+    return trabajo
+
+def listar_trabajos(activos: bool = False, limite: int = 20, nombre_coleccion: Optional[str] = None) -> List[Trabajo]:
+    """Trabajos más recientes primero; con `activos` solo los pendientes o en curso.
+
+    Con `nombre_coleccion` solo los de ese espacio de trabajo.
+    """
+    condiciones, parametros = [], []
+    if activos:
+        condiciones.append(f"estado IN ('{PENDIENTE}', '{EN_CURSO}')")
+    if nombre_coleccion:
+        condiciones.append("coleccion = ?")
+        parametros.append(nombre_coleccion)
+    filtro = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    with closing(_conectar()) as conn:
+        filas = conn.execute(f"SELECT {_COLUMNAS} FROM trabajos {filtro} ORDER BY creado_en DESC LIMIT ?",
+                             (*parametros, limite)).fetchall()
+    return [_trabajo(f) for f in filas]
+
+def cancelar_trabajo(id_trabajo: str, nombre_coleccion: Optional[str] = None) -> bool:
+    """Cancela un trabajo pendiente de inmediato, o pide al ejecutor que detenga uno en curso.
+
+    Con `nombre_coleccion` solo si el trabajo es de ese espacio de trabajo.
+    """
+    filtro, parametros = ("AND coleccion = ?", (nombre_coleccion,)) if nombre_coleccion else ("", ())
+    with closing(_conectar()) as conn, conn:
+        cursor = conn.execute(f"UPDATE trabajos SET estado = ?, terminado_en = ? WHERE id = ? AND estado = ? {filtro}",
+                              (CANCELADO, time.time(), id_trabajo, PENDIENTE, *parametros))
+        if cursor.rowcount:
+            cancelado_en_cola = True
+        else:
+            cursor = conn.execute(f"UPDATE trabajos SET cancelar = 1 WHERE id = ? AND estado = ? {filtro}",
+                                  (id_trabajo, EN_CURSO, *parametros))
+            cancelado_en_cola = False
+    if cancelado_en_cola:
+        shutil.rmtree(_directorio_trabajo(id_trabajo), ignore_errors=True)
+    return bool(cursor.rowcount)
+
+def _reclamar_siguiente() -> Optional[Trabajo]:
+    """Marca como en curso el pendiente más antiguo (transacción exclusiva)."""
+    with closing(_conectar()) as conn:
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fila = conn.execute(f"SELECT {_COLUMNAS} FROM trabajos WHERE estado = ? ORDER BY creado_en LIMIT 1",
+                                (PENDIENTE,)).fetchone()
+            if fila:
+                conn.execute("UPDATE trabajos SET estado = ?, iniciado_en = ? WHERE id = ?",
+                             (EN_CURSO, time.time(), fila[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    if not fila:
+        return None
+    trabajo = _trabajo(fila)
+    trabajo.estado = EN_CURSO
+    return trabajo
+
+def _actualizar_progreso(id_trabajo: str, progreso: dict) -> bool:
+    """Guarda el avance; retorna True si se pidió cancelar el trabajo."""
+    with closing(_conectar()) as conn, conn:
+        conn.execute("UPDATE trabajos SET progreso = ? WHERE id = ?", (json.dumps(progreso), id_trabajo))
+        fila = conn.execute("SELECT cancelar FROM trabajos WHERE id = ?", (id_trabajo,)).fetchone()
+    return bool(fila and fila[0])
+
+def _finalizar(id_trabajo: str, estado: str, resultado: Optional[List[dict]] = None, error: Optional[str] = None):
+    with closing(_conectar()) as conn, conn:
+        conn.execute("UPDATE trabajos SET estado = ?, terminado_en = ?, resultado = ?, error = ? WHERE id = ?",
+                     (estado, time.time(), json.dumps(resultado or []), error, id_trabajo))
+    shutil.rmtree(_directorio_trabajo(id_trabajo), ignore_errors=True)
+
+def _recuperar_interrumpidos() -> int:
+    """Devuelve a la cola los trabajos que quedaron en curso (solo lo llama el ejecutor activo)."""
+    # Los que tenían una cancelación pedida se dan por cancelados
+    with closing(_conectar()) as conn:
+        cancelados = [f[0] for f in conn.execute("SELECT id FROM trabajos WHERE estado = ? AND cancelar = 1",
+                                                 (EN_CURSO,))]
+    for id_trabajo in cancelados:
+        _finalizar(id_trabajo, CANCELADO)
+    with closing(_conectar()) as conn, conn:
+        cursor = conn.execute("UPDATE trabajos SET estado = ? WHERE estado = ?", (PENDIENTE, EN_CURSO))
+    if cursor.rowcount:
+        logger.info(f"Trabajos interrumpidos devueltos a la cola: {cursor.rowcount}")
+    return cursor.rowcount
+
+def _progreso_a_dict(progreso) -> dict:
+    return {
+        "fraccion": progreso.fraccion,
+        "archivo_actual": progreso.archivo_actual,
+        "archivos_completados": progreso.archivos_completados,
+        "archivos_total": progreso.archivos_total,
+        "paginas": progreso.paginas,
+        "paginas_por_segundo": progreso.paginas_por_segundo,
+        "fragmentos_vectorizados": progreso.fragmentos_vectorizados,
+        "fragmentos_por_segundo": progreso.fragmentos_por_segundo,
+    }
+
+def _bloqueo_sin_espera(archivo):
+    """Bloqueo exclusivo del archivo entre procesos; OSError si otro proceso lo tiene.
+
+    El sistema lo libera si el proceso muere. ImportError si la plataforma no
+    tiene ni fcntl ni msvcrt.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        archivo.seek(0)
+        msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+        return
+    fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+def ejecutar_trabajo(trabajo: Trabajo):
+    """Procesa un trabajo reclamado y registra su resultado."""
+    from dataclasses import asdict
+    from .ingest import IngestaCancelada, procesar_pdfs
+
+    def _progreso(progreso):
+        if _actualizar_progreso(trabajo.id, _progreso_a_dict(progreso)):
+            raise IngestaCancelada()
+
+    try:
+        metadatos = procesar_pdfs(trabajo.archivos, trabajo.directorio_persistencia, trabajo.nombre_coleccion,
+                                  progreso=_progreso)
+        _finalizar(trabajo.id, COMPLETADO, resultado=[asdict(m) for m in metadatos])
+        logger.info(f"Trabajo completado: {trabajo.id}")
+    except IngestaCancelada:
+        _finalizar(trabajo.id, CANCELADO)
+        logger.info(f"Trabajo cancelado: {trabajo.id}")
+    except Exception as e:
+        _finalizar(trabajo.id, FALLIDO, error=str(e))
+        logger.error(f"❌ Trabajo fallido {trabajo.id}: {e}")
+
+class EjecutorTrabajos:
+    """Hilo que procesa la cola. Solo un proceso a la vez es el ejecutor activo.
+
+    La exclusión se hace con un bloqueo de archivo que el sistema libera si el
+    proceso muere; los demás procesos (otros workers de la API) esperan en
+    reserva y toman el relevo, recuperando los trabajos interrumpidos.
+    """
+
+    def __init__(self):
+        self.detener = threading.Event()
+        self.activo = False
+        self._archivo_bloqueo = None
+
+    def _tomar_liderazgo(self) -> bool:
+        os.makedirs(TRABAJOS_DIR, exist_ok=True)
+        archivo = open(os.path.join(TRABAJOS_DIR, "ejecutor.lock"), "a+")
+        try:
+            _bloqueo_sin_espera(archivo)
+        except ImportError:
+            # Sin bloqueo entre procesos no se puede garantizar un único ejecutor: no se procesa
+            archivo.close()
+            logger.error("❌ Sin fcntl ni msvcrt: el ejecutor de trabajos no se inicia")
+            self.detener.set()
+            return False
+        except OSError:
+            archivo.close()
+            return False
+        # Se conserva abierto mientras viva el proceso
+        self._archivo_bloqueo = archivo
+        return True
+
+    def ejecutar(self):
+        while not self.detener.is_set():
+            try:
+                if not self.activo:
+                    if not self._tomar_liderazgo():
+                        self.detener.wait(INTERVALO_SONDEO * 5)
+                        continue
+                    self.activo = True
+                    _recuperar_interrumpidos()
+                trabajo = _reclamar_siguiente()
+                if trabajo is None:
+                    self.detener.wait(INTERVALO_SONDEO)
+                    continue
+                ejecutar_trabajo(trabajo)
+            except Exception as e:
+                logger.error(f"❌ Error en el ejecutor de trabajos: {e}")
+                self.detener.wait(INTERVALO_SONDEO)
+
+_ejecutor: Optional[EjecutorTrabajos] = None
+_lock = threading.Lock()
+
+def iniciar_ejecutor() -> EjecutorTrabajos:
+    """Inicia el ejecutor de trabajos del proceso (una sola vez)."""
+    global _ejecutor
+    with _lock:
+        if _ejecutor is None:
+            _ejecutor = EjecutorTrabajos()
+            threading.Thread(target=_ejecutor.ejecutar, name="trabajos-ingesta", daemon=True).start()
+    return _ejecutor
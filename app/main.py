@@ -1,17 +1,33 @@
 import os
+import time
+import importlib
+import uuid
 import tempfile
 import shutil
 from dotenv import load_dotenv
 import streamlit as st
 from utils.ui import encabezado, mostrar_estado
-from logic.ingest import procesar_pdfs, limpiar_almacen_vectores
-from logic.retriever import responder_pregunta, obtener_estadisticas_documentos
-from logic.chains import resumir_documento, comparar_documentos, clasificar_topicos, obtener_vista_general_documentos
+from logic.arranque import iniciar_calentamiento
+from logic.metricas import iniciar_servidor_metricas, resumen_metricas
+from logic.trabajos import iniciar_ejecutor
+from logic.esquema import ESPACIO_PREDETERMINADO, coleccion_espacio, normalizar_espacio
+# Los módulos de lógica (torch, langchain, chromadb, google-genai) se importan
+# dentro de cada acción para que la primera página se muestre de inmediato.
+# Con API_URL la interfaz es un cliente delgado de app/api.py y no carga modelos.
 
 # Configuración de la página
 load_dotenv()
 PERSIST_DIR = os.environ.get("CHROMA_DIR", "/app/data/chroma")
-os.makedirs(PERSIST_DIR, exist_ok=True)
+API_URL = os.environ.get("API_URL", "")
+if not API_URL:
+    os.makedirs(PERSIST_DIR, exist_ok=True)
+
+def servicio(modulo: str):
+    """Módulo de lógica local, o el cliente HTTP (mismas funciones) si API_URL está configurada."""
+    if API_URL:
+        from utils import cliente_api
+        return cliente_api
+    return importlib.import_module(f"logic.{modulo}")
 
 # Configurar página
 st.set_page_config(
@@ -21,6 +37,15 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource(show_spinner=False)
+def obtener_calentamiento():
+    """Una vez por servidor: carga embeddings, almacén y cliente LLM en segundo plano."""
+    iniciar_servidor_metricas()
+    iniciar_ejecutor()
+    return iniciar_calentamiento(PERSIST_DIR)
+
+calentamiento = None if API_URL else obtener_calentamiento()
+
 # Inicializar estado de sesión
 if 'archivos_subidos' not in st.session_state:
     st.session_state.archivos_subidos = []
@@ -28,62 +53,125 @@ if 'documentos_procesados' not in st.session_state:
     st.session_state.documentos_procesados = []
 if 'historial_chat' not in st.session_state:
     st.session_state.historial_chat = []
+if 'id_conversacion' not in st.session_state:
+    st.session_state.id_conversacion = uuid.uuid4().hex
+if 'trabajos' not in st.session_state:
+    st.session_state.trabajos = [t for t in st.query_params.get("trabajos", "").split(",") if t]
+
+# Espacio de trabajo: colección propia por equipo (o por sesión con ESPACIO_POR_SESION=1).
+# Búsquedas, estadísticas y limpieza solo tocan la colección del espacio.
+if 'espacio' not in st.session_state:
+    por_sesion = os.environ.get("ESPACIO_POR_SESION", "0") == "1"
+    st.session_state.espacio = normalizar_espacio(
+        st.query_params.get("espacio") or (uuid.uuid4().hex[:12] if por_sesion else ESPACIO_PREDETERMINADO)
+    )
+    st.query_params["espacio"] = st.session_state.espacio
+coleccion = coleccion_espacio(st.session_state.espacio)
+
+def cambiar_espacio(espacio: str):
+    """Pasa a otro espacio de trabajo con una sesión limpia (documentos, chat y trabajos seguidos)."""
+    st.session_state.espacio = normalizar_espacio(espacio)
+    st.query_params["espacio"] = st.session_state.espacio
+    st.session_state.documentos_procesados = []
+    st.session_state.archivos_subidos = []
+    st.session_state.historial_chat = []
+    st.session_state.id_conversacion = uuid.uuid4().hex
+    st.session_state.trabajos = []
+    _guardar_trabajos()
+    st.rerun()
+
+# Trabajos de ingesta en segundo plano: los ids viven también en la URL para
+# que el progreso se siga mostrando tras recargar la página.
+def _guardar_trabajos():
+    if st.session_state.trabajos:
+        st.query_params["trabajos"] = ",".join(st.session_state.trabajos)
+    elif "trabajos" in st.query_params:
+        del st.query_params["trabajos"]
 
 # Función para procesar archivos
 def procesar_archivos(archivos):
-    """Procesa los archivos PDF subidos."""
+    """Encola los PDFs subidos como trabajo de ingesta; el avance se sondea sin bloquear la interfaz."""
+    directorio_temp = tempfile.mkdtemp()
     try:
-        with st.spinner("🔄 Procesando archivos PDF..."):
-            # Crear directorio temporal para archivos
-            directorio_temp = tempfile.mkdtemp()
-            rutas = []
-            
-            # Guardar archivos temporalmente
-            for archivo in archivos:
-                ruta_temp = os.path.join(directorio_temp, archivo.name)
-                with open(ruta_temp, "wb") as w:
-                    w.write(archivo.read())
-                rutas.append(ruta_temp)
-            
-            # Procesar PDFs
-            metadatos = procesar_pdfs(rutas, directorio_persistencia=PERSIST_DIR)
-            
-            if metadatos:
-                # Actualizar estado de sesión
-                st.session_state.documentos_procesados = [
-                    {
-                        'nombre': meta.nombre,
-                        'paginas': meta.paginas,
-                        'tamaño_mb': meta.tamaño_mb
-                    }
-                    for meta in metadatos
-                ]
-                
-                st.session_state.archivos_subidos = [
-                    {
-                        'nombre': archivo.name,
-                        'tamaño': archivo.size / (1024 * 1024)
-                    }
-                    for archivo in archivos
-                ]
-                
-                st.success(f"✅ Procesados {len(metadatos)} documentos exitosamente!")
-                st.rerun()
-            else:
-                st.error("❌ No se pudieron procesar los archivos")
-                
+        rutas = []
+        # Guardar archivos temporalmente, copiando por bloques para no cargar el PDF entero en memoria
+        for archivo in archivos:
+            ruta_temp = os.path.join(directorio_temp, archivo.name)
+            archivo.seek(0)
+            with open(ruta_temp, "wb") as w:
+                shutil.copyfileobj(archivo, w, length=1024 * 1024)
+            rutas.append(ruta_temp)
+        
+        # La cola copia los archivos, así que el directorio temporal se puede borrar de inmediato
+        id_trabajo = servicio("trabajos").encolar_trabajo(rutas, PERSIST_DIR, coleccion)
+        st.session_state.trabajos.append(id_trabajo)
+        _guardar_trabajos()
+        st.rerun()
     except Exception as e:
-        st.error(f"❌ Error procesando archivos: {str(e)}")
+        st.error(f"❌ Error encolando archivos: {str(e)}")
     finally:
         # Limpiar archivos temporales
-        if 'directorio_temp' in locals():
-            shutil.rmtree(directorio_temp, ignore_errors=True)
+        shutil.rmtree(directorio_temp, ignore_errors=True)
+
+def _trabajo_terminado(trabajo):
+    """Actualiza la sesión con el resultado de un trabajo finalizado."""
+    if trabajo.estado == "completado" and trabajo.resultado:
+        st.session_state.documentos_procesados = [
+            {'nombre': meta['nombre'], 'paginas': meta['paginas'], 'tamaño_mb': meta['tamaño_mb']}
+            for meta in trabajo.resultado
+        ]
+        st.session_state.archivos_subidos = [
+            {'nombre': meta['nombre'], 'tamaño': meta['tamaño_mb']} for meta in trabajo.resultado
+        ]
+        st.session_state.aviso_trabajo = ("success", f"✅ Procesados {len(trabajo.resultado)} documentos exitosamente!")
+    elif trabajo.estado == "completado":
+        st.session_state.aviso_trabajo = ("error", "❌ No se pudieron procesar los archivos")
+    elif trabajo.estado == "cancelado":
+        st.session_state.aviso_trabajo = ("warning", "⏹️ Procesamiento cancelado")
+    else:
+        st.session_state.aviso_trabajo = ("error", f"❌ Error procesando archivos: {trabajo.error}")
+
+@st.fragment(run_every=float(os.getenv("TRABAJOS_SONDEO", "1")) * 2)
+def mostrar_trabajos():
+    """Progreso de los trabajos en curso; se refresca solo, sin re-ejecutar la página."""
+    cola = servicio("trabajos")
+    terminados = False
+    for id_trabajo in list(st.session_state.trabajos):
+        try:
+            trabajo = cola.obtener_trabajo(id_trabajo, coleccion)
+        except Exception as e:
+            st.caption(f"⚠️ No se pudo consultar el trabajo: {e}")
+            continue
+        if trabajo is None or trabajo.terminado:
+            if trabajo is not None:
+                _trabajo_terminado(trabajo)
+            st.session_state.trabajos.remove(id_trabajo)
+            terminados = True
+            continue
+        progreso = trabajo.progreso
+        if trabajo.estado == "pendiente" or not progreso:
+            st.progress(0.0, text="⏳ En cola...")
+        else:
+            st.progress(
+                progreso["fraccion"],
+                text=(f"🔄 {progreso['archivo_actual'] or 'Procesando'} · "
+                      f"{progreso['archivos_completados']}/{progreso['archivos_total']} archivos · "
+                      f"{progreso['paginas']} páginas ({progreso['paginas_por_segundo']:.1f}/s) · "
+                      f"{progreso['fragmentos_vectorizados']} fragmentos ({progreso['fragmentos_por_segundo']:.1f}/s)")
+            )
+        if trabajo.cancelacion_solicitada:
+            st.caption("⏹️ Cancelando...")
+        elif st.button("⏹️ Cancelar", key=f"cancelar_{id_trabajo}", use_container_width=True):
+            cola.cancelar_trabajo(id_trabajo, coleccion)
+    if terminados:
+        _guardar_trabajos()
+        st.rerun()
 
 # Función para limpiar datos
 def limpiar_todos_datos():
     """Limpia todos los datos del almacén de vectores."""
     try:
-        limpiar_almacen_vectores(PERSIST_DIR)
+        servicio("ingest").limpiar_almacen_vectores(PERSIST_DIR, coleccion)
         st.session_state.documentos_procesados = []
         st.session_state.archivos_subidos = []
         st.session_state.historial_chat = []
@@ -97,6 +185,11 @@ encabezado()
 
 # Barra lateral para subida de archivos
 with st.sidebar:
+    espacio = st.text_input("🗂️ Espacio de trabajo", value=st.session_state.espacio,
+                            help="Cada espacio tiene sus propios documentos; limpiar solo afecta al espacio actual")
+    if normalizar_espacio(espacio) != st.session_state.espacio:
+        cambiar_espacio(espacio)
+    
     st.subheader("📄 Subir PDFs")
     
     # Límite de archivos
@@ -127,6 +220,13 @@ with st.sidebar:
         if st.button("🗑️ Limpiar", use_container_width=True):
             limpiar_todos_datos()
     
+    # Trabajos de ingesta en curso y aviso del último finalizado
+    if st.session_state.trabajos:
+        mostrar_trabajos()
+    if 'aviso_trabajo' in st.session_state:
+        tipo, mensaje = st.session_state.pop('aviso_trabajo')
+        getattr(st, tipo)(mensaje)
+    
     # Mostrar archivos subidos
     if st.session_state.archivos_subidos:
         st.markdown("---")
@@ -144,7 +244,7 @@ with st.sidebar:
     # Estadísticas del almacén de vectores
     st.markdown("---")
     st.subheader("📊 Estadísticas")
-    estadisticas = obtener_estadisticas_documentos(PERSIST_DIR)
+    estadisticas = servicio("retriever").obtener_estadisticas_documentos(PERSIST_DIR, coleccion)
     if estadisticas.get('total_chunks', 0) > 0:
         st.metric("Total de fragmentos", estadisticas['total_chunks'])
         st.metric("Documentos", estadisticas['total_docs'])
@@ -154,8 +254,10 @@ with st.sidebar:
 # Contenido principal
 if st.session_state.documentos_procesados:
     # Vista general de documentos
+    cadenas = servicio("chains")
+
     with st.expander("📊 Vista General de Documentos", expanded=False):
-        vista_general = obtener_vista_general_documentos(PERSIST_DIR)
+        vista_general = cadenas.obtener_vista_general_documentos(PERSIST_DIR, coleccion)
         st.markdown(vista_general)
     
     # Funcionalidades opcionales
@@ -172,7 +274,7 @@ if st.session_state.documentos_procesados:
         if st.button("🔎 Generar Resumen", use_container_width=True):
             if documento_resumen:
                 with st.spinner("Generando resumen..."):
-                    resultado = resumir_documento(documento_resumen, PERSIST_DIR)
+                    resultado = cadenas.resumir_documento(documento_resumen, PERSIST_DIR, coleccion)
                     st.markdown(resultado)
     
     with col2:
@@ -184,7 +286,8 @@ if st.session_state.documentos_procesados:
             if st.button("⚖️ Comparar", use_container_width=True):
                 if documento_a and documento_b and documento_a != documento_b:
                     with st.spinner("Comparando documentos..."):
-                        resultado = comparar_documentos(documento_a, documento_b, PERSIST_DIR)
+                        resultado = cadenas.comparar_documentos(documento_a, documento_b, PERSIST_DIR,
+                                                                nombre_coleccion=coleccion)
                         st.markdown(resultado)
                 elif documento_a == documento_b:
                     st.warning("⚠️ Selecciona documentos diferentes")
@@ -197,7 +300,7 @@ if st.session_state.documentos_procesados:
         if st.button("🏷️ Clasificar", use_container_width=True):
             if consulta_tema:
                 with st.spinner("Clasificando tópicos..."):
-                    resultado = clasificar_topicos(consulta_tema, PERSIST_DIR)
+                    resultado = cadenas.clasificar_topicos(consulta_tema, PERSIST_DIR, coleccion)
                     st.markdown(resultado)
     
     st.markdown("---")
@@ -226,19 +329,34 @@ with col1:
     if st.button("🤖 Preguntar", type="primary", use_container_width=True):
         if consulta and consulta.strip():
             if st.session_state.documentos_procesados:
-                with st.spinner("🤖 Generando respuesta..."):
-                    respuesta = responder_pregunta(consulta, PERSIST_DIR)
-                    
-                    # Agregar al historial
-                    st.session_state.historial_chat.append((consulta, respuesta))
-                    
-                    # Mostrar respuesta
-                    st.markdown("---")
-                    st.markdown("**💬 Respuesta:**")
-                    st.markdown(respuesta)
-                    
-                    # Limpiar entrada usando rerun en lugar de modificar estado de sesión
-                    st.rerun()
+                st.markdown("---")
+                st.markdown("**💬 Respuesta:**")
+                responder_en_conversacion_stream = servicio("conversacion").responder_en_conversacion_stream
+                if calentamiento and not calentamiento.listo.is_set():
+                    with st.spinner("⏳ Cargando modelos..."):
+                        calentamiento.listo.wait()
+                inicio = time.perf_counter()
+                tiempos = {}
+
+                def tokens_con_tiempo():
+                    # El historial condensado acompaña a la pregunta y el contexto del turno anterior se reutiliza
+                    for texto in responder_en_conversacion_stream(consulta, PERSIST_DIR,
+                                                                  st.session_state.id_conversacion,
+                                                                  st.session_state.historial_chat, coleccion):
+                        tiempos.setdefault("primer_token", time.perf_counter() - inicio)
+                        yield texto
+
+                # Renderizar la respuesta token a token
+                respuesta = st.write_stream(tokens_con_tiempo())
+                if isinstance(respuesta, list):
+                    respuesta = "".join(str(parte) for parte in respuesta)
+                st.caption(f"⏱️ Primer token: {tiempos.get('primer_token', 0):.2f}s · "
+                           f"Total: {time.perf_counter() - inicio:.2f}s")
+                if calentamiento:
+                    calentamiento.registrar_respuesta(time.perf_counter() - inicio)
+                
+                # Agregar al historial
+                st.session_state.historial_chat.append((consulta, respuesta))
             else:
                 st.warning("⚠️ No hay documentos procesados. Sube y procesa algunos PDFs primero.")
         else:
@@ -247,6 +365,7 @@ with col1:
 with col2:
     if st.button("🗑️ Limpiar Chat", use_container_width=True):
         st.session_state.historial_chat = []
+        st.session_state.id_conversacion = uuid.uuid4().hex
         st.rerun()
 
 # Pie de página
@@ -255,4 +374,15 @@ st.caption("🧠 **AI Gemini** - Modelo: Gemini 2.0 Flash + Embeddings open-sour
 st.caption("💡 **Consejo:** Usa preguntas específicas para obtener respuestas más precisas")
 
 # Mostrar estado del sistema
-mostrar_estado()
+if API_URL:
+    from utils.cliente_api import obtener_estado
+    estado_api = obtener_estado()
+    mostrar_estado(estadisticas_cache=estado_api.get("cache_respuestas"),
+                   estado_calentamiento=estado_api.get("calentamiento"),
+                   metricas=estado_api.get("metricas"))
+else:
+    from logic.cache_respuestas import obtener_cache_respuestas
+    cache_respuestas = obtener_cache_respuestas()
+    mostrar_estado(estadisticas_cache=cache_respuestas.estadisticas() if cache_respuestas else None,
+                   estado_calentamiento=calentamiento.estado(),
+                   metricas=resumen_metricas())
@@ -0,0 +1,176 @@
+"""Respuesta por lotes de preguntas en JSONL (evaluaciones y reportes nocturnos).
+
+Uso:
+    python app/preguntas_lote.py preguntas.jsonl --salida respuestas.jsonl
+    python app/preguntas_lote.py requests.jsonl --campo-id request_id --campo-pregunta body --concurrencia 8
+    python app/preguntas_lote.py preguntas.jsonl --espacio equipo-legal
+
+Cada línea de entrada es un objeto JSON con un id y una pregunta. Las
+preguntas se procesan en lotes: todas las del lote se embeben en una sola
+pasada del modelo y se buscan con una sola consulta multi-vector a Chroma.
+Las llamadas a Gemini van en paralelo con concurrencia acotada (y el límite
+de tasa por modelo de la pasarela LLM), mientras se prepara el lote siguiente.
+Cada respuesta se escribe en la salida apenas llega, con citas y tiempos.
+
+Si la salida ya existe se retoma: se omiten los ids con respuesta correcta y
+se reintentan los que fallaron (en la salida vale la última línea de cada id).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Iterator, List, Set, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+from logic.llm import generar_async
+from logic.esquema import coleccion_espacio
+from logic.metricas import resumen_metricas
+from logic.retriever import PreguntaPreparada, guardar_respuesta_preparada, preparar_preguntas
+
+logger = logging.getLogger(__name__)
+
+PERSIST_DIR = os.environ.get("CHROMA_DIR", "/app/data/chroma")
+
+def leer_preguntas(ruta: str, campo_id: str, campo_pregunta: str) -> Iterator[Tuple[str, str]]:
+    """Produce (id, pregunta); sin campo id se usa el número de línea."""
+    with open(ruta, encoding="utf-8") as f:
+        for numero, linea in enumerate(f, 1):
+            if not linea.strip():
+                continue
+            registro = json.loads(linea)
+            yield str(registro.get(campo_id, numero)), registro.get(campo_pregunta) or ""
+
+def ids_completados(ruta: str) -> Set[str]:
+    """Ids cuya última línea en la salida no tiene error (para retomar)."""
+    completados = set()
+    if not os.path.exists(ruta):
+        return completados
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError:
+                # Línea truncada por una interrupción: ese id se vuelve a procesar
+                continue
+            if registro.get("error"):
+                completados.discard(registro["id"])
+            else:
+                completados.add(registro["id"])
+    return completados
+
+def _en_lotes(elementos: List, tamaño: int) -> Iterator[List]:
+    for inicio in range(0, len(elementos), tamaño):
+        yield elementos[inicio:inicio + tamaño]
+
+async def _responder(id_pregunta: str, preparada: PreguntaPreparada, semaforo: asyncio.Semaphore,
+                     modelo: str) -> dict:
+    registro = {"id": id_pregunta, "pregunta": preparada.pregunta, "respuesta": None, "citas": preparada.citas,
+                "desde_cache": preparada.respuesta_cache is not None, "error": preparada.error,
+                "tiempos_ms": dict(preparada.tiempos_ms)}
+    if preparada.error:
+        return registro
+    if preparada.respuesta_cache is not None:
+        registro["respuesta"] = preparada.respuesta_cache
+        return registro
+    async with semaforo:
+        inicio = time.perf_counter()
+        try:
+            texto = await generar_async(preparada.prompt, modelo)
+        except Exception as e:
+            registro["error"] = f"❌ Error generando respuesta: {e}"
+            texto = ""
+        registro["tiempos_ms"]["llm"] = round((time.perf_counter() - inicio) * 1000, 2)
+    if texto:
+        registro["respuesta"] = texto
+        guardar_respuesta_preparada(preparada, texto)
+    elif not registro["error"]:
+        registro["error"] = "❌ Error: No se pudo generar una respuesta del modelo."
+    return registro
+
+async def procesar(pendientes: List[Tuple[str, str]], salida, tamaño_lote: int, concurrencia: int,
+                   nombre_coleccion: str) -> dict:
+    """Prepara lotes en un hilo y responde con a lo sumo `concurrencia` llamadas al LLM a la vez."""
+    modelo = os.getenv("LLM_MODEL", "gemini-2.0-flash-001")
+    semaforo = asyncio.Semaphore(concurrencia)
+    tareas = set()
+    totales = {"respondidas": 0, "desde_cache": 0, "errores": 0}
+
+    async def _responder_y_escribir(id_pregunta: str, preparada: PreguntaPreparada):
+        try:
+            registro = await _responder(id_pregunta, preparada, semaforo, modelo)
+        except Exception as e:
+            registro = {"id": id_pregunta, "pregunta": preparada.pregunta, "respuesta": None, "citas": [],
+                        "desde_cache": False, "error": f"❌ Error inesperado: {e}", "tiempos_ms": {}}
+        # Un error de escritura no se atrapa: sale por _esperar y detiene el proceso
+        # (al reanudar, la pregunta sin línea en la salida se vuelve a procesar)
+        salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        salida.flush()
+        if registro["error"]:
+            totales["errores"] += 1
+        else:
+            totales["respondidas"] += 1
+            totales["desde_cache"] += registro["desde_cache"]
+
+    async def _esperar(pendientes: set, modo: str) -> set:
+        hechas, pendientes = await asyncio.wait(pendientes, return_when=modo)
+        for tarea in hechas:
+            tarea.result()
+        return pendientes
+
+    try:
+        for lote in _en_lotes(pendientes, tamaño_lote):
+            preparadas = await asyncio.to_thread(preparar_preguntas, [p for _, p in lote], PERSIST_DIR,
+                                                 nombre_coleccion)
+            for (id_pregunta, _), preparada in zip(lote, preparadas):
+                tareas.add(asyncio.create_task(_responder_y_escribir(id_pregunta, preparada)))
+            # Se prepara a lo sumo un lote por delante de las llamadas en curso
+            while len(tareas) > tamaño_lote:
+                tareas = await _esperar(tareas, asyncio.FIRST_COMPLETED)
+            logger.info(f"Lote preparado: {len(lote)} preguntas; {totales['respondidas']} respondidas hasta ahora")
+        if tareas:
+            tareas = await _esperar(tareas, asyncio.ALL_COMPLETED)
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+    return totales
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("entrada", help="JSONL con una pregunta por línea")
+    parser.add_argument("--salida", default="respuestas.jsonl", help="JSONL de respuestas (se retoma si existe)")
+    parser.add_argument("--campo-id", default="id")
+    parser.add_argument("--campo-pregunta", default="pregunta")
+    parser.add_argument("--espacio", default=None, help="Espacio de trabajo (por defecto, el predeterminado)")
+    parser.add_argument("--lote", type=int, default=int(os.getenv("LOTE_PREGUNTAS", "32")),
+                        help="Preguntas por pasada de embeddings y consulta a Chroma")
+    parser.add_argument("--concurrencia", type=int, default=int(os.getenv("LOTE_CONCURRENCIA", "4")),
+                        help="Llamadas simultáneas al LLM")
+    args = parser.parse_args()
+
+    completados = ids_completados(args.salida)
+    preguntas = list(leer_preguntas(args.entrada, args.campo_id, args.campo_pregunta))
+    pendientes = [(i, p) for i, p in preguntas if i not in completados]
+    logger.info(f"{len(preguntas)} preguntas; {len(preguntas) - len(pendientes)} ya respondidas, "
+                f"{len(pendientes)} pendientes")
+    if not pendientes:
+        return
+
+    inicio = time.perf_counter()
+    with open(args.salida, "a", encoding="utf-8") as salida:
+        totales = asyncio.run(procesar(pendientes, salida, max(args.lote, 1), max(args.concurrencia, 1),
+                                       coleccion_espacio(args.espacio)))
+    duracion = time.perf_counter() - inicio
+    print(json.dumps({**totales, "segundos": round(duracion, 2),
+                      "preguntas_por_segundo": round(len(pendientes) / duracion, 2),
+                      "etapas": resumen_metricas()["etapas"]}, ensure_ascii=False, indent=2))
+    if totales["errores"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
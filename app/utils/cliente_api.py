@@ -0,0 +1,143 @@
+import os
+import logging
+from types import SimpleNamespace
+from typing import Iterator, List, Optional
+import httpx
+from logic.esquema import COLECCION_PREDETERMINADA, espacio_coleccion
+
+logger = logging.getLogger(__name__)
+
+# Cliente de la API HTTP (app/api.py) con los mismos nombres y firmas que las
+# funciones de `logic`, para que main.py funcione como cliente delgado cuando
+# API_URL está configurada. El directorio de persistencia lo decide el servidor;
+# el espacio de trabajo viaja en la cabecera X-Espacio.
+API_URL = os.getenv("API_URL", "").rstrip("/")
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "300"))
+
+_cliente: Optional[httpx.Client] = None
+
+def _http() -> httpx.Client:
+    """Cliente HTTP compartido (conexiones reutilizadas entre reruns)."""
+    global _cliente
+    if _cliente is None:
+        _cliente = httpx.Client(base_url=API_URL, timeout=API_TIMEOUT)
+    return _cliente
+
+def _cabeceras(nombre_coleccion: str) -> dict:
+    return {"X-Espacio": espacio_coleccion(nombre_coleccion)}
+
+def _resultado(ruta: str, nombre_coleccion: str, **cuerpo) -> str:
+    try:
+        respuesta = _http().post(ruta, json=cuerpo, headers=_cabeceras(nombre_coleccion))
+        respuesta.raise_for_status()
+        return respuesta.json()["resultado"]
+    except httpx.HTTPError as e:
+        logger.error(f"Error llamando a la API ({ruta}): {e}")
+        return f"❌ Error de conexión con la API: {e}"
+
+def procesar_pdfs(rutas: List[str], directorio_persistencia: Optional[str] = None,
+                  nombre_coleccion: str = COLECCION_PREDETERMINADA, progreso=None):
+    """Sube los PDFs a la API; retorna objetos con los campos de MetadatosDocumento."""
+    archivos = [("archivos", (os.path.basename(r), open(r, "rb"), "application/pdf")) for r in rutas]
+    try:
+        respuesta = _http().post("/documentos", files=archivos, headers=_cabeceras(nombre_coleccion))
+    finally:
+        for _, (_, f, _) in archivos:
+            f.close()
+    respuesta.raise_for_status()
+    return [SimpleNamespace(**d) for d in respuesta.json()]
+
+def encolar_trabajo(rutas: List[str], directorio_persistencia: Optional[str] = None,
+                    nombre_coleccion: str = COLECCION_PREDETERMINADA) -> str:
+    """Sube los PDFs como trabajo de ingesta en segundo plano; retorna su id."""
+    archivos = [("archivos", (os.path.basename(r), open(r, "rb"), "application/pdf")) for r in rutas]
+    try:
+        respuesta = _http().post("/trabajos", files=archivos, headers=_cabeceras(nombre_coleccion))
+    finally:
+        for _, (_, f, _) in archivos:
+            f.close()
+    respuesta.raise_for_status()
+    return respuesta.json()["id"]
+
+def obtener_trabajo(id_trabajo: str, nombre_coleccion: str = COLECCION_PREDETERMINADA):
+    """Retorna un objeto con los campos de Trabajo, o None si no existe (o es de otro espacio)."""
+    respuesta = _http().get(f"/trabajos/{id_trabajo}", headers=_cabeceras(nombre_coleccion))
+    if respuesta.status_code == 404:
+        return None
+    respuesta.raise_for_status()
+    return SimpleNamespace(**respuesta.json())
+
+def listar_trabajos(activos: bool = False, limite: int = 20, nombre_coleccion: str = COLECCION_PREDETERMINADA):
+    respuesta = _http().get("/trabajos", params={"activos": activos}, headers=_cabeceras(nombre_coleccion))
+    respuesta.raise_for_status()
+    return [SimpleNamespace(**t) for t in respuesta.json()[:limite]]
+
+def cancelar_trabajo(id_trabajo: str, nombre_coleccion: str = COLECCION_PREDETERMINADA) -> bool:
+    return _http().delete(f"/trabajos/{id_trabajo}", headers=_cabeceras(nombre_coleccion)).status_code == 200
+
+def limpiar_almacen_vectores(directorio_persistencia: Optional[str] = None,
+                             nombre_coleccion: str = COLECCION_PREDETERMINADA):
+    _http().delete("/documentos", headers=_cabeceras(nombre_coleccion)).raise_for_status()
+
+def obtener_estadisticas_documentos(directorio_persistencia: Optional[str] = None,
+                                    nombre_coleccion: str = COLECCION_PREDETERMINADA):
+    try:
+        respuesta = _http().get("/documentos", headers=_cabeceras(nombre_coleccion))
+        respuesta.raise_for_status()
+        return respuesta.json()
+    except httpx.HTTPError as e:
+        logger.error(f"Error obteniendo estadísticas de la API: {e}")
+        return {"total_chunks": 0, "documents": [], "error": str(e)}
+
+def obtener_vista_general_documentos(directorio_persistencia: Optional[str] = None,
+                                     nombre_coleccion: str = COLECCION_PREDETERMINADA):
+    try:
+        respuesta = _http().get("/documentos/vista-general", headers=_cabeceras(nombre_coleccion))
+        respuesta.raise_for_status()
+        return respuesta.json()["resultado"]
+    except httpx.HTTPError as e:
+        return f"❌ Error de conexión con la API: {e}"
+
+def resumir_documento(nombre_documento: str, directorio_persistencia: Optional[str] = None,
+                      nombre_coleccion: str = COLECCION_PREDETERMINADA):
+    return _resultado("/resumen", nombre_coleccion, documento=nombre_documento)
+
+def comparar_documentos(documento_a: str, documento_b: str, directorio_persistencia: Optional[str] = None,
+                        condensar: Optional[bool] = None, nombre_coleccion: str = COLECCION_PREDETERMINADA):
+    return _resultado("/comparacion", nombre_coleccion, documento_a=documento_a, documento_b=documento_b,
+                      condensar=condensar)
+
+def clasificar_topicos(consulta: str, directorio_persistencia: Optional[str] = None,
+                       nombre_coleccion: str = COLECCION_PREDETERMINADA):
+    return _resultado("/clasificacion", nombre_coleccion, consulta=consulta)
+
+def responder_pregunta_stream(pregunta: str, directorio_persistencia: Optional[str] = None,
+                              nombre_coleccion: str = COLECCION_PREDETERMINADA) -> Iterator[str]:
+    return _stream({"pregunta": pregunta}, nombre_coleccion)
+
+def responder_en_conversacion_stream(pregunta: str, directorio_persistencia: Optional[str], id_conversacion: str,
+                                     historial=(), nombre_coleccion: str = COLECCION_PREDETERMINADA) -> Iterator[str]:
+    return _stream({"pregunta": pregunta, "conversacion": id_conversacion,
+                    "historial": [list(turno) for turno in historial]}, nombre_coleccion)
+
+def _stream(cuerpo: dict, nombre_coleccion: str) -> Iterator[str]:
+    try:
+        with _http().stream("POST", "/preguntas/stream", json=cuerpo,
+                            headers=_cabeceras(nombre_coleccion)) as respuesta:
+            respuesta.raise_for_status()
+            for texto in respuesta.iter_text():
+                if texto:
+                    yield texto
+    except httpx.HTTPError as e:
+        logger.error(f"Error llamando a la API: {e}")
+        yield f"❌ Error de conexión con la API: {e}"
+
+def obtener_estado() -> dict:
+    """Estado del servidor: calentamiento, caché de respuestas y métricas."""
+    try:
+        respuesta = _http().get("/estado")
+        respuesta.raise_for_status()
+        return respuesta.json()
+    except httpx.HTTPError as e:
+        logger.warning(f"No se pudo obtener el estado de la API: {e}")
+        return {}
@@ -26,10 +26,19 @@ def encabezado():
         modelo = os.getenv("LLM_MODEL", "gemini-2.0-flash-001")
         st.metric("🤖 Modelo", modelo.split("-")[0].title())
 
-def mostrar_estado():
+def mostrar_estado(estadisticas_cache=None, estado_calentamiento=None, metricas=None):
     """Muestra el estado del sistema."""
     st.markdown("---")
     
+    # Indicador de disponibilidad (calentamiento de modelos en segundo plano)
+    if estado_calentamiento:
+        if estado_calentamiento["listo"]:
+            st.caption(f"🟢 **Modelos listos** · arranque en {estado_calentamiento['arranque_s']:.1f}s")
+        elif estado_calentamiento["error"]:
+            st.caption(f"🔴 **Error al cargar modelos:** {estado_calentamiento['error']}")
+        else:
+            st.caption(f"🟡 **Cargando modelos** ({estado_calentamiento['etapa']})...")
+    
     # Información del sistema
     with st.expander("ℹ️ Información del Sistema", expanded=False):
         col1, col2 = st.columns(2)
@@ -47,6 +56,32 @@ def mostrar_estado():
             st.caption(f"**Directorio:** {os.getenv('CHROMA_DIR', '/app/data/chroma')}")
             st.caption(f"**Streamlit:** v{st.__version__}")
         
+        # Caché semántica de respuestas
+        if estadisticas_cache:
+            st.markdown("**⚡ Caché de Respuestas**")
+            st.caption(f"**Entradas:** {estadisticas_cache['entradas']} · "
+                       f"**Aciertos:** {estadisticas_cache['aciertos']} · "
+                       f"**Fallos:** {estadisticas_cache['fallos']} · "
+                       f"**Tasa de aciertos:** {estadisticas_cache['tasa_aciertos']:.0%}")
+        
+        # Tiempos de arranque
+        if estado_calentamiento and estado_calentamiento["etapas"]:
+            st.markdown("**🚀 Arranque**")
+            etapas = " · ".join(f"**{etapa}:** {segundos:.2f}s" for etapa, segundos in estado_calentamiento["etapas"].items())
+            st.caption(etapas)
+            if estado_calentamiento["primera_respuesta_s"] is not None:
+                st.caption(f"**Hasta la primera respuesta:** {estado_calentamiento['primera_respuesta_s']:.1f}s")
+        
+        # Desglose de latencia por etapa (ventana reciente del proceso)
+        if metricas and metricas["etapas"]:
+            st.markdown("**⏱️ Latencia por Etapa**")
+            for etapa in metricas["etapas"]:
+                st.caption(f"**{etapa['etapa']}:** p50 {etapa['p50_ms']:.0f}ms · "
+                           f"p95 {etapa['p95_ms']:.0f}ms · n={etapa['n']}")
+            if metricas["tokens_prompt"] or metricas["tokens_respuesta"]:
+                st.caption(f"**Tokens LLM:** {metricas['tokens_prompt']} de prompt · "
+                           f"{metricas['tokens_respuesta']} de respuesta")
+        
         # Verificar variables de entorno
         st.markdown("**🔑 Variables de Entorno**")
         variables_entorno = {
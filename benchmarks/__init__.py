@@ -0,0 +1,15 @@
+"""Benchmarks reproducibles y offline de CatchAI.
+
+Los scripts agregan `app/` al path para importar `logic.*` igual que
+`streamlit run app/main.py`. La suite completa se ejecuta con:
+
+    python -m benchmarks.suite --salida resultados.json
+"""
+import os
+import sys
+
+DIRECTORIO_APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+def agregar_app_al_path():
+    if DIRECTORIO_APP not in sys.path:
+        sys.path.insert(0, DIRECTORIO_APP)
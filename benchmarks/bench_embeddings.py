@@ -0,0 +1,108 @@
+"""Benchmark de backends de embeddings: torch vs. onnx vs. onnx-int8.
+
+Uso:
+    python benchmarks/bench_embeddings.py [--pdfs ruta/a/pdfs] [--backends torch,onnx,onnx-int8]
+
+Para cada backend reporta el tiempo de carga, fragmentos/s al vectorizar el
+corpus por lotes, la latencia de una consulta (p50/p95) y la similitud coseno
+con los vectores de PyTorch. Sin --pdfs usa un corpus sintético. La caché de
+embeddings no interviene: se usan los modelos base directamente.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+import numpy as np
+from logic.embeddings import _crear_modelo_torch
+from logic.embeddings_onnx import cargar_embeddings_onnx
+
+PALABRAS = ("contrato cláusula artículo informe resultados objetivo proyecto análisis riesgo plazo pago "
+            "proveedor servicio anexo garantía auditoría ingresos costos período estrategia cliente").split()
+
+def corpus_sintetico(n: int, semilla: int = 7):
+    rnd = random.Random(semilla)
+    return [" ".join(rnd.choice(PALABRAS) for _ in range(rnd.randint(60, 160))) for _ in range(n)]
+
+def corpus_pdfs(directorio: str, maximo: int):
+    from logic.extraccion import extraer_textos_pdfs
+    from logic.ingest import fragmentar_documentos
+    rutas = sorted(glob.glob(os.path.join(directorio, "*.pdf")))
+    fragmentos = []
+    for paginas in extraer_textos_pdfs(rutas).values():
+        fragmentos.extend(texto for texto, _ in fragmentar_documentos(paginas))
+    return fragmentos[:maximo]
+
+def cargar(backend: str, modelo: str):
+    if backend == "torch":
+        return _crear_modelo_torch(modelo)
+    return cargar_embeddings_onnx(modelo, backend)
+
+def medir(backend, modelo, textos, consultas, lote, repeticiones):
+    inicio = time.perf_counter()
+    embeddings = cargar(backend, modelo)
+    carga = time.perf_counter() - inicio
+    embeddings.embed_query("calentamiento")
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        vectores = []
+        for i in range(0, len(textos), lote):
+            vectores.extend(embeddings.embed_documents(textos[i:i + lote]))
+        tiempos.append(time.perf_counter() - inicio)
+
+    latencias = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        embeddings.embed_query(consulta)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "carga_s": round(carga, 3),
+        "fragmentos_por_s": round(len(textos) / min(tiempos), 1),
+        "consulta_p50_ms": round(float(np.percentile(latencias, 50)), 2),
+        "consulta_p95_ms": round(float(np.percentile(latencias, 95)), 2),
+    }, np.asarray(vectores, dtype=np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdfs", help="Directorio con PDFs para el corpus (por defecto, sintético)")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--modelo", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--fragmentos", type=int, default=1000)
+    parser.add_argument("--consultas", type=int, default=100)
+    parser.add_argument("--lote", type=int, default=64)
+    parser.add_argument("--repeticiones", type=int, default=2)
+    args = parser.parse_args()
+
+    textos = corpus_pdfs(args.pdfs, args.fragmentos) if args.pdfs else corpus_sintetico(args.fragmentos)
+    if not textos:
+        sys.exit("Corpus vacío")
+    consultas = [" ".join(t.split()[:12]) for t in textos[:args.consultas]]
+
+    resultados = {"modelo": args.modelo, "fragmentos": len(textos), "backends": {}}
+    referencia = None
+    for backend in args.backends.split(","):
+        try:
+            metricas, vectores = medir(backend, args.modelo, textos, consultas, args.lote, args.repeticiones)
+        except Exception as e:
+            resultados["backends"][backend] = {"error": str(e)}
+            continue
+        if backend == "torch":
+            referencia = vectores
+        elif referencia is not None:
+            a = referencia / np.linalg.norm(referencia, axis=1, keepdims=True)
+            b = vectores / np.linalg.norm(vectores, axis=1, keepdims=True)
+            similitudes = np.sum(a * b, axis=1)
+            metricas["similitud_min"] = round(float(similitudes.min()), 4)
+            metricas["similitud_media"] = round(float(similitudes.mean()), 4)
+        resultados["backends"][backend] = metricas
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark de ingesta: pipeline por lotes vs. procesamiento archivo por archivo.
+
+Uso:
+    python benchmarks/bench_ingesta.py --pdfs ruta/a/pdfs [--repeticiones 3]
+
+Ambos modos corren con la caché de embeddings desactivada y sobre un
+directorio de Chroma temporal y vacío, para que midan el costo completo.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import shutil
+import time
+
+# La caché persistente falsearía la comparación: se desactiva antes de importar
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+from logic.embeddings import obtener_embeddings
+from logic.extraccion import extraer_textos_pdfs
+from logic.ingest import (construir_almacen_vectores, fragmentar_documentos,
+                          generar_ids_fragmentos, procesar_pdfs)
+
+def ingesta_secuencial(rutas, directorio):
+    """Reproduce el flujo anterior: extraer -> fragmentar -> add_texts -> persist por archivo."""
+    av = construir_almacen_vectores(directorio)
+    for ruta in rutas:
+        paginas = extraer_textos_pdfs([ruta], max_procesos=1)[ruta]
+        fragmentos = fragmentar_documentos(paginas)
+        if not fragmentos:
+            continue
+        nombre = os.path.basename(ruta)
+        av.add_texts(texts=[f[0] for f in fragmentos],
+                     metadatas=[{"nombre_documento": nombre, "pagina": f[1]} for f in fragmentos],
+                     ids=generar_ids_fragmentos(nombre, fragmentos))
+        av.persist()
+
+def ingesta_pipeline(rutas, directorio):
+    procesar_pdfs(rutas, directorio_persistencia=directorio)
+
+def medir(funcion, rutas, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        directorio = tempfile.mkdtemp(prefix="bench_chroma_")
+        try:
+            inicio = time.perf_counter()
+            funcion(rutas, directorio)
+            tiempos.append(time.perf_counter() - inicio)
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+    return {"min_s": round(min(tiempos), 3), "media_s": round(sum(tiempos) / len(tiempos), 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdfs", required=True, help="Directorio con los PDFs de prueba")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    rutas = sorted(glob.glob(os.path.join(args.pdfs, "*.pdf")))
+    if not rutas:
+        sys.exit(f"No hay PDFs en {args.pdfs}")
+
+    # Cargar el modelo fuera de la medición
+    obtener_embeddings().embed_query("calentamiento")
+
+    resultados = {
+        "archivos": len(rutas),
+        "mb": round(sum(os.path.getsize(r) for r in rutas) / (1024 * 1024), 2),
+        "secuencial": medir(ingesta_secuencial, rutas, args.repeticiones),
+        "pipeline": medir(ingesta_pipeline, rutas, args.repeticiones),
+    }
+    resultados["aceleracion"] = round(resultados["secuencial"]["media_s"] / resultados["pipeline"]["media_s"], 2)
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
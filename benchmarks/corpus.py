@@ -0,0 +1,103 @@
+"""Corpus sintético de PDFs para benchmarks, generado sin dependencias externas.
+
+Uso:
+    python -m benchmarks.corpus --destino ruta --documentos 5 --paginas 20
+
+Cada página tiene texto en español con identificadores únicos (números de
+contrato, artículos) para que la búsqueda léxica tenga algo que encontrar.
+El contenido depende solo de la semilla, así que dos corridas generan los
+mismos archivos.
+"""
+import argparse
+import os
+import random
+from typing import List
+
+PALABRAS = ("el contrato establece que las partes acuerdan un plazo de entrega para los servicios de "
+            "auditoría y consultoría con pagos mensuales sujetos a la aprobación del informe técnico "
+            "el proveedor garantiza la confidencialidad de la información y el cumplimiento de la normativa "
+            "vigente los resultados del análisis muestran un aumento de los ingresos y una reducción de los "
+            "costos operativos durante el período evaluado según los indicadores del proyecto").split()
+
+LINEAS_POR_PAGINA = 45
+CARACTERES_POR_LINEA = 95
+
+def _escapar(texto: str) -> bytes:
+    texto = texto.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return texto.encode("cp1252", errors="replace")
+
+def _parrafo(rnd: random.Random, documento: int, pagina: int, n: int) -> str:
+    oraciones = []
+    for i in range(n):
+        palabras = [rnd.choice(PALABRAS) for _ in range(rnd.randint(12, 24))]
+        if i == 0:
+            palabras = [f"Artículo {pagina}.{documento}:"] + palabras
+        if rnd.random() < 0.3:
+            palabras.append(f"según el contrato N° {2000 + documento}-{pagina:03d}{i}")
+        oraciones.append(" ".join(palabras).capitalize() + ".")
+    return " ".join(oraciones)
+
+def _lineas_pagina(rnd: random.Random, documento: int, pagina: int) -> List[str]:
+    lineas, texto = [f"Documento {documento} - Página {pagina}", ""], ""
+    while len(lineas) < LINEAS_POR_PAGINA:
+        if not texto:
+            texto = _parrafo(rnd, documento, pagina, rnd.randint(3, 6))
+        corte = texto.rfind(" ", 0, CARACTERES_POR_LINEA) if len(texto) > CARACTERES_POR_LINEA else len(texto)
+        corte = corte if corte > 0 else CARACTERES_POR_LINEA
+        lineas.append(texto[:corte])
+        texto = texto[corte:].lstrip()
+        if not texto:
+            lineas.append("")
+    return lineas
+
+def escribir_pdf(ruta: str, paginas: List[List[str]]):
+    """PDF 1.4 mínimo: una fuente Helvetica (WinAnsi) y un stream de texto por página."""
+    objetos = {1: b"<< /Type /Catalog /Pages 2 0 R >>",
+               3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"}
+    hijos = []
+    for i, lineas in enumerate(paginas):
+        numero_pagina, numero_contenido = 4 + 2 * i, 5 + 2 * i
+        contenido = b"BT /F1 10 Tf 12 TL 50 800 Td " + b" ".join(b"(" + _escapar(l) + b") '" for l in lineas) + b" ET"
+        objetos[numero_contenido] = b"<< /Length %d >>\nstream\n" % len(contenido) + contenido + b"\nendstream"
+        objetos[numero_pagina] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                                  b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % numero_contenido)
+        hijos.append(b"%d 0 R" % numero_pagina)
+    objetos[2] = b"<< /Type /Pages /Kids [" + b" ".join(hijos) + b"] /Count %d >>" % len(paginas)
+
+    salida = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    desplazamientos = {}
+    for numero in sorted(objetos):
+        desplazamientos[numero] = len(salida)
+        salida += b"%d 0 obj\n" % numero + objetos[numero] + b"\nendobj\n"
+    inicio_xref = len(salida)
+    total = max(objetos) + 1
+    salida += b"xref\n0 %d\n0000000000 65535 f \n" % total
+    for numero in range(1, total):
+        salida += b"%010d 00000 n \n" % desplazamientos[numero]
+    salida += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (total, inicio_xref)
+    with open(ruta, "wb") as f:
+        f.write(salida)
+
+def generar_corpus(destino: str, documentos: int = 5, paginas: int = 20, semilla: int = 42) -> List[str]:
+    """Genera `documentos` PDFs de `paginas` páginas en `destino`; retorna las rutas."""
+    os.makedirs(destino, exist_ok=True)
+    rnd = random.Random(semilla)
+    rutas = []
+    for d in range(1, documentos + 1):
+        ruta = os.path.join(destino, f"documento_{d:03d}.pdf")
+        escribir_pdf(ruta, [_lineas_pagina(rnd, d, p) for p in range(1, paginas + 1)])
+        rutas.append(ruta)
+    return rutas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--destino", required=True)
+    parser.add_argument("--documentos", type=int, default=5)
+    parser.add_argument("--paginas", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+    for ruta in generar_corpus(args.destino, args.documentos, args.paginas, args.semilla):
+        print(ruta)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Servidor local que imita la API REST de Gemini para benchmarks offline.
+
+Uso:
+    python -m benchmarks.stub_gemini --puerto 8765 --latencia-ms 300
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GOOGLE_API_KEY=stub streamlit run app/main.py
+
+Responde `generateContent` y `streamGenerateContent` (SSE) con un texto
+determinista; la latencia hasta el primer token y entre fragmentos es
+configurable para que los tiempos medidos sean estables entre corridas.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+_RUTA = re.compile(r"/models/([^/:]+):(generateContent|streamGenerateContent)")
+
+TEXTO_RESPUESTA = ("Según los documentos, el contrato establece un plazo de entrega y pagos mensuales "
+                   "sujetos a la aprobación del informe técnico. El proveedor garantiza la confidencialidad "
+                   "de la información y el cumplimiento de la normativa vigente. ")
+
+class ConfiguracionStub:
+    def __init__(self, latencia_ms: float = 300, ms_por_fragmento: float = 20, fragmentos: int = 8,
+                 palabras: int = 120):
+        self.latencia_ms = latencia_ms
+        self.ms_por_fragmento = ms_por_fragmento
+        self.fragmentos = fragmentos
+        self.palabras = palabras
+        self.solicitudes = 0
+        self.tokens_prompt = 0
+        self._lock = threading.Lock()
+
+    def texto(self) -> str:
+        palabras = (TEXTO_RESPUESTA.split() * (self.palabras // 20 + 1))[:self.palabras]
+        return " ".join(palabras)
+
+def _respuesta(texto: str, tokens_prompt: int, final: bool = True) -> dict:
+    cuerpo = {"candidates": [{"content": {"parts": [{"text": texto}], "role": "model"}, "index": 0}],
+              "usageMetadata": {"promptTokenCount": tokens_prompt,
+                                "candidatesTokenCount": len(texto.split()),
+                                "totalTokenCount": tokens_prompt + len(texto.split())}}
+    if final:
+        cuerpo["candidates"][0]["finishReason"] = "STOP"
+    return cuerpo
+
+class _Manejador(BaseHTTPRequestHandler):
+    configuracion: ConfiguracionStub = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato, *args):
+        pass
+
+    def do_POST(self):
+        coincidencia = _RUTA.search(self.path)
+        longitud = int(self.headers.get("Content-Length") or 0)
+        solicitud = json.loads(self.rfile.read(longitud) or b"{}")
+        if not coincidencia:
+            self._json(404, {"error": {"code": 404, "message": f"Ruta no soportada: {self.path}", "status": "NOT_FOUND"}})
+            return
+        prompt = " ".join(p.get("text", "") for c in solicitud.get("contents", []) for p in c.get("parts", []))
+        # Aproximación de tokens del prompt, útil para comparar tamaños de contexto entre corridas
+        tokens_prompt = max(1, len(prompt) // 4)
+        configuracion = self.configuracion
+        with configuracion._lock:
+            configuracion.solicitudes += 1
+            configuracion.tokens_prompt += tokens_prompt
+
+        time.sleep(configuracion.latencia_ms / 1000)
+        texto = configuracion.texto()
+        if coincidencia.group(2) == "generateContent":
+            self._json(200, _respuesta(texto, tokens_prompt))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        palabras = texto.split(" ")
+        por_fragmento = max(1, len(palabras) // configuracion.fragmentos)
+        partes = [" ".join(palabras[i:i + por_fragmento]) + " " for i in range(0, len(palabras), por_fragmento)]
+        for i, parte in enumerate(partes):
+            if i:
+                time.sleep(configuracion.ms_por_fragmento / 1000)
+            evento = f"data: {json.dumps(_respuesta(parte, tokens_prompt, final=i == len(partes) - 1))}\n\n"
+            self._fragmento(evento.encode("utf-8"))
+        self._fragmento(b"")
+
+    def _fragmento(self, datos: bytes):
+        self.wfile.write(b"%x\r\n" % len(datos) + datos + b"\r\n")
+        self.wfile.flush()
+
+    def _json(self, codigo: int, cuerpo: dict):
+        datos = json.dumps(cuerpo).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+class ServidorStub:
+    """Servidor stub en un hilo de fondo; `url` sirve como GEMINI_BASE_URL."""
+
+    def __init__(self, configuracion: Optional[ConfiguracionStub] = None, puerto: int = 0):
+        self.configuracion = configuracion or ConfiguracionStub()
+        manejador = type("Manejador", (_Manejador,), {"configuracion": self.configuracion})
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", puerto), manejador)
+        self.servidor.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}"
+        self._hilo = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--latencia-ms", type=float, default=300)
+    parser.add_argument("--ms-por-fragmento", type=float, default=20)
+    parser.add_argument("--palabras", type=int, default=120)
+    args = parser.parse_args()
+    configuracion = ConfiguracionStub(args.latencia_ms, args.ms_por_fragmento, palabras=args.palabras)
+    with ServidorStub(configuracion, args.puerto) as stub:
+        print(f"Stub de Gemini en {stub.url} (Ctrl+C para terminar)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
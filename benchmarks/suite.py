@@ -0,0 +1,225 @@
+"""Suite de benchmarks offline: corpus sintético + stub de Gemini + tiempos por etapa.
+
+Uso:
+    python -m benchmarks.suite --documentos 5 --paginas 20 --salida resultados.json
+    python -m benchmarks.suite --salida despues.json --comparar antes.json
+
+Mide extracción, fragmentación, embeddings, upsert en Chroma, ingesta
+completa, búsqueda de contexto, respuestas (completa y en streaming) y las
+cadenas de resumen, comparación y clasificación. Gemini se reemplaza por un
+servidor local con latencia fija (benchmarks/stub_gemini.py) y las cachés de
+embeddings y respuestas se desactivan, así que cada corrida es reproducible y
+no necesita red ni clave API (salvo para descargar el modelo de embeddings la
+primera vez).
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from . import agregar_app_al_path
+from .corpus import generar_corpus
+from .stub_gemini import ConfiguracionStub, ServidorStub
+
+PREGUNTAS = [
+    "¿Qué establece el contrato sobre el plazo de entrega?",
+    "¿Qué dice el Artículo 3.1?",
+    "¿Qué garantiza el proveedor respecto de la confidencialidad?",
+    "¿Cómo se aprueban los pagos mensuales?",
+    "¿Qué muestran los resultados del análisis sobre los ingresos?",
+]
+
+def estadisticas(tiempos_s: List[float]) -> Dict[str, float]:
+    ms = np.asarray(tiempos_s) * 1000
+    return {"n": len(ms), "min_ms": round(float(ms.min()), 2), "p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p95_ms": round(float(np.percentile(ms, 95)), 2), "media_ms": round(float(ms.mean()), 2)}
+
+def cronometrar(funcion: Callable[[], object], repeticiones: int) -> List[float]:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+def _configurar_entorno(url_stub: str):
+    """Fija el entorno antes de importar la lógica: sin cachés, Gemini apuntando al stub."""
+    os.environ.update({
+        "EMBEDDING_CACHE_PATH": "",
+        "ANSWER_CACHE_PATH": "",
+        "METRICAS_ARRANQUE_PATH": "",
+        "METRICAS_PATH": "",
+        "RESUMENES_EN_INGESTA": "0",
+        "GEMINI_BASE_URL": url_stub,
+        "GOOGLE_API_KEY": "stub",
+        "LLM_RPM": "1000000",
+        "LLM_RAFAGA": "1000",
+    })
+    os.environ.pop("GEMINI_API_KEY", None)
+
+def _commit_actual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except Exception:
+        return ""
+
+def ejecutar(args) -> dict:
+    base = tempfile.mkdtemp(prefix="bench_catchai_")
+    configuracion_stub = ConfiguracionStub(latencia_ms=args.latencia_ms, ms_por_fragmento=args.ms_por_fragmento)
+    try:
+        with ServidorStub(configuracion_stub) as stub:
+            _configurar_entorno(stub.url)
+            agregar_app_al_path()
+            from logic.embeddings import obtener_embeddings
+            from logic.extraccion import extraer_texto_pdf, extraer_textos_pdfs
+            from logic.ingest import fragmentar_documentos, generar_ids_fragmentos, procesar_pdfs
+            from logic.almacen import obtener_almacen
+            from logic.retriever import (buscar_contexto, cargar_almacen_vectores, responder_pregunta,
+                                         responder_pregunta_stream)
+            from logic.chains import resumir_documento, comparar_documentos, clasificar_topicos
+            from logic.metricas import resumen_metricas
+
+            rutas = generar_corpus(os.path.join(base, "pdfs"), args.documentos, args.paginas, args.semilla)
+            resultados = {
+                "meta": {
+                    "commit": _commit_actual(),
+                    "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "python": platform.python_version(),
+                    "plataforma": platform.platform(),
+                    "cpus": os.cpu_count(),
+                    "entorno": {k: os.getenv(k, "") for k in (
+                        "EMBEDDING_MODEL", "EMBEDDING_BACKEND", "BUSQUEDA_HIBRIDA", "RERANK",
+                        "FRAGMENTOS_CONTEXTO", "CONTEXTO_MAX_TOKENS", "INGEST_WORKERS", "LOTE_EMBEDDING")},
+                },
+                "corpus": {"documentos": args.documentos, "paginas": args.paginas, "semilla": args.semilla,
+                           "mb": round(sum(os.path.getsize(r) for r in rutas) / (1024 * 1024), 3)},
+                "stub": {"latencia_ms": args.latencia_ms, "ms_por_fragmento": args.ms_por_fragmento},
+                "etapas": {},
+            }
+            etapas = resultados["etapas"]
+            r = args.repeticiones
+
+            # Extracción y fragmentación
+            etapas["extraer_texto_pdf"] = estadisticas(cronometrar(lambda: [extraer_texto_pdf(p) for p in rutas], r))
+            etapas["extraer_textos_pdfs_paralelo"] = estadisticas(cronometrar(lambda: extraer_textos_pdfs(rutas), r))
+            paginas = extraer_textos_pdfs(rutas)
+            etapas["fragmentar_documentos"] = estadisticas(
+                cronometrar(lambda: [fragmentar_documentos(paginas[p]) for p in rutas], r))
+            fragmentos = {p: fragmentar_documentos(paginas[p]) for p in rutas}
+            textos = [t for p in rutas for t, _ in fragmentos[p]]
+            resultados["corpus"]["fragmentos"] = len(textos)
+
+            # Embeddings (modelo cargado fuera de la medición)
+            embeddings = obtener_embeddings()
+            embeddings.embed_query("calentamiento")
+            tiempos = cronometrar(lambda: embeddings.embed_documents(textos), r)
+            etapas["embeddings"] = {**estadisticas(tiempos), "fragmentos_por_s": round(len(textos) / min(tiempos), 1)}
+            etapas["embedding_consulta"] = estadisticas(
+                cronometrar(lambda: [embeddings.embed_query(p) for p in PREGUNTAS], r))
+
+            # Upsert en Chroma con vectores ya calculados
+            vectores = embeddings.embed_documents(textos)
+            ids = [i for p in rutas for i in generar_ids_fragmentos(os.path.basename(p), fragmentos[p])]
+            metadatos = [{"nombre_documento": os.path.basename(p), "pagina": pagina}
+                         for p in rutas for _, pagina in fragmentos[p]]
+
+            def _upsert(n=[0]):
+                n[0] += 1
+                coleccion = obtener_almacen(os.path.join(base, f"upsert_{n[0]}"))._collection
+                for i in range(0, len(ids), 1000):
+                    coleccion.upsert(ids=ids[i:i + 1000], embeddings=vectores[i:i + 1000],
+                                     documents=textos[i:i + 1000], metadatas=metadatos[i:i + 1000])
+            etapas["chroma_upsert"] = estadisticas(cronometrar(_upsert, r))
+
+            # Ingesta completa sobre directorios nuevos; el último queda para las consultas
+            directorios = [os.path.join(base, f"chroma_{i}") for i in range(r)]
+            iterador = iter(directorios)
+            etapas["procesar_pdfs"] = estadisticas(
+                cronometrar(lambda: procesar_pdfs(rutas, directorio_persistencia=next(iterador)), r))
+            directorio = directorios[-1]
+            etapas["procesar_pdfs_sin_cambios"] = estadisticas(
+                cronometrar(lambda: procesar_pdfs(rutas, directorio_persistencia=directorio), r))
+
+            # Recuperación y respuestas contra el stub
+            av = cargar_almacen_vectores(directorio)
+            buscar_contexto(av, "calentamiento")
+            etapas["buscar_contexto"] = estadisticas(
+                [t for p in PREGUNTAS for t in cronometrar(lambda: buscar_contexto(av, p), r)])
+            solicitudes_antes, tokens_antes = configuracion_stub.solicitudes, configuracion_stub.tokens_prompt
+            etapas["responder_pregunta"] = estadisticas(
+                [t for p in PREGUNTAS for t in cronometrar(lambda: responder_pregunta(p, directorio), r)])
+            llamadas = configuracion_stub.solicitudes - solicitudes_antes
+            resultados["stub"]["tokens_prompt_por_pregunta"] = round(
+                (configuracion_stub.tokens_prompt - tokens_antes) / max(llamadas, 1), 1)
+
+            primer_token = []
+            def _stream(pregunta):
+                inicio = time.perf_counter()
+                for i, _ in enumerate(responder_pregunta_stream(pregunta, directorio)):
+                    if i == 0:
+                        primer_token.append(time.perf_counter() - inicio)
+            etapas["responder_pregunta_stream"] = estadisticas(
+                [t for p in PREGUNTAS for t in cronometrar(lambda: _stream(p), r)])
+            etapas["responder_pregunta_stream_primer_token"] = estadisticas(primer_token)
+
+            nombres = [os.path.basename(p) for p in rutas]
+            etapas["resumir_documento"] = estadisticas(cronometrar(lambda: resumir_documento(nombres[0], directorio), r))
+            if len(nombres) > 1:
+                etapas["comparar_documentos"] = estadisticas(
+                    cronometrar(lambda: comparar_documentos(nombres[0], nombres[1], directorio), r))
+            etapas["clasificar_topicos"] = estadisticas(
+                cronometrar(lambda: clasificar_topicos("obligaciones del proveedor", directorio), r))
+            resultados["stub"]["solicitudes"] = configuracion_stub.solicitudes
+            # Desglose interno de todas las llamadas anteriores, por etapa instrumentada
+            resultados["instrumentacion"] = resumen_metricas()
+            return resultados
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+def comparar(anterior: dict, actual: dict) -> str:
+    """Tabla de p50 por etapa: anterior, actual y cambio relativo."""
+    lineas = [f"{'etapa':42} {'antes p50':>12} {'ahora p50':>12} {'cambio':>9}"]
+    for etapa, datos in actual["etapas"].items():
+        previo = anterior.get("etapas", {}).get(etapa)
+        if not previo:
+            lineas.append(f"{etapa:42} {'-':>12} {datos['p50_ms']:>10.1f}ms {'nuevo':>9}")
+            continue
+        cambio = (datos["p50_ms"] - previo["p50_ms"]) / previo["p50_ms"] * 100 if previo["p50_ms"] else 0.0
+        lineas.append(f"{etapa:42} {previo['p50_ms']:>10.1f}ms {datos['p50_ms']:>10.1f}ms {cambio:>+8.1f}%")
+    return "\n".join(lineas)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documentos", type=int, default=5)
+    parser.add_argument("--paginas", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--latencia-ms", type=float, default=300, help="Latencia del stub hasta el primer token")
+    parser.add_argument("--ms-por-fragmento", type=float, default=20, help="Pausa del stub entre fragmentos")
+    parser.add_argument("--salida", help="Archivo JSON de resultados (por defecto, stdout)")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args()
+
+    resultados = ejecutar(args)
+    texto = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+        print(f"Resultados guardados en {args.salida}")
+    else:
+        print(texto)
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            print(comparar(json.load(f), resultados))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from logic import bm25
+from logic.bm25 import IndiceLexico, fusion_rrf, tokenizar
+from logic.esquema import CAMPO_DOCUMENTO, CAMPO_PAGINA
+
+def _md(documento, pagina=1):
+    return {CAMPO_DOCUMENTO: documento, CAMPO_PAGINA: pagina}
+
+def test_tokenizar_quita_tildes_y_palabras_vacias():
+    assert tokenizar("La Cláusula de RESCISIÓN") == ["clausula", "rescision"]
+
+def test_tokenizar_conserva_codigos_y_sus_partes():
+    tokens = tokenizar("Contrato 2023-045, artículo 5.1")
+    assert "2023-045" in tokens and "2023" in tokens and "045" in tokens
+    assert "5.1" in tokens and "5" in tokens
+
+def test_fusion_rrf_premia_lo_que_aparece_en_ambas_listas():
+    assert fusion_rrf([["a", "b"], ["c", "b"]])[0] == "b"
+    assert set(fusion_rrf([["a", "b", "c"], ["c", "b", "d"]])[2:]) == {"a", "d"}
+    assert fusion_rrf([["x"], []]) == ["x"]
+
+def test_segmento_csr():
+    indice = IndiceLexico("/no/usado")
+    indice.agregar(["f1", "f2"], ["perro gato perro", "gato raton"], [_md("a.pdf"), _md("b.pdf")])
+    indice._cerrar_pendientes()
+    s = indice.segmentos[0]
+    assert list(s.terminos) == sorted(s.terminos)
+    assert len(s.inicio) == len(s.terminos) + 1 and s.inicio[-1] == len(s.fragmentos)
+    gato = s.postings("gato")
+    assert list(s.fragmentos[gato]) == [0, 1]
+    perro = s.postings("perro")
+    assert list(s.fragmentos[perro]) == [0] and list(s.frecuencias[perro]) == [2]
+    assert s.postings("ausente") is None
+    assert list(s.longitudes) == [3, 2]
+
+def test_buscar_ordena_por_bm25_y_filtra():
+    indice = IndiceLexico("/no/usado")
+    indice.agregar(["f1", "f2", "f3"],
+                   ["contrato 2023-045 firmado", "otro contrato", "nada relevante"],
+                   [_md("a.pdf", 1), _md("b.pdf", 2), _md("c.pdf", 3)])
+    indice._cerrar_pendientes()
+    assert [i for i, _ in indice.buscar("contrato 2023-045")] == ["f1", "f2"]
+    assert [i for i, _ in indice.buscar("contrato", documentos=["b.pdf"])] == ["f2"]
+    assert [i for i, _ in indice.buscar("contrato", paginas=[1])] == ["f1"]
+    assert indice.buscar("inexistente") == []
+
+def test_guardar_cargar_eliminar_y_compactar(tmp_path, monkeypatch):
+    indice = IndiceLexico(str(tmp_path), "catchai_docs")
+    indice.agregar(["f1", "f2", "f4", "f5"], ["alfa beta", "beta gama", "eta", "teta"],
+                   [_md("a.pdf"), _md("b.pdf"), _md("d.pdf"), _md("e.pdf")])
+    indice.guardar()
+    indice.agregar(["f3"], ["gama delta"], [_md("c.pdf")])
+    indice.eliminar(["f1"])
+    indice.guardar()
+
+    cargado = IndiceLexico.cargar(str(tmp_path), "catchai_docs")
+    assert cargado.total == 4 and len(cargado.segmentos) == 2
+    assert [i for i, _ in cargado.buscar("beta")] == ["f2"]
+    assert {i for i, _ in cargado.buscar("gama")} == {"f2", "f3"}
+
+    # Con demasiados segmentos se compacta en uno solo, sin los eliminados
+    monkeypatch.setattr(bm25, "MAX_SEGMENTOS", 1)
+    cargado.guardar()
+    compactado = IndiceLexico.cargar(str(tmp_path), "catchai_docs")
+    assert len(compactado.segmentos) == 1
+    assert sorted(compactado.segmentos[0].ids) == ["f2", "f3", "f4", "f5"]
+    assert {i for i, _ in compactado.buscar("gama")} == {"f2", "f3"}
+    assert compactado.buscar("alfa") == []
@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from logic import catalogo
+from logic.cache_respuestas import CacheRespuestas, normalizar_pregunta
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheRespuestas(str(tmp_path / "respuestas.sqlite"), umbral=0.95)
+
+def test_normalizar_pregunta():
+    assert normalizar_pregunta("  ¿Cuál es el PLAZO?  ") == "cual es el plazo"
+
+def test_acierto_exacto_y_semantico(cache):
+    cache.guardar("catchai_docs", "v1", "¿Cuál es el plazo?", [1.0, 0.0], "30 días", ["[a.pdf p.1]"])
+    assert cache.buscar("catchai_docs", "v1", "cual es el plazo", [0.0, 1.0]) == ("30 días", ["[a.pdf p.1]"])
+    # Otra redacción con un embedding casi igual
+    assert cache.buscar("catchai_docs", "v1", "plazo del contrato", [0.99, 0.01])[0] == "30 días"
+    assert cache.aciertos == 2 and cache.fallos == 0
+
+def test_fallo_por_similitud_baja(cache):
+    cache.guardar("catchai_docs", "v1", "plazo", [1.0, 0.0], "30 días", [])
+    assert cache.buscar("catchai_docs", "v1", "multa", [0.0, 1.0]) is None
+    assert cache.estadisticas()["fallos"] == 1
+
+def test_otra_version_o_coleccion_no_acierta(cache):
+    cache.guardar("catchai_docs", "v1", "plazo", [1.0, 0.0], "30 días", [])
+    assert cache.buscar("catchai_docs", "v2", "plazo", [1.0, 0.0]) is None
+    assert cache.buscar("catchai_legal", "v1", "plazo", [1.0, 0.0]) is None
+
+def test_renovar_version_del_catalogo_invalida(cache, tmp_path):
+    directorio = str(tmp_path / "chroma")
+    version = catalogo.version_indice(directorio)
+    cache.guardar("catchai_docs", version, "plazo", [1.0, 0.0], "30 días", [])
+    assert cache.buscar("catchai_docs", catalogo.version_indice(directorio), "plazo", [1.0, 0.0])
+    catalogo.renovar_version_indice(directorio)
+    assert cache.buscar("catchai_docs", catalogo.version_indice(directorio), "plazo", [1.0, 0.0]) is None
+
+def test_invalidar_por_coleccion(cache):
+    cache.guardar("catchai_docs", "v1", "plazo", [1.0, 0.0], "30 días", [])
+    cache.guardar("catchai_legal", "v1", "plazo", [1.0, 0.0], "15 días", [])
+    cache.invalidar("catchai_docs")
+    assert cache.buscar("catchai_docs", "v1", "plazo", [1.0, 0.0]) is None
+    assert cache.buscar("catchai_legal", "v1", "plazo", [1.0, 0.0])[0] == "15 días"
+
+def test_limite_de_entradas(tmp_path):
+    cache = CacheRespuestas(str(tmp_path / "respuestas.sqlite"), max_entradas=2)
+    for i in range(3):
+        cache.guardar("catchai_docs", "v1", f"pregunta {i}", [1.0, float(i)], str(i), [])
+    assert cache.estadisticas()["entradas"] == 2
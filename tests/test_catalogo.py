@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+from logic import catalogo
+from logic.catalogo import EntradaCatalogo
+from logic.esquema import CAMPO_DOCUMENTO, CAMPO_HASH, CAMPO_PAGINA, CAMPO_PAGINAS_DOCUMENTO
+
+def _entrada(nombre, ingestado_en=1.0, hash_documento="h"):
+    return EntradaCatalogo(nombre, hash_documento, 2, 5, 0.1, ingestado_en)
+
+def test_registrar_listar_y_obtener(tmp_path):
+    directorio = str(tmp_path)
+    catalogo.registrar_documentos(directorio, "catchai_docs", [_entrada("b.pdf"), _entrada("a.pdf")])
+    catalogo.registrar_documentos(directorio, "catchai_docs", [_entrada("a.pdf", hash_documento="h2")])
+    assert [e.nombre for e in catalogo.listar_documentos(directorio)] == ["a.pdf", "b.pdf"]
+    assert catalogo.obtener_documento(directorio, "catchai_docs", "a.pdf").hash_documento == "h2"
+    assert catalogo.obtener_documento(directorio, "catchai_docs", "c.pdf") is None
+    assert catalogo.listar_documentos(directorio, "catchai_legal") == []
+
+def test_eliminar_documentos_y_resumenes(tmp_path):
+    directorio = str(tmp_path)
+    catalogo.registrar_documentos(directorio, "catchai_docs", [_entrada("a.pdf"), _entrada("b.pdf")])
+    catalogo.guardar_resumen(directorio, "catchai_docs", "a.pdf", "h", "resumen")
+    catalogo.eliminar_documentos(directorio, "catchai_docs", ["a.pdf"])
+    assert [e.nombre for e in catalogo.listar_documentos(directorio)] == ["b.pdf"]
+    assert catalogo.obtener_resumen(directorio, "catchai_docs", "a.pdf", "h") is None
+    catalogo.eliminar_documentos(directorio, "catchai_docs")
+    assert catalogo.listar_documentos(directorio) == []
+
+def test_resumen_versionado_por_hash(tmp_path):
+    directorio = str(tmp_path)
+    catalogo.guardar_resumen(directorio, "catchai_docs", "a.pdf", "h1", "resumen")
+    assert catalogo.obtener_resumen(directorio, "catchai_docs", "a.pdf", "h1") == "resumen"
+    assert catalogo.obtener_resumen(directorio, "catchai_docs", "a.pdf", "h2") is None
+
+def test_version_indice_estable_hasta_renovar(tmp_path):
+    directorio = str(tmp_path)
+    version = catalogo.version_indice(directorio)
+    assert catalogo.version_indice(directorio) == version
+    assert catalogo.version_indice(directorio, "catchai_legal") != version
+    nueva = catalogo.renovar_version_indice(directorio)
+    assert nueva != version and catalogo.version_indice(directorio) == nueva
+
+def test_listar_colecciones_por_ingesta_mas_reciente(tmp_path):
+    directorio = str(tmp_path)
+    catalogo.registrar_documentos(directorio, "catchai_docs", [_entrada("a.pdf", 1.0)])
+    catalogo.registrar_documentos(directorio, "catchai_legal", [_entrada("a.pdf", 3.0)])
+    catalogo.registrar_documentos(directorio, "catchai_rrhh", [_entrada("a.pdf", 2.0)])
+    assert catalogo.listar_colecciones(directorio) == ["catchai_legal", "catchai_rrhh", "catchai_docs"]
+    assert catalogo.listar_colecciones(directorio, 1) == ["catchai_legal"]
+
+def test_reconstruir_catalogo_desde_metadatos(tmp_path):
+    metadatos = [
+        {CAMPO_DOCUMENTO: "a.pdf", CAMPO_HASH: "ha", CAMPO_PAGINA: 1, CAMPO_PAGINAS_DOCUMENTO: 4},
+        {CAMPO_DOCUMENTO: "a.pdf", CAMPO_HASH: "ha", CAMPO_PAGINA: 2, CAMPO_PAGINAS_DOCUMENTO: 4},
+        {CAMPO_DOCUMENTO: "b.pdf", CAMPO_HASH: "hb", CAMPO_PAGINA: 1},
+        {CAMPO_DOCUMENTO: "b.pdf", CAMPO_HASH: "hb", CAMPO_PAGINA: 3},
+        None,
+    ]
+    av = SimpleNamespace(_collection=SimpleNamespace(get=lambda include: {"metadatas": metadatos}))
+    entradas = catalogo.reconstruir_catalogo(str(tmp_path), av)
+    assert [(e.nombre, e.hash_documento, e.paginas, e.fragmentos) for e in entradas] == [
+        ("a.pdf", "ha", 4, 2), ("b.pdf", "hb", 2, 2)]
+    assert [e.nombre for e in catalogo.listar_documentos(str(tmp_path))] == ["a.pdf", "b.pdf"]
@@ -0,0 +1,56 @@
+import pytest
+
+from logic import contexto
+from logic.contexto import agrupar_bloques, empaquetar_contexto, superposicion
+from logic.esquema import CAMPO_DOCUMENTO, CAMPO_PAGINA
+
+@pytest.fixture(autouse=True)
+def tokens_por_caracteres(monkeypatch):
+    # Conteo determinista (~4 caracteres por token) sin descargar el vocabulario de tiktoken
+    monkeypatch.setattr(contexto, "_codificador", False)
+
+def _md(documento="a.pdf", pagina=1):
+    return {CAMPO_DOCUMENTO: documento, CAMPO_PAGINA: pagina}
+
+COMUN = "texto compartido por la superposición del divisor"
+PRIMERO = "Inicio del primer fragmento, " + COMUN
+SEGUNDO = COMUN + ", final del segundo fragmento."
+
+def test_superposicion():
+    assert superposicion(PRIMERO, SEGUNDO) == len(COMUN)
+    assert superposicion(SEGUNDO, PRIMERO) == 0
+    assert superposicion("corto", "corto") == 0
+
+def test_une_fragmentos_superpuestos_sin_repetir_texto():
+    bloques = agrupar_bloques([(SEGUNDO, _md()), (PRIMERO, _md())])
+    assert len(bloques) == 1
+    assert bloques[0].texto == PRIMERO + SEGUNDO[len(COMUN):]
+    assert bloques[0].texto.count(COMUN) == 1
+    assert bloques[0].fragmentos == 2
+
+def test_no_une_paginas_distintas_ni_repite_contenidos():
+    bloques = agrupar_bloques([(PRIMERO, _md(pagina=1)), (SEGUNDO, _md(pagina=2)), (COMUN, _md(pagina=1))])
+    assert [b.pagina for b in bloques] == [1, 2]
+    assert bloques[0].texto == PRIMERO and bloques[0].fragmentos == 2
+
+def test_fragmento_puente_une_dos_bloques():
+    a = "alfa " * 10 + "puente izquierdo del texto"
+    c = "puente derecho del texto" + " omega" * 10
+    b = "puente izquierdo del texto y puente derecho del texto"
+    bloques = agrupar_bloques([(a, _md()), (c, _md()), (b, _md())])
+    assert len(bloques) == 1 and bloques[0].fragmentos == 3
+
+def test_respeta_el_presupuesto_y_omite_lo_que_no_cabe():
+    largo = "x" * 400
+    corto = "y" * 40
+    resultado = empaquetar_contexto([(corto, _md("a.pdf")), (largo, _md("b.pdf")), (corto, _md("c.pdf"))],
+                                    max_tokens=50)
+    assert resultado.tokens <= 50
+    assert resultado.omitidos == 1 and resultado.recortados == 0
+    assert resultado.citas == ["[a.pdf p.1]", "[c.pdf p.1]"]
+    assert resultado.texto.startswith("[a.pdf p.1] " + corto)
+
+def test_recorta_el_primer_bloque_si_excede_el_presupuesto():
+    resultado = empaquetar_contexto([("z" * 1000, _md())], max_tokens=30)
+    assert resultado.recortados == 1 and resultado.tokens <= 30
+    assert resultado.texto.startswith("[a.pdf p.1] z")
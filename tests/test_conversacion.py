@@ -0,0 +1,34 @@
+import pytest
+
+# conversacion importa el retriever, que depende de langchain y chromadb
+pytest.importorskip("langchain_core")
+pytest.importorskip("chromadb")
+
+from logic import contexto
+from logic.conversacion import MARCA_FUENTES, condensar_historial
+from logic.contexto import contar_tokens
+
+@pytest.fixture(autouse=True)
+def tokens_por_caracteres(monkeypatch):
+    monkeypatch.setattr(contexto, "_codificador", False)
+
+def test_historial_vacio():
+    assert condensar_historial([]) == ""
+
+def test_conserva_el_orden_y_quita_las_fuentes():
+    historial = [("¿Plazo?", "30 días." + MARCA_FUENTES + "[a.pdf p.1]"), ("¿Multa?", "10 UF.")]
+    assert condensar_historial(historial, max_tokens=200) == (
+        "Usuario: ¿Plazo?\nAsistente: 30 días.\n\nUsuario: ¿Multa?\nAsistente: 10 UF.")
+
+def test_prioriza_los_turnos_recientes_dentro_del_presupuesto():
+    historial = [(f"pregunta {i}", f"respuesta {i}") for i in range(20)]
+    condensado = condensar_historial(historial, max_tokens=40)
+    assert contar_tokens(condensado) <= 40
+    assert condensado.endswith("Usuario: pregunta 19\nAsistente: respuesta 19")
+    assert "pregunta 0\n" not in condensado
+
+def test_recorta_respuestas_largas_sin_desplazar_turnos_anteriores():
+    historial = [("primera", "corta"), ("segunda", "x" * 4000)]
+    condensado = condensar_historial(historial, max_tokens=300)
+    assert condensado.startswith("Usuario: primera")
+    assert contar_tokens(condensado) <= 300
@@ -0,0 +1,32 @@
+from logic.esquema import (CAMPO_DOCUMENTO, CAMPO_PAGINA, COLECCION_PREDETERMINADA, cita,
+                           coleccion_espacio, construir_filtro, espacio_coleccion, normalizar_espacio)
+
+def test_construir_filtro_sin_condiciones():
+    assert construir_filtro() is None
+    assert construir_filtro(documentos=[], paginas=[]) is None
+
+def test_construir_filtro_una_condicion():
+    assert construir_filtro(documento="a.pdf") == {CAMPO_DOCUMENTO: "a.pdf"}
+    assert construir_filtro(paginas=["3", 4]) == {CAMPO_PAGINA: {"$in": [3, 4]}}
+
+def test_construir_filtro_combina_con_and():
+    assert construir_filtro(documentos=("a.pdf", "b.pdf"), paginas=[1]) == {"$and": [
+        {CAMPO_DOCUMENTO: {"$in": ["a.pdf", "b.pdf"]}},
+        {CAMPO_PAGINA: {"$in": [1]}},
+    ]}
+
+def test_normalizar_espacio():
+    assert normalizar_espacio("  Equipo Legal/2024 ") == "equipo-legal-2024"
+    assert normalizar_espacio(None) == "docs"
+    assert normalizar_espacio("***") == "docs"
+    assert len(normalizar_espacio("a" * 100)) == 48
+
+def test_coleccion_y_espacio_son_inversas():
+    assert coleccion_espacio(None) == COLECCION_PREDETERMINADA == "catchai_docs"
+    assert coleccion_espacio("Legal") == "catchai_legal"
+    assert espacio_coleccion(coleccion_espacio("legal")) == "legal"
+    assert espacio_coleccion("otra") == "otra"
+
+def test_cita():
+    assert cita({CAMPO_DOCUMENTO: "a.pdf", CAMPO_PAGINA: 3}) == "[a.pdf p.3]"
+    assert cita({}) == "[doc p.?]"
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("pypdf")
+pytest.importorskip("pdfplumber")
+
+from pypdf import PdfWriter
+
+from logic import extraccion
+
+@pytest.fixture
+def pdf(tmp_path):
+    ruta = tmp_path / "blanco.pdf"
+    escritor = PdfWriter()
+    for _ in range(5):
+        escritor.add_blank_page(100, 100)
+    escritor.write(str(ruta))
+    return str(ruta)
+
+def test_bloques_en_orden_y_sin_error(pdf):
+    bloques = list(extraccion.iterar_bloques_pdfs([pdf], max_procesos=1, paginas_por_rango=2))
+    assert [(b[2], b[4], b[5]) for b in bloques] == [(2, False, None), (2, False, None), (1, True, None)]
+
+def test_rango_fallido_no_es_un_rango_en_blanco(pdf, monkeypatch):
+    original = extraccion.extraer_rango
+
+    def extraer_rango(ruta, inicio, fin):
+        if inicio == 2:
+            raise ValueError("página corrupta")
+        return original(ruta, inicio, fin)
+    monkeypatch.setattr(extraccion, "extraer_rango", extraer_rango)
+
+    errores = [b[5] for b in extraccion.iterar_bloques_pdfs([pdf], max_procesos=1, paginas_por_rango=2)]
+    assert errores[0] is None and errores[2] is None
+    assert "página corrupta" in errores[1]
+    with pytest.raises(extraccion.ErrorExtraccion):
+        extraccion.extraer_textos_pdfs([pdf], max_procesos=1, paginas_por_rango=2)
@@ -0,0 +1,166 @@
+import asyncio
+import itertools
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from logic import llm
+from logic.llm import Circuito, CircuitoAbierto, LimitadorTasa, PlazoExcedido
+
+_modelos = itertools.count()
+
+class ErrorApi(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+@pytest.fixture
+def modelo(monkeypatch):
+    """Modelo nuevo por prueba (limitador y circuito propios) y backoff sin espera."""
+    monkeypatch.setattr(llm, "_espera_backoff", lambda intento: 0.0)
+    return f"modelo-prueba-{next(_modelos)}"
+
+def _fallos_y_luego(errores, resultado="ok"):
+    llamadas = []
+
+    def llamada(timeout):
+        llamadas.append(timeout)
+        if len(llamadas) <= len(errores):
+            raise errores[len(llamadas) - 1]
+        return resultado
+    return llamada, llamadas
+
+def test_ejecutar_exito_acota_el_timeout_al_plazo(modelo):
+    llamada, llamadas = _fallos_y_luego([])
+    assert llm._ejecutar(modelo, llamada, 5) == "ok"
+    assert len(llamadas) == 1
+    assert 0 < llamadas[0] <= min(5, llm.TIMEOUT_INTENTO)
+
+def test_ejecutar_no_reintenta_errores_de_la_solicitud(modelo):
+    llamada, llamadas = _fallos_y_luego([ErrorApi(400)])
+    with pytest.raises(ErrorApi):
+        llm._ejecutar(modelo, llamada, 5)
+    assert len(llamadas) == 1
+
+def test_ejecutar_reintenta_errores_transitorios(modelo):
+    llamada, llamadas = _fallos_y_luego([ErrorApi(503), ErrorApi(429)])
+    assert llm._ejecutar(modelo, llamada, 5) == "ok"
+    assert len(llamadas) == 3
+
+def test_ejecutar_agota_los_reintentos(modelo, monkeypatch):
+    monkeypatch.setattr(llm, "REINTENTOS", 2)
+    llamada, llamadas = _fallos_y_luego([ErrorApi(503)] * 10)
+    with pytest.raises(ErrorApi):
+        llm._ejecutar(modelo, llamada, 5)
+    assert len(llamadas) == 3
+
+def test_ejecutar_sin_plazo_no_llama(modelo):
+    llamada, llamadas = _fallos_y_luego([])
+    with pytest.raises(PlazoExcedido):
+        llm._ejecutar(modelo, llamada, llm.INTENTO_MINIMO / 2)
+    assert llamadas == []
+
+def test_ejecutar_con_circuito_abierto(modelo, monkeypatch):
+    monkeypatch.setattr(llm, "REINTENTOS", 0)
+    _, circuito = llm._estado_modelo(modelo)
+    for _ in range(circuito.umbral):
+        circuito.fallo()
+    llamada, llamadas = _fallos_y_luego([])
+    with pytest.raises(CircuitoAbierto):
+        llm._ejecutar(modelo, llamada, 5)
+    assert llamadas == []
+
+def test_ejecutar_libera_la_prueba_tras_un_error_no_transitorio(modelo):
+    _, circuito = llm._estado_modelo(modelo)
+    circuito.enfriamiento = 0
+    for _ in range(circuito.umbral):
+        circuito.fallo()
+    llamada, _ = _fallos_y_luego([ErrorApi(400)])
+    with pytest.raises(ErrorApi):
+        llm._ejecutar(modelo, llamada, 5)
+    # La siguiente llamada puede ser la prueba y cierra el circuito
+    assert llm._ejecutar(modelo, lambda timeout: "ok", 5) == "ok"
+    assert circuito.abierto_desde is None
+
+def _cliente_async(respuestas):
+    llamadas = []
+
+    async def generate_content(model, contents):
+        llamadas.append(contents)
+        respuesta = respuestas[min(len(llamadas), len(respuestas)) - 1]
+        if isinstance(respuesta, Exception):
+            raise respuesta
+        if respuesta == "lento":
+            await asyncio.sleep(10)
+        return respuesta
+    return SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))), llamadas
+
+def test_ejecutar_async(modelo, monkeypatch):
+    cliente, llamadas = _cliente_async([ErrorApi(503), "ok"])
+    monkeypatch.setattr(llm, "_obtener_cliente_async", lambda: cliente)
+    assert asyncio.run(llm._ejecutar_async(modelo, "hola", 5)) == "ok"
+    assert len(llamadas) == 2
+
+def test_ejecutar_async_no_reintenta_errores_de_la_solicitud(modelo, monkeypatch):
+    cliente, llamadas = _cliente_async([ErrorApi(400)])
+    monkeypatch.setattr(llm, "_obtener_cliente_async", lambda: cliente)
+    with pytest.raises(ErrorApi):
+        asyncio.run(llm._ejecutar_async(modelo, "hola", 5))
+    assert len(llamadas) == 1
+
+def test_ejecutar_async_corta_la_llamada_en_curso(modelo, monkeypatch):
+    cliente, _ = _cliente_async(["lento"])
+    monkeypatch.setattr(llm, "_obtener_cliente_async", lambda: cliente)
+    inicio = time.monotonic()
+    with pytest.raises(PlazoExcedido):
+        asyncio.run(llm._ejecutar_async(modelo, "hola", 0.2))
+    assert time.monotonic() - inicio < 2
+
+def test_circuito_deja_pasar_una_sola_prueba():
+    circuito = Circuito(umbral=2, enfriamiento=0.05)
+    circuito.fallo()
+    assert circuito.verificar() is False
+    circuito.fallo()
+    with pytest.raises(CircuitoAbierto):
+        circuito.verificar()
+    time.sleep(0.06)
+    assert circuito.verificar() is True
+    with pytest.raises(CircuitoAbierto):
+        circuito.verificar()
+    # La prueba falla: se vuelve a abrir por otro enfriamiento
+    circuito.fallo()
+    with pytest.raises(CircuitoAbierto):
+        circuito.verificar()
+    time.sleep(0.06)
+    assert circuito.verificar() is True
+    circuito.exito()
+    assert circuito.verificar() is False
+    assert circuito.verificar() is False
+
+def test_circuito_liberar_prueba_permite_otra():
+    circuito = Circuito(umbral=1, enfriamiento=0)
+    circuito.fallo()
+    assert circuito.verificar() is True
+    with pytest.raises(CircuitoAbierto):
+        circuito.verificar()
+    circuito.liberar_prueba()
+    assert circuito.verificar() is True
+
+def test_limitador_permite_rafaga_y_luego_espera():
+    limitador = LimitadorTasa(tasa=50, capacidad=2)
+    limite = time.monotonic() + 5
+    inicio = time.monotonic()
+    limitador.adquirir(limite)
+    limitador.adquirir(limite)
+    assert time.monotonic() - inicio < 0.01
+    limitador.adquirir(limite)
+    assert time.monotonic() - inicio >= 0.015
+
+def test_limitador_sin_capacidad_en_el_plazo():
+    limitador = LimitadorTasa(tasa=0.1, capacidad=1)
+    limitador.adquirir(time.monotonic() + 1)
+    with pytest.raises(PlazoExcedido):
+        limitador.adquirir(time.monotonic() + 1)
+    with pytest.raises(PlazoExcedido):
+        asyncio.run(limitador.adquirir_async(time.monotonic() + 1))
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import pytest
+
+from logic import rerank
+from logic.rerank import Reordenador
+
+class ModeloFalso:
+    """Cross-encoder falso: puntúa por largo del texto y avanza un reloj simulado."""
+
+    def __init__(self, reloj):
+        self.reloj = reloj
+        self.ms_por_par = 1.0
+        self.pares = 0
+
+    def predict(self, pares, batch_size, show_progress_bar):
+        self.pares += len(pares)
+        self.reloj["ahora"] += self.ms_por_par * len(pares) / 1000
+        return [len(texto) for _, texto in pares]
+
+@pytest.fixture
+def modelo(monkeypatch):
+    reloj = {"ahora": 0.0}
+    modelo = ModeloFalso(reloj)
+    monkeypatch.setattr(rerank, "obtener_modelo_rerank", lambda: modelo)
+    monkeypatch.setattr(rerank, "time", SimpleNamespace(perf_counter=lambda: reloj["ahora"]))
+    return modelo
+
+def _candidatos(consulta, n=10):
+    return [(f"{consulta}-{i}", "x" * i) for i in range(n)]
+
+def test_ordena_por_puntaje_y_usa_la_cache(modelo):
+    reordenador = Reordenador(presupuesto_ms=1000)
+    assert reordenador.reordenar("q", _candidatos("q"), 3) == ["q-9", "q-8", "q-7"]
+    assert reordenador.reordenar("q", _candidatos("q"), 3) == ["q-9", "q-8", "q-7"]
+    assert modelo.pares == 10
+
+def test_la_primera_pasada_no_cuenta_en_la_estimacion(modelo):
+    reordenador = Reordenador(presupuesto_ms=100)
+    modelo.ms_por_par = 500  # arranque en frío
+    assert reordenador.reordenar("a", _candidatos("a"), 3) is not None
+    assert reordenador.ms_por_par is None
+    modelo.ms_por_par = 1
+    assert reordenador.reordenar("b", _candidatos("b"), 3) is not None
+    assert reordenador.ms_por_par == pytest.approx(1)
+
+def test_una_pasada_lenta_no_apaga_el_reordenamiento(modelo, monkeypatch):
+    monkeypatch.setattr(rerank, "SONDEO_CADA", 3)
+    reordenador = Reordenador(presupuesto_ms=100, suavizado=1.0)
+    reordenador.reordenar("calentamiento", _candidatos("calentamiento"), 3)
+    modelo.ms_por_par = 50  # pasada lenta aislada: 10 pares estimados en 500 ms
+    reordenador.reordenar("lenta", _candidatos("lenta"), 3)
+    modelo.ms_por_par = 1
+    assert reordenador.reordenar("c1", _candidatos("c1"), 3) is None
+    assert reordenador.reordenar("c2", _candidatos("c2"), 3) is None
+    # Tercera omisión seguida: el sondeo renueva la estimación y se reordena
+    assert reordenador.reordenar("c3", _candidatos("c3"), 3) == ["c3-9", "c3-8", "c3-7"]
+    assert reordenador.ms_por_par == pytest.approx(1)
+    assert reordenador.omitidos == 2
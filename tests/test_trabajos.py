@@ -0,0 +1,41 @@
+import pytest
+
+from logic import trabajos
+
+@pytest.fixture(autouse=True)
+def directorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(trabajos, "TRABAJOS_DIR", str(tmp_path / "trabajos"))
+    return tmp_path
+
+def _pdf(directorio, nombre, subdirectorio="subida"):
+    ruta = directorio / subdirectorio / nombre
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_bytes(b"%PDF-1.4")
+    return str(ruta)
+
+def test_encolar_y_consultar_por_espacio(directorio):
+    id_trabajo = trabajos.encolar_trabajo([_pdf(directorio, "a.pdf")], "/datos", "catchai_legal")
+    trabajo = trabajos.obtener_trabajo(id_trabajo, "catchai_legal")
+    assert trabajo.estado == trabajos.PENDIENTE
+    assert trabajos.obtener_trabajo(id_trabajo, "catchai_otro") is None
+    assert [t.id for t in trabajos.listar_trabajos(activos=True, nombre_coleccion="catchai_legal")] == [id_trabajo]
+    assert trabajos.listar_trabajos(nombre_coleccion="catchai_otro") == []
+
+def test_cancelar_solo_desde_el_mismo_espacio(directorio):
+    id_trabajo = trabajos.encolar_trabajo([_pdf(directorio, "a.pdf")], "/datos", "catchai_legal")
+    assert not trabajos.cancelar_trabajo(id_trabajo, "catchai_otro")
+    assert trabajos.cancelar_trabajo(id_trabajo, "catchai_legal")
+    assert trabajos.obtener_trabajo(id_trabajo).estado == trabajos.CANCELADO
+
+def test_rechaza_archivos_con_el_mismo_nombre(directorio):
+    rutas = [_pdf(directorio, "a.pdf", "uno"), _pdf(directorio, "a.pdf", "dos")]
+    with pytest.raises(ValueError):
+        trabajos.encolar_trabajo(rutas, "/datos")
+
+def test_un_solo_ejecutor_activo():
+    primero, segundo = trabajos.EjecutorTrabajos(), trabajos.EjecutorTrabajos()
+    assert primero._tomar_liderazgo()
+    assert not segundo._tomar_liderazgo()
+    primero._archivo_bloqueo.close()
+    assert segundo._tomar_liderazgo()
+    segundo._archivo_bloqueo.close()